@@ -1,14 +1,68 @@
+import asyncio
+import logging
+import math
 import os
 import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
 import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from .core import tracing
+from .core.config import settings
+
+logger = logging.getLogger(__name__)
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/api/generate")
+MODEL = settings.OLLAMA_MODEL
+OPTIONS = {
+    "seed": 42,
+    "temperature": 0.7
+}
+
+# Ollama reports durations in nanoseconds
+_NS_PER_MS = 1_000_000
 
 def remove_think_tags(text: str) -> str:
     """Remove content within <think> tags from the response."""
     return re.sub(r'<think>.*?<\/think>', '', text, flags=re.DOTALL).strip()
 
 def analyze_story(content: str) -> str:
+    analysis, _ = analyze_story_with_metrics(content)
+    return analysis
+
+def ollama_metrics(body: dict, wall_ms: float) -> dict:
+    """Extract timing and token figures from a non-streaming Ollama response."""
+    def ms(key: str) -> Optional[float]:
+        value = body.get(key)
+        return value / _NS_PER_MS if value is not None else None
+
+    eval_count = body.get("eval_count")
+    eval_duration = body.get("eval_duration")
+    return {
+        "wall_ms": wall_ms,
+        "total_duration_ms": ms("total_duration"),
+        "load_duration_ms": ms("load_duration"),
+        "prompt_eval_count": body.get("prompt_eval_count"),
+        "prompt_eval_duration_ms": ms("prompt_eval_duration"),
+        "eval_count": eval_count,
+        "eval_duration_ms": ms("eval_duration"),
+        "tokens_per_second": eval_count / (eval_duration / 1e9) if eval_count and eval_duration else None,
+    }
+
+def analyze_story_with_metrics(content: str) -> Tuple[str, dict]:
+    """Analyze a story and report how the model call performed.
+
+    Returns:
+        The analysis (or an "Analysis Error: ..." message) and a dict with
+        the model, its options, ``success`` and the figures of
+        :func:`ollama_metrics`
+    """
     prompt = (
         "Using Storyworthy principles by Matt Dicks, analyze this story focusing on:\n"
         "1. The '5-second moment' - identify the most emotionally charged moment\n"
@@ -22,22 +76,307 @@ def analyze_story(content: str) -> str:
         "3. Transformation: [description]\n"
         "4. Specificity Suggestions: [2-3 specific areas]\n"
         "5. Emotional Arc: [description]\n\n"
-        "Do not repeat the story content in your response."
+        "Do not repeat the story content in your response.\n\n"
+        f"Story:\n{content}"
     )
     payload = {
-        "model": "qwen3:1.7b", 
+        "model": MODEL, 
         "prompt": prompt, 
         "stream": False,
-        "options": {
-            "seed": 42,
-            "temperature": 0.7
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        "options": OPTIONS
+    }
+    metrics = {"model": MODEL, "options": OPTIONS, "success": False}
+    started = time.perf_counter()
+    with tracing.start_span("ollama generate", tracing.KIND_CLIENT, {"gen_ai.request.model": MODEL}) as span:
+        try:
+            r = httpx.post(OLLAMA_URL, json=payload, timeout=400, headers=tracing.inject_headers())
+            r.raise_for_status()
+            body = r.json()
+            metrics.update(ollama_metrics(body, (time.perf_counter() - started) * 1000))
+            metrics["success"] = True
+            if span is not None:
+                for key in ("load_duration_ms", "prompt_eval_count", "eval_count", "tokens_per_second"):
+                    if metrics.get(key) is not None:
+                        span.set_attribute(f"ollama.{key}", metrics[key])
+            response = body.get("response", "").strip()
+            # Remove any <think> tags from the response
+            return remove_think_tags(response), metrics
+        except Exception as e:
+            metrics["wall_ms"] = (time.perf_counter() - started) * 1000
+            if span is not None:
+                span.record_error(e)
+            return f"Analysis Error: {str(e)}", metrics
+
+# Fair-share scheduling of model calls
+#
+# Every analysis waits in a per-user queue inside its priority class.
+# Interactive requests go before batch ones, except that a batch request is
+# let through after every ANALYZE_BATCH_EVERY interactive ones so batches
+# never starve. Within a class users take turns by deficit round robin: on
+# each turn a user earns ANALYZE_SCHEDULER_QUANTUM_TOKENS of credit and runs
+# requests while the credit covers their estimated prompt size, so one
+# user's long queue (or long stories) cannot crowd out everyone else.
+
+PRIORITIES = ("interactive", "batch")
+
+# Rough size of the instructions wrapped around the story, in tokens
+_PROMPT_OVERHEAD_TOKENS = 200
+
+def estimate_cost(content: str) -> int:
+    """Estimated prompt tokens for analyzing a story (about 4 characters per token)."""
+    return _PROMPT_OVERHEAD_TOKENS + len(content) // 4
+
+
+class _Waiter:
+    __slots__ = ("user_id", "cost", "future", "enqueued")
+
+    def __init__(self, user_id: int, cost: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.cost = cost
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class FairShareScheduler:
+    """Orders concurrent model calls fairly across users, under a global cap."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        quantum: int,
+        batch_every: int,
+        expected_duration: float,
+        window: int = 1000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.quantum = quantum
+        self.batch_every = batch_every
+        self.avg_duration = expected_duration
+        self.running = 0
+        # Per class: user id -> that user's waiters, in round-robin order
+        self._queues: Dict[str, "OrderedDict[int, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._deficits: Dict[str, Dict[int, int]] = {p: {} for p in PRIORITIES}
+        self._interactive_streak = 0
+        self._waits: Dict[str, Deque[float]] = {p: deque(maxlen=window) for p in PRIORITIES}
+        self._dispatched: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        """Requests waiting, in one class or in all of them."""
+        classes = PRIORITIES if priority is None else (priority,)
+        return sum(len(waiters) for p in classes for waiters in self._queues[p].values())
+
+    def estimated_wait(self, priority: str = "interactive") -> float:
+        """Seconds a new request of this class would wait, from the recent call duration."""
+        ahead = self.running + self.queued(priority)
+        if priority != "interactive":
+            ahead += self.queued("interactive")
+        ahead -= self.max_concurrency - 1
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.max_concurrency) * self.avg_duration
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, priority: str = "interactive", cost: int = 1) -> AsyncIterator[float]:
+        """Wait for this user's turn and hold a concurrency slot for the block.
+
+        Yields:
+            The seconds spent waiting
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        waited = await self._acquire(user_id, priority, cost)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            # Exponentially weighted so the estimate follows the current model
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, user_id: int, priority: str, cost: int) -> float:
+        if self.running < self.max_concurrency and not self.queued():
+            self.running += 1
+            self._record_wait(priority, 0.0)
+            return 0.0
+
+        waiter = _Waiter(user_id, cost, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(user_id, deque()).append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as the caller gave up
+                self._release()
+            else:
+                self._remove(priority, waiter)
+            raise
+        waited = time.monotonic() - waiter.enqueued
+        self._record_wait(priority, waited)
+        return waited
+
+    def _release(self) -> None:
+        self.running -= 1
+        while self.running < self.max_concurrency:
+            waiter = self._next()
+            if waiter is None:
+                break
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def _next(self) -> Optional[_Waiter]:
+        interactive, batch = self.queued("interactive"), self.queued("batch")
+        if not interactive and not batch:
+            return None
+        if batch and (not interactive or self._interactive_streak >= self.batch_every):
+            self._interactive_streak = 0
+            priority = "batch"
+        else:
+            if batch:
+                self._interactive_streak += 1
+            priority = "interactive"
+        self._dispatched[priority] += 1
+        return self._next_in_class(priority)
+
+    def _next_in_class(self, priority: str) -> _Waiter:
+        queues, deficits = self._queues[priority], self._deficits[priority]
+        while True:
+            user_id, waiters = next(iter(queues.items()))
+            deficit = deficits.get(user_id, 0)
+            if deficit < waiters[0].cost:
+                # Start of this user's turn
+                deficit += self.quantum
+                if deficit < waiters[0].cost:
+                    deficits[user_id] = deficit
+                    queues.move_to_end(user_id)
+                    continue
+            waiter = waiters.popleft()
+            deficit -= waiter.cost
+            if not waiters:
+                # Idle users do not bank credit
+                del queues[user_id]
+                deficits.pop(user_id, None)
+            else:
+                deficits[user_id] = deficit
+                if deficit < waiters[0].cost:
+                    queues.move_to_end(user_id)
+            return waiter
+
+    def _remove(self, priority: str, waiter: _Waiter) -> None:
+        waiters = self._queues[priority].get(waiter.user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del self._queues[priority][waiter.user_id]
+            self._deficits[priority].pop(waiter.user_id, None)
+
+    def _record_wait(self, priority: str, seconds: float) -> None:
+        self._waits[priority].append(seconds)
+
+    def stats(self) -> dict:
+        """Queue depth and recent wait times per priority class."""
+        classes = {}
+        for priority in PRIORITIES:
+            waits = sorted(self._waits[priority])
+            classes[priority] = {
+                "queued": self.queued(priority),
+                "queued_users": len(self._queues[priority]),
+                "dispatched": self._dispatched[priority],
+                "wait_p50": _quantile(waits, 0.5),
+                "wait_p95": _quantile(waits, 0.95),
+                "wait_max": waits[-1] if waits else None,
+            }
+        return {
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "avg_duration": self.avg_duration,
+            "classes": classes,
         }
+
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+analysis_scheduler = FairShareScheduler(
+    max_concurrency=settings.ANALYZE_MAX_CONCURRENCY,
+    quantum=settings.ANALYZE_SCHEDULER_QUANTUM_TOKENS,
+    batch_every=settings.ANALYZE_BATCH_EVERY,
+    expected_duration=settings.ANALYZE_EXPECTED_DURATION_SECONDS,
+)
+
+async def run_analysis(content: str, user_id: int, priority: str = "interactive") -> Tuple[str, dict]:
+    """Analyze a story once the scheduler gives this user a turn.
+
+    Returns:
+        Like :func:`analyze_story_with_metrics`, with ``queue_ms`` and
+        ``priority`` added to the metrics
+    """
+    with tracing.start_span("analysis", attributes={"analysis.priority": priority}) as span:
+        async with analysis_scheduler.slot(user_id, priority, estimate_cost(content)) as waited:
+            if span is not None:
+                span.set_attribute("analysis.queue_ms", waited * 1000)
+            analysis, metrics = await run_in_threadpool(analyze_story_with_metrics, content)
+    metrics["queue_ms"] = waited * 1000
+    metrics["priority"] = priority
+    return analysis, metrics
+
+def warm_models() -> List[str]:
+    """Models to preload and keep resident."""
+    return settings.OLLAMA_WARM_MODELS or [MODEL]
+
+def preload_model(model: str, keep_alive: Optional[str] = None) -> Optional[float]:
+    """Load a model into Ollama's memory without generating anything.
+
+    Returns:
+        The load time in milliseconds reported by Ollama (0 when the model
+        was already resident), or None if the request failed
+    """
+    payload = {
+        "model": model,
+        "prompt": "",
+        "stream": False,
+        "keep_alive": keep_alive or settings.OLLAMA_KEEP_ALIVE,
     }
     try:
-        r = httpx.post(OLLAMA_URL, json=payload, timeout=400)
-        r.raise_for_status()
-        response = r.json().get("response", "").strip()
-        # Remove any <think> tags from the response
-        return remove_think_tags(response)
+        with tracing.start_span("ollama preload", tracing.KIND_CLIENT, {"gen_ai.request.model": model}):
+            r = httpx.post(OLLAMA_URL, json=payload, timeout=400, headers=tracing.inject_headers())
+            r.raise_for_status()
+        return (r.json().get("load_duration") or 0) / _NS_PER_MS
     except Exception as e:
-        return f"Analysis Error: {str(e)}"
\ No newline at end of file
+        logger.warning(f"Failed to preload model {model}: {e}")
+        return None
+
+async def warm_up_models() -> None:
+    """Preload every warm model, one after another."""
+    for model in warm_models():
+        load_ms = await run_in_threadpool(preload_model, model)
+        if load_ms is not None:
+            logger.info(f"Model {model} resident (load took {load_ms:.0f} ms)")
+
+def in_business_hours(now: Optional[datetime] = None) -> bool:
+    """Whether models should currently be kept resident."""
+    now = now or datetime.now(ZoneInfo(settings.OLLAMA_KEEPER_TIMEZONE))
+    return (
+        now.weekday() in settings.OLLAMA_KEEPER_WEEKDAYS
+        and settings.OLLAMA_KEEPER_START_HOUR <= now.hour < settings.OLLAMA_KEEPER_END_HOUR
+    )
+
+async def keep_models_warm() -> None:
+    """Warm models at startup, then refresh their residency during business hours.
+
+    Outside business hours nothing is sent, so Ollama unloads the models
+    once OLLAMA_KEEP_ALIVE has passed since the last request.
+    """
+    if settings.OLLAMA_WARM_ON_STARTUP:
+        await warm_up_models()
+    while True:
+        await asyncio.sleep(settings.OLLAMA_KEEPER_INTERVAL_SECONDS)
+        if in_business_hours():
+            await warm_up_models()
@@ -0,0 +1,141 @@
+"""Fast, local text analytics for stories.
+
+Everything here runs in-process without a model call: counts, readability,
+lexicon-based sentiment per paragraph and an emotional-arc curve. Sentence
+and paragraph boundaries are located with array operations over the code
+points, and the lexicon and syllable counter run once per distinct word with
+the results broadcast back to every token.
+"""
+import re
+from typing import Dict, List
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z']+")
+_VOWEL_GROUP_RE = re.compile(r"[aeiouy]+")
+
+# A compact valence lexicon in the spirit of AFINN, scores from -3 to 3
+SENTIMENT_LEXICON: Dict[str, int] = {
+    # Positive
+    "love": 3, "loved": 3, "joy": 3, "wonderful": 3, "amazing": 3, "beautiful": 3, "thrilled": 3,
+    "happy": 2, "happiness": 2, "glad": 2, "laugh": 2, "laughed": 2, "smile": 2, "smiled": 2,
+    "proud": 2, "hope": 2, "hopeful": 2, "warm": 1, "safe": 1, "kind": 2, "excited": 2,
+    "relief": 2, "relieved": 2, "grateful": 2, "free": 1, "best": 2, "good": 1, "great": 2,
+    "calm": 1, "peace": 2, "peaceful": 2, "friend": 1, "friends": 1, "win": 2, "won": 2,
+    "hug": 2, "hugged": 2, "brave": 2, "fun": 2, "delighted": 3, "trust": 1, "together": 1,
+    # Negative
+    "hate": -3, "hated": -3, "terrified": -3, "devastated": -3, "horrible": -3, "died": -3,
+    "death": -3, "dead": -3, "sad": -2, "cried": -2, "cry": -2, "tears": -2, "afraid": -2,
+    "scared": -2, "fear": -2, "angry": -2, "anger": -2, "hurt": -2, "pain": -2, "lost": -2,
+    "lonely": -2, "alone": -1, "worried": -2, "worry": -2, "shame": -2, "ashamed": -2,
+    "guilt": -2, "guilty": -2, "broke": -1, "broken": -2, "fail": -2, "failed": -2,
+    "bad": -2, "worst": -3, "cold": -1, "dark": -1, "sick": -2, "panic": -3, "grief": -3,
+    "nervous": -1, "embarrassed": -2, "regret": -2, "sorry": -1, "wrong": -2, "fight": -2,
+}
+_NEGATIONS = frozenset({"not", "no", "never", "n't", "nothing", "nobody", "without"})
+
+
+def _syllables(word: str) -> int:
+    groups = len(_VOWEL_GROUP_RE.findall(word))
+    if word.endswith("e") and groups > 1 and not word.endswith(("le", "ee")):
+        groups -= 1
+    return max(groups, 1)
+
+
+def analyze_text(text: str, arc_points: int = 20) -> dict:
+    """Compute instant analytics for a story text.
+
+    Returns:
+        dict: counts, readability scores, per-paragraph sentiment and an
+            ``arc_points``-long emotional arc, each value in [-1, 1]
+    """
+    lowered = text.lower()
+    words: List[str] = _WORD_RE.findall(lowered)
+
+    # Sentence and paragraph boundaries are found on the code points as a
+    # whole; each word then takes the ids at its first character.
+    codes = np.frombuffer(lowered.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    is_word_char = ((codes >= 97) & (codes <= 122)) | (codes == 39)
+    starts = np.flatnonzero(is_word_char & ~np.concatenate(([False], is_word_char[:-1])))
+    is_newline = codes == 10
+    is_space = is_newline | (codes == 32) | (codes == 9) | (codes == 13)
+    last_text = np.maximum.accumulate(np.where(is_space, -1, np.arange(codes.size)))
+    newlines = np.flatnonzero(is_newline)
+    previous_newline = np.concatenate(([-1], newlines[:-1]))
+    # A newline preceded by only whitespace since the previous one ends a paragraph
+    paragraph_breaks = np.zeros(codes.size, dtype=bool)
+    paragraph_breaks[newlines[(previous_newline >= 0) & (last_text[newlines] < previous_newline)]] = True
+    sentence_ends = (codes == 46) | (codes == 33) | (codes == 63) | paragraph_breaks
+    sentence_ids = np.cumsum(sentence_ends)[starts]
+    paragraph_ids = np.cumsum(paragraph_breaks)[starts]
+
+    word_count = len(words)
+    if word_count == 0:
+        return {
+            "word_count": 0,
+            "sentence_count": 0,
+            "paragraph_count": 0,
+            "avg_sentence_length": 0.0,
+            "flesch_reading_ease": 0.0,
+            "flesch_kincaid_grade": 0.0,
+            "sentiment": 0.0,
+            "paragraph_sentiment": [],
+            "emotional_arc": [],
+        }
+
+    # Score the vocabulary once, then broadcast to all tokens
+    index: Dict[str, int] = {}
+    inverse = np.fromiter((index.setdefault(w, len(index)) for w in words), dtype=np.int64, count=word_count)
+    vocabulary = list(index)
+    vocab_syllables = np.fromiter((_syllables(w) for w in vocabulary), dtype=np.int32, count=len(vocabulary))
+    vocab_valence = np.fromiter((SENTIMENT_LEXICON.get(w, 0) for w in vocabulary), dtype=np.float64, count=len(vocabulary))
+    vocab_negation = np.fromiter((w in _NEGATIONS or w.endswith("n't") for w in vocabulary), dtype=bool, count=len(vocabulary))
+
+    syllables = vocab_syllables[inverse]
+    valence = vocab_valence[inverse]
+    negated = np.zeros(word_count, dtype=bool)
+    negated[1:] = vocab_negation[inverse][:-1]
+    valence = np.where(negated, -0.5 * valence, valence)
+
+    # Ids are non-decreasing; compact them so empty sentences do not count
+    sentence_count = int(np.count_nonzero(np.diff(sentence_ids))) + 1
+    paragraph_index = np.concatenate(([0], np.cumsum(np.diff(paragraph_ids) > 0)))
+    paragraph_count = int(paragraph_index[-1]) + 1
+
+    words_per_sentence = word_count / sentence_count
+    syllables_per_word = float(syllables.sum()) / word_count
+    reading_ease = 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word
+    grade = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59
+
+    paragraph_sentiment = _normalise(
+        np.bincount(paragraph_index, weights=valence, minlength=paragraph_count),
+        np.bincount(paragraph_index, minlength=paragraph_count),
+    )
+
+    points = min(arc_points, word_count)
+    segment = (np.arange(word_count) * points) // word_count
+    arc = _normalise(
+        np.bincount(segment, weights=valence, minlength=points),
+        np.bincount(segment, minlength=points),
+    )
+    if points >= 3:
+        # Light smoothing so single loaded words do not dominate the curve
+        padded = np.pad(arc, 1, mode="edge")
+        arc = np.convolve(padded, np.array([0.25, 0.5, 0.25]), mode="valid")
+
+    return {
+        "word_count": word_count,
+        "sentence_count": sentence_count,
+        "paragraph_count": paragraph_count,
+        "avg_sentence_length": round(words_per_sentence, 2),
+        "flesch_reading_ease": round(float(reading_ease), 2),
+        "flesch_kincaid_grade": round(float(grade), 2),
+        "sentiment": round(float(np.tanh(valence.sum() / np.sqrt(word_count))), 4),
+        "paragraph_sentiment": [round(float(v), 4) for v in paragraph_sentiment],
+        "emotional_arc": [round(float(v), 4) for v in arc],
+    }
+
+
+def _normalise(valence_sums: np.ndarray, word_counts: np.ndarray) -> np.ndarray:
+    """Squash per-segment valence into [-1, 1], scaled by segment length."""
+    return np.tanh(valence_sums / np.sqrt(np.maximum(word_counts, 1)))
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
-from .endpoints import auth, users, stories
+from .endpoints import admin, auth, events, users, stories
 
 api_router = APIRouter()
 
@@ -18,3 +18,5 @@ async def health_check():
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(stories.router, prefix="/stories", tags=["stories"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
+api_router.include_router(events.router, tags=["events"])
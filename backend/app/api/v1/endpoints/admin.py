@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from .... import ai, models, schemas
+from ....crud import analysis as crud_analysis
+from ....database import get_db
+from ....core import security, tracing
+from ....core.cache import story_list_cache
+
+router = APIRouter()
+
+@router.get("/analysis-metrics", response_model=schemas.AnalysisMetrics)
+async def read_analysis_metrics(
+    hours: float = Query(24, gt=0, le=24 * 90),
+    model: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(security.get_current_active_superuser),
+):
+    """
+    Percentiles of model call figures over the last `hours`, per model.
+    Only available to superusers.
+    """
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return {
+        "since": since,
+        "models": crud_analysis.get_analysis_metrics(db, since=since, model=model),
+    }
+
+@router.get("/analysis-scheduler", response_model=schemas.SchedulerStats)
+async def read_analysis_scheduler(
+    current_user: models.User = Depends(security.get_current_active_superuser),
+):
+    """
+    Queue depth and wait times of the model call scheduler in this worker.
+    Only available to superusers.
+    """
+    return ai.analysis_scheduler.stats()
+
+@router.get("/cache-stats", response_model=schemas.CacheStats)
+async def read_cache_stats(
+    current_user: models.User = Depends(security.get_current_active_superuser),
+):
+    """
+    Hit ratio and memory use of the story list cache in this worker.
+    Only available to superusers.
+    """
+    return story_list_cache.stats()
+
+@router.get("/traces", response_model=Dict[str, Any])
+async def read_traces(
+    trace_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=1000),
+    current_user: models.User = Depends(security.get_current_active_superuser),
+):
+    """
+    Spans of the latest `limit` traces, or of one trace, recorded by this
+    worker, as an OTLP/JSON export request. Only available to superusers.
+    """
+    if not isinstance(tracing.exporter, tracing.MemoryCollector):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Traces are not collected in memory (TRACING_ENABLED, TRACING_EXPORTER)"
+        )
+    spans = tracing.exporter.spans(trace_id=trace_id, limit=None if trace_id else limit)
+    return tracing.otlp_request(spans)
@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
@@ -6,8 +6,10 @@ from sqlalchemy.orm import Session
 
 from .... import models, schemas
 from ....crud import user as crud_user
+from ....crud import token as crud_token
 from ....core.config import settings
 from ....core import security
+from ....core.revocation import revocation_list
 from ....database import get_db
 
 router = APIRouter()
@@ -36,6 +38,32 @@ async def login_for_access_token(
         "token_type": "bearer",
     }
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token: str = Depends(security.oauth2_scheme),
+    current_user: models.User = Depends(security.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke the access token used for this request.
+    """
+    payload = security.decode_access_token(token)
+    jti = payload.get("jti")
+    if jti is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked, it has no jti"
+        )
+    crud_token.revoke_token(
+        db,
+        jti=jti,
+        expires_at=datetime.utcfromtimestamp(payload["exp"]),
+        user_id=current_user.id
+    )
+    # Other workers pick the revocation up on their next refresh
+    revocation_list.add(jti)
+    return None
+
 @router.post("/register", response_model=schemas.User)
 async def register_user(
     user_in: schemas.UserCreate,
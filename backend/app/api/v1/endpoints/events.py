@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError
+
+from .... import models
+from ....database import SessionLocal
+from ....core import security
+from ....core.config import settings
+from ....core.events import Connection, event_hub
+from ....core.revocation import revocation_list
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _authenticate(token: str) -> Optional[models.User]:
+    db = SessionLocal()
+    try:
+        return security.get_user_from_token(db, token)
+    finally:
+        db.close()
+
+@router.websocket("/ws")
+async def story_events(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Push story events to the client as JSON messages.
+    
+    Browsers cannot set headers on WebSocket requests, so the access token
+    may be passed as the `token` query parameter. Messages look like
+    `{"type": "story.analyzed", "story_id": 1}`; `{"type": "resync"}` means
+    events were missed and the client should refetch. The connection is
+    closed (1008) when the token expires or is revoked, e.g. by a logout.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    user = await run_in_threadpool(_authenticate, token) if token else None
+    if user is None or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if event_hub.connection_count(user.id) >= settings.WS_MAX_CONNECTIONS_PER_USER:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    try:
+        claims = security.decode_access_token(token)
+    except JWTError:
+        claims = {}
+    expires_at = claims.get("exp") or time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    jti = claims.get("jti")
+
+    await websocket.accept()
+    connection = Connection(websocket, user.id)
+    event_hub.add(connection)
+
+    async def receive_forever() -> None:
+        # Client messages are ignored; reading is how a disconnect is noticed
+        while True:
+            await websocket.receive_text()
+
+    async def watch_token() -> None:
+        # Finishes once the token has expired or been revoked; the revocation
+        # list is in memory, so checking it often costs nothing
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0 or (jti is not None and revocation_list.is_revoked(jti)):
+                return
+            await asyncio.sleep(min(remaining, settings.WS_TOKEN_CHECK_SECONDS))
+
+    sender = asyncio.create_task(connection.send_forever())
+    receiver = asyncio.create_task(receive_forever())
+    token_check = asyncio.create_task(watch_token())
+    close_code = status.WS_1000_NORMAL_CLOSURE
+    client_left = False
+    try:
+        done, _ = await asyncio.wait({sender, receiver, token_check}, return_when=asyncio.FIRST_COMPLETED)
+        # The receiver only finishes when the client disconnects
+        client_left = receiver in done
+        if sender in done and isinstance(sender.exception(), asyncio.TimeoutError):
+            logger.info(f"Disconnecting slow event consumer for user {user.id}")
+            close_code = status.WS_1013_TRY_AGAIN_LATER
+        elif token_check in done:
+            close_code = status.WS_1008_POLICY_VIOLATION
+    finally:
+        event_hub.remove(connection)
+        for task in (sender, receiver, token_check):
+            task.cancel()
+        await asyncio.gather(sender, receiver, token_check, return_exceptions=True)
+    if not client_left:
+        try:
+            await websocket.close(code=close_code)
+        except RuntimeError:
+            pass
@@ -1,23 +1,60 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional, Sequence
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
-from .... import models, schemas
+from .... import ai, analytics, models, schemas
 from ....crud import story as crud_story
-from ....database import get_db
+from ....crud import revision as crud_revision
+from ....crud import analysis as crud_analysis
+from ....database import get_db, replica_engines
 from ....core import security
+from ....core.admission import admit_analysis
+from ....core.cache import story_list_cache
+from ....core.config import settings
 
 router = APIRouter()
 
+_story_list_adapter = TypeAdapter(List[schemas.Story])
+_sparse_adapter = TypeAdapter(Dict[str, Any])
+_sparse_list_adapter = TypeAdapter(List[Dict[str, Any]])
+
+def story_fields(fields: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Parse a `fields=title,date,tags` sparse fieldset; the id is always included.
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in schemas.Story.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown story fields: {', '.join(unknown)}"
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+def _dump_stories(stories: List[models.Story], fields: Optional[Sequence[str]]) -> bytes:
+    if fields is None:
+        return _story_list_adapter.dump_json(
+            _story_list_adapter.validate_python(stories, from_attributes=True)
+        )
+    return _sparse_list_adapter.dump_json(
+        [{field: getattr(story, field) for field in fields} for story in stories]
+    )
+
 @router.post("/", response_model=schemas.Story, status_code=status.HTTP_201_CREATED)
-async def create_story(
+def create_story(
     story: schemas.StoryCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(security.get_current_active_user),
 ):
     """
     Create a new story for the current user.
+    
+    A plain function, so signing the story for duplicate detection runs in
+    the threadpool rather than on the event loop.
     """
     return crud_story.create_story(db=db, story=story, user_id=current_user.id)
 
@@ -26,46 +63,126 @@ async def read_stories(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    fields: Optional[List[str]] = Depends(story_fields),
+    db: Session = Depends(security.get_read_db),
     current_user: models.User = Depends(security.get_current_active_user),
 ):
     """
     Retrieve stories for the current user, with optional search.
+    
+    `fields=title,date,tags` returns only those fields (and the id), and
+    loads only those columns. Serialized lists are cached per user until
+    one of their stories changes. A list read from a replica is not cached
+    within `READ_YOUR_WRITES_SECONDS` of a change, as the replica may lag
+    and the stale list would be stored under the current version.
     """
-    return crud_story.get_stories(
+    if not settings.STORY_LIST_CACHE_ENABLED:
+        stories = crud_story.get_stories(
+            db=db, user_id=current_user.id, skip=skip, limit=limit, search=search, fields=fields
+        )
+        if fields is None:
+            return stories
+        return Response(content=_dump_stories(stories, fields), media_type="application/json")
+    
+    params = (skip, limit, search, fields and tuple(fields))
+    version = story_list_cache.version(current_user.id)
+    body = story_list_cache.get(current_user.id, version, params)
+    cache_status = "HIT"
+    if body is None:
+        cache_status = "MISS"
+        stories = crud_story.get_stories(
+            db=db,
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            search=search,
+            fields=fields
+        )
+        body = _dump_stories(stories, fields)
+        if db.bind not in replica_engines or not story_list_cache.changed_within(
+            current_user.id, settings.READ_YOUR_WRITES_SECONDS
+        ):
+            story_list_cache.put(current_user.id, version, params, body)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_status})
+
+@router.get("/duplicates", response_model=List[schemas.DuplicateCluster])
+async def read_duplicate_stories(
+    threshold: Optional[float] = None,
+    db: Session = Depends(security.get_read_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    Report clusters of near-identical stories for the current user.
+    """
+    if threshold is not None and not 0 < threshold <= 1:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="threshold must be between 0 and 1"
+        )
+    return crud_story.get_duplicate_clusters(
         db=db,
         user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        search=search
+        threshold=threshold
     )
 
+@router.get("/batch", response_model=List[schemas.Story])
+async def read_stories_batch(
+    ids: str = Query(..., description="Comma separated story ids"),
+    fields: Optional[List[str]] = Depends(story_fields),
+    db: Session = Depends(security.get_read_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    Get several stories by id in one request, in the order requested.
+    
+    Ids of stories that do not exist or belong to another user are left
+    out. Accepts `fields` like the story list.
+    """
+    try:
+        story_ids = [int(story_id) for story_id in ids.split(",") if story_id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be integers"
+        )
+    if len(story_ids) > settings.STORY_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.STORY_BATCH_MAX_IDS} ids per request"
+        )
+    stories = crud_story.get_stories_by_ids(db, story_ids=story_ids, user_id=current_user.id, fields=fields)
+    return Response(content=_dump_stories(stories, fields), media_type="application/json")
+
 @router.get("/{story_id}", response_model=schemas.Story)
 async def read_story(
     story_id: int,
-    db: Session = Depends(get_db),
+    fields: Optional[List[str]] = Depends(story_fields),
+    db: Session = Depends(security.get_read_db),
     current_user: models.User = Depends(security.get_current_active_user),
 ):
     """
-    Get a specific story by id.
+    Get a specific story by id, optionally only some `fields`.
     """
-    db_story = crud_story.get_story(db, story_id=story_id, user_id=current_user.id)
+    db_story = crud_story.get_story(db, story_id=story_id, user_id=current_user.id, fields=fields)
     if db_story is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Story not found"
         )
+    if fields is not None:
+        body = _sparse_adapter.dump_json({field: getattr(db_story, field) for field in fields})
+        return Response(content=body, media_type="application/json")
     return db_story
 
 @router.put("/{story_id}", response_model=schemas.Story)
-async def update_story(
+def update_story(
     story_id: int,
     story: schemas.StoryUpdate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(security.get_current_active_user),
 ):
     """
-    Update a story.
+    Update a story. Runs in the threadpool, like story creation.
     """
     db_story = crud_story.update_story(
         db=db,
@@ -80,6 +197,98 @@ async def update_story(
         )
     return db_story
 
+@router.patch("/{story_id}/content", response_model=schemas.StoryContentPatchResult)
+def patch_story_content(
+    story_id: int,
+    patch: schemas.StoryContentPatch,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    Apply text edits to a story's content.
+    
+    The edits must be made against the story's current revision; a stale
+    `base_revision` is rejected with 409 so the client can rebase. Runs in
+    the threadpool, like story creation.
+    """
+    db_story = crud_story.get_story(
+        db,
+        story_id=story_id,
+        user_id=current_user.id,
+        for_update=True
+    )
+    if db_story is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    if db_story.revision != patch.base_revision:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Story is at revision {db_story.revision}, not {patch.base_revision}"
+        )
+    
+    edits = [(edit.start, edit.end, edit.text) for edit in patch.edits]
+    try:
+        db_story = crud_story.patch_story_content(db, db_story=db_story, edits=edits)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    
+    return {
+        "id": db_story.id,
+        "revision": db_story.revision,
+        "length": len(db_story.content),
+        "updated_at": db_story.updated_at,
+    }
+
+@router.get("/{story_id}/revisions", response_model=List[schemas.StoryRevision])
+async def read_story_revisions(
+    story_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    List the stored revisions of a story, newest first.
+    """
+    db_story = crud_story.get_story(db, story_id=story_id, user_id=current_user.id)
+    if db_story is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    return crud_revision.get_revisions(db, story_id=story_id, skip=skip, limit=limit)
+
+@router.get("/{story_id}/revisions/{version}", response_model=schemas.StoryRevisionContent)
+async def read_story_revision(
+    story_id: int,
+    version: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    Get the content of a story as it was at a given revision.
+    """
+    db_story = crud_story.get_story(db, story_id=story_id, user_id=current_user.id)
+    if db_story is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    db_revision = crud_revision.reconstruct_revision(db, db_story=db_story, version=version)
+    if db_revision is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Revision not found"
+        )
+    return db_revision
+
 @router.delete("/{story_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_story(
     story_id: int,
@@ -101,14 +310,39 @@ async def delete_story(
         )
     return None
 
+@router.get("/{story_id}/analytics", response_model=schemas.StoryAnalytics)
+async def read_story_analytics(
+    story_id: int,
+    arc_points: int = 20,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(security.get_current_active_user),
+):
+    """
+    Get instant text metrics for a story.
+    
+    Computed locally in milliseconds, so clients can show feedback while the
+    model-based analysis from `POST /{story_id}/analyze` is still running.
+    """
+    db_story = crud_story.get_story(db, story_id=story_id, user_id=current_user.id)
+    if db_story is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Story not found"
+        )
+    return analytics.analyze_text(db_story.content, arc_points=max(1, min(arc_points, 200)))
+
 @router.post("/{story_id}/analyze", response_model=schemas.Story)
 async def analyze_story(
     story_id: int,
+    priority: Literal["interactive", "batch"] = "interactive",
     db: Session = Depends(get_db),
     current_user: models.User = Depends(security.get_current_active_user),
 ):
     """
     Analyze a story and return insights.
+    
+    Clients analyzing many stories in bulk should pass `priority=batch` so
+    single interactive requests are served first.
     """
     # First get the story to ensure it exists and user has access
     db_story = crud_story.get_story(
@@ -122,21 +356,46 @@ async def analyze_story(
             detail="Story not found"
         )
     
-    # TODO: Implement actual story analysis logic
-    # This is a placeholder that just returns some mock data
-    analysis = {
-        "emotional_tone": "positive",
-        "key_themes": ["adventure", "friendship"],
-        "word_count": len(db_story.content.split()),
-        "readability": "intermediate",
-        "sentiment_score": 0.8
-    }
+    # Reuse the analysis of a near-identical story when enabled
+    if settings.DEDUP_REUSE_ANALYSIS:
+        duplicate_ids = [
+            duplicate_id for duplicate_id, _ in crud_story.find_near_duplicates(db, db_story, user_id=current_user.id)
+        ]
+        duplicates = crud_story.get_stories_by_ids(db, duplicate_ids, user_id=current_user.id, fields=["analysis"])
+        for duplicate in duplicates:
+            if duplicate.analysis:
+                return crud_story.update_story_analysis(
+                    db=db,
+                    story_id=story_id,
+                    analysis=duplicate.analysis,
+                    user_id=current_user.id
+                )
+    
+    # Run the model call under the per-user rate limit, then wait for a fair turn
+    async with admit_analysis(current_user.id, priority):
+        analysis, run_metrics = await ai.run_analysis(
+            db_story.content,
+            user_id=current_user.id,
+            priority=priority
+        )
+    crud_analysis.record_analysis_run(
+        db,
+        run_metrics,
+        story_id=story_id,
+        user_id=current_user.id
+    )
+    
+    if analysis.startswith("Analysis Error"):
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=analysis
+        )
     
     # Update the story with the analysis
     db_story = crud_story.update_story_analysis(
         db=db,
         story_id=story_id,
-        analysis=str(analysis),  # Store as string in the database
+        analysis=analysis,
         user_id=current_user.id
     )
     
@@ -1,13 +1,15 @@
 import logging
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from .... import models, schemas
 from ....crud import user as crud_user
-from ....database import get_db
-from ....core import security
+from ....crud import stats as crud_stats
+from ....database import SessionLocal, get_db
+from ....core import security, tracing
+from ....core.config import settings
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -17,7 +19,7 @@ router = APIRouter()
 async def read_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(security.get_read_db),
     current_user: models.User = Depends(security.get_current_active_superuser),
 ):
     """
@@ -36,52 +38,28 @@ async def read_user_me(
     
     Returns the currently authenticated user's information.
     """
-    try:
-        logger.info(f"[DEBUG] /users/me - Fetching user data for user_id: {current_user.id}")
-        
-        # Get fresh user data from the database
-        db_user = crud_user.get_user(db, user_id=current_user.id)
-        if not db_user:
-            logger.error(f"[ERROR] /users/me - User not found in database: {current_user.id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Convert to dict to log the actual data
-        user_dict = {
-            'id': db_user.id,
-            'email': db_user.email,
-            'full_name': db_user.full_name,
-            'is_active': db_user.is_active,
-            'is_superuser': db_user.is_superuser,
-            'created_at': db_user.created_at.isoformat() if db_user.created_at else None,
-            'updated_at': db_user.updated_at.isoformat() if db_user.updated_at else None
-        }
-        
-        logger.info(f"[DEBUG] /users/me - User data to return: {user_dict}")
-        
-        # Log the raw SQL query being executed
-        logger.info(f"[DEBUG] /users/me - Raw SQL: {str(db.query(models.User).filter(models.User.id == current_user.id))}")
-        
-        # Log the actual database response
-        logger.info(f"[DEBUG] /users/me - Raw DB response: {db_user.__dict__}")
-        
-        # Convert SQLAlchemy model to Pydantic model
-        user_schema = schemas.User.from_orm(db_user)
-        logger.info(f"Successfully fetched user data for: {db_user.email}")
-        
-        return user_schema
-        
-    except HTTPException as http_exc:
-        logger.error(f"[ERROR] /users/me - HTTP Error: {http_exc.detail}")
-        raise http_exc
-    except Exception as e:
-        logger.error(f"[ERROR] /users/me - Unexpected error: {str(e)}", exc_info=True)
+    db_user = crud_user.get_user(db, user_id=current_user.id)
+    if not db_user:
+        logger.error("User %s not found in database", current_user.id)
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred while fetching user data: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
+    logger.debug("Fetched user %s", db_user.id)
+    return schemas.User.from_orm(db_user)
+
+@router.get("/me/stats", response_model=schemas.UserStats)
+async def read_user_me_stats(
+    current_user: models.User = Depends(security.get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get writing statistics for the current user.
+    
+    Served from a summary row kept up to date on every story write, so the
+    cost does not depend on how many stories the user has.
+    """
+    return crud_stats.get_user_stats(db, user_id=current_user.id)
 
 @router.put("/me", response_model=schemas.User)
 async def update_user_me(
@@ -97,8 +75,8 @@ async def update_user_me(
     - **password**: New password (if changing)
     - **full_name**: User's full name
     """
-    # Log the update attempt
-    logger.info(f"Updating user {current_user.id} with data: {user_in.dict(exclude_unset=True)}")
+    # Field names only: the payload may hold a new password
+    logger.info("Updating user %s fields %s", current_user.id, sorted(user_in.model_fields_set))
     
     # Update the user
     user = crud_user.update_user(db, user_id=current_user.id, user_update=user_in)
@@ -110,8 +88,7 @@ async def update_user_me(
             detail="Could not update user"
         )
         
-    logger.info(f"Successfully updated user {current_user.id}")
-    return user
+    logger.debug("Updated user %s", current_user.id)
     return user
 
 @router.get("/{user_id}", response_model=schemas.User)
@@ -155,14 +132,35 @@ async def update_user(
     user = crud_user.update_user(db, user_id=user_id, user_update=user_in)
     return user
 
+@tracing.traced("purge user")
+def purge_user(user_id: int) -> None:
+    """Delete a user and their stories outside the request cycle."""
+    db = SessionLocal()
+    try:
+        crud_user.delete_user(db, user_id=user_id)
+        logger.info(f"Purged user {user_id}")
+    except Exception as e:
+        logger.error(f"Failed to purge user {user_id}: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
 @router.delete("/{user_id}", response_model=schemas.User)
-async def delete_user(
+def delete_user(
     user_id: int,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    background: Optional[bool] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(security.get_current_active_superuser),
 ):
     """
-    Delete a user. Only available to superusers.
+    Delete a user and all of their stories. Only available to superusers.
+    
+    In the background the account is deactivated immediately and the purge
+    runs after the response is sent (202 Accepted). That is the default for
+    accounts with more than `USER_PURGE_BACKGROUND_STORIES` stories;
+    `background=true` or `false` chooses explicitly.
     """
     user = crud_user.get_user(db, user_id=user_id)
     if user is None:
@@ -170,5 +168,14 @@ async def delete_user(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    if background is None:
+        limit = settings.USER_PURGE_BACKGROUND_STORIES
+        background = crud_user.count_user_stories(db, user_id, limit=limit + 1) > limit
+    if background:
+        user.is_active = False
+        db.commit()
+        background_tasks.add_task(purge_user, user_id)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return user
     user = crud_user.delete_user(db, user_id=user_id)
     return user
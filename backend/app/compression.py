@@ -0,0 +1,116 @@
+"""Transparent zstd compression for large story bodies.
+
+Bodies are stored in a binary column. Text below the size threshold, or any
+text while compression is disabled, is stored as plain UTF-8; larger text is
+stored as a zstd frame. The two are told apart by the zstd magic number,
+which can never start valid UTF-8, so mixed tables need no flag column and
+switching compression on or off never requires a rewrite.
+
+The database cannot read a compressed body, so story search goes through
+an index built from the text as it is written (see ``app.fulltext``).
+"""
+import threading
+from typing import Optional
+
+from sqlalchemy import LargeBinary, case, func, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Text, TypeDecorator
+
+from .core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - only needed when compression is enabled
+    zstandard = None
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_local = threading.local()
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise RuntimeError("The zstandard package is required to read or write compressed story bodies")
+
+
+def compress_text(text: str, threshold: int, level: int) -> bytes:
+    """Encode text, compressing it with zstd if it is at least ``threshold`` bytes."""
+    data = text.encode("utf-8")
+    if len(data) < threshold:
+        return data
+    _require_zstandard()
+    # Compressor objects are not safe to share between threads
+    compressors = getattr(_local, "compressors", None)
+    if compressors is None:
+        compressors = _local.compressors = {}
+    if level not in compressors:
+        compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressors[level].compress(data)
+
+
+def decompress_bytes(data: bytes) -> str:
+    """Decode a value written by :func:`compress_text`."""
+    data = bytes(data)
+    if data.startswith(ZSTD_MAGIC):
+        _require_zstandard()
+        decompressor = getattr(_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = _local.decompressor = zstandard.ZstdDecompressor()
+        data = decompressor.decompress(data)
+    return data.decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """A text column stored as bytes, zstd-compressed above a size threshold.
+
+    Decompression runs in ``process_result_value``, i.e. only for queries
+    that actually select the column.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return str
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        if not settings.STORY_COMPRESSION_ENABLED:
+            return value.encode("utf-8")
+        return compress_text(
+            value,
+            threshold=settings.STORY_COMPRESSION_THRESHOLD,
+            level=settings.STORY_COMPRESSION_LEVEL,
+        )
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[str]:
+        if value is None:
+            return None
+        return decompress_bytes(value)
+
+
+class _utf8_text(FunctionElement):
+    """Reinterpret a binary column holding UTF-8 as text."""
+    type = Text()
+    inherit_cache = True
+
+
+@compiles(_utf8_text)
+def _compile_utf8_text(element, compiler, **kw):
+    return "CAST(%s AS TEXT)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(_utf8_text, "postgresql")
+def _compile_utf8_text_postgresql(element, compiler, **kw):
+    return "convert_from(%s, 'UTF8')" % compiler.process(element.clauses, **kw)
+
+
+def plain_text(column) -> ColumnElement:
+    """SQL expression for the text of a :class:`CompressedText` column; NULL for compressed values."""
+    return case(
+        (func.substr(column, 1, len(ZSTD_MAGIC)) == literal(ZSTD_MAGIC, LargeBinary), None),
+        else_=_utf8_text(column),
+    )
@@ -0,0 +1,228 @@
+"""Admission control for expensive model calls.
+
+Two independent guards protect Ollama:
+
+- a per-user token bucket that limits how often a user may start an
+  analysis (429), and
+- a load shedder that estimates the wait in the model call scheduler
+  (``ai.analysis_scheduler``, which also enforces the concurrency cap) from
+  recent analysis durations; requests that would wait longer than the
+  budget are rejected immediately (``503``) instead of piling up.
+
+Token buckets live in process memory by default. With
+``RATE_LIMIT_BACKEND=postgres`` they are kept in the ``rate_limit_buckets``
+table so all workers share them; each worker deletes idle rows every
+``RATE_LIMIT_PRUNE_SECONDS``. The scheduler is always per process.
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from ..ai import FairShareScheduler, analysis_scheduler
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at ``rate`` tokens per second."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take one token.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class InMemoryRateLimiter:
+    """Per-key token buckets kept in this process."""
+
+    def __init__(self, capacity: float, rate: float, max_keys: int = 10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(self.capacity, self.rate, now)
+            return bucket.take(now)
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely is indistinguishable from a new one
+        full_after = self.capacity / self.rate
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket.updated < full_after
+        }
+
+
+class PostgresRateLimiter:
+    """Per-key token buckets stored in the database, shared by all workers."""
+
+    def __init__(self, capacity: float, rate: float, session_factory=None, prune_interval: float = 300.0):
+        self.capacity = capacity
+        self.rate = rate
+        self.session_factory = session_factory
+        self.prune_interval = prune_interval
+        self._pruned_at = time.time()
+
+    def acquire(self, key: str) -> float:
+        from sqlalchemy.dialects.postgresql import insert
+
+        from ..database import SessionLocal
+        from ..models import RateLimitBucket
+
+        now = time.time()
+        db = (self.session_factory or SessionLocal)()
+        try:
+            # Create a missing bucket first, so concurrent first requests for
+            # a key all end up locking the same row instead of racing to insert
+            db.execute(
+                insert(RateLimitBucket)
+                .values(key=key, tokens=self.capacity, updated_at=now)
+                .on_conflict_do_nothing(index_elements=[RateLimitBucket.key])
+            )
+            row = db.query(RateLimitBucket).filter(RateLimitBucket.key == key).with_for_update().one()
+            bucket = TokenBucket(self.capacity, self.rate, row.updated_at)
+            bucket.tokens = row.tokens
+            retry_after = bucket.take(now)
+            row.tokens, row.updated_at = bucket.tokens, bucket.updated
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if now - self._pruned_at >= self.prune_interval:
+            self._pruned_at = now
+            try:
+                self.prune(now)
+            except Exception as e:
+                logger.warning(f"Failed to prune rate limit buckets: {e}")
+        return retry_after
+
+    def prune(self, now: float) -> int:
+        """Delete the buckets idle long enough to have refilled completely.
+
+        Such a bucket is indistinguishable from a new one, which ``acquire``
+        creates on demand.
+
+        Returns:
+            The number of buckets deleted
+        """
+        from ..database import SessionLocal
+        from ..models import RateLimitBucket
+
+        full_after = self.capacity / self.rate
+        db = (self.session_factory or SessionLocal)()
+        try:
+            deleted = (
+                db.query(RateLimitBucket)
+                .filter(RateLimitBucket.updated_at < now - full_after)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return deleted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+class AdmissionController:
+    """Sheds requests whose estimated wait in the model call scheduler is too long."""
+
+    def __init__(self, scheduler: FairShareScheduler, max_queue_wait: float):
+        self.scheduler = scheduler
+        self.max_queue_wait = max_queue_wait
+
+    def estimated_wait(self, priority: str = "interactive") -> float:
+        """Seconds a new request of this priority would wait for a free slot."""
+        return self.scheduler.estimated_wait(priority)
+
+    def check_capacity(self, priority: str = "interactive") -> None:
+        """Shed the request if its estimated queue wait is over budget.
+
+        Raises:
+            HTTPException: 503 with a Retry-After header
+        """
+        wait = self.estimated_wait(priority)
+        if wait > self.max_queue_wait:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Analysis capacity exhausted, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(wait - self.max_queue_wait)))},
+            )
+
+
+def _create_rate_limiter():
+    capacity = settings.ANALYZE_RATE_LIMIT_BURST
+    rate = settings.ANALYZE_RATE_LIMIT_PER_HOUR / 3600
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresRateLimiter(capacity, rate, prune_interval=settings.RATE_LIMIT_PRUNE_SECONDS)
+    return InMemoryRateLimiter(capacity, rate)
+
+
+analysis_rate_limiter = _create_rate_limiter()
+analysis_admission = AdmissionController(
+    scheduler=analysis_scheduler,
+    max_queue_wait=settings.ANALYZE_MAX_QUEUE_WAIT_SECONDS,
+)
+
+
+@asynccontextmanager
+async def admit_analysis(user_id: int, priority: str = "interactive") -> AsyncIterator[None]:
+    """Admit one analysis for a user, or fail fast with 429/503.
+
+    Admitted calls then queue in ``ai.analysis_scheduler`` for their turn.
+
+    Raises:
+        HTTPException: 429 if the user is over their rate limit, 503 if the
+            shared queue is too long; both carry a Retry-After header
+    """
+    # Shed before taking a token so a rejected request costs the user nothing
+    analysis_admission.check_capacity(priority)
+
+    key = f"analyze:{user_id}"
+    if isinstance(analysis_rate_limiter, InMemoryRateLimiter):
+        retry_after = analysis_rate_limiter.acquire(key)
+    else:
+        retry_after = await run_in_threadpool(analysis_rate_limiter.acquire, key)
+    if retry_after > 0:
+        logger.info(f"Rate limited analysis for user {user_id}, retry in {retry_after:.0f}s")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many analysis requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    yield
@@ -0,0 +1,115 @@
+"""In-process cache of serialized story list responses.
+
+Entries are keyed on the owner, the owner's current version and the query
+parameters, and hold the JSON bytes sent to the client. Story writes bump
+the owner's version once committed, which makes every cached list of that
+owner unreachable at once, so invalidation is exact rather than time based.
+Memory is bounded by evicting the least recently used entries once the
+stored bytes exceed the configured budget.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from .config import settings
+
+Version = Tuple[int, int]
+CacheKey = Tuple[int, Version, Hashable]
+
+
+class ResponseCache:
+    """A byte-size bounded LRU of responses, invalidated per owner."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._owner_keys: Dict[int, Set[CacheKey]] = {}
+        self._versions: Dict[int, int] = {}
+        self._changed_at: Dict[int, float] = {}
+        # Bumped by clear(), so it also covers owners never seen before
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def version(self, owner_id: int) -> Version:
+        """The owner's current version, to be read before running the query."""
+        return self._generation, self._versions.get(owner_id, 0)
+
+    def get(self, owner_id: int, version: Version, params: Hashable) -> Optional[bytes]:
+        key = (owner_id, version, params)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, owner_id: int, version: Version, params: Hashable, body: bytes) -> None:
+        """Store a response computed at ``version``; dropped if the owner wrote since."""
+        if len(body) > self.max_bytes // 8:
+            return
+        key = (owner_id, version, params)
+        with self._lock:
+            if self.version(owner_id) != version or key in self._entries:
+                return
+            self._entries[key] = body
+            self._owner_keys.setdefault(owner_id, set()).add(key)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, owner_id: int) -> None:
+        """Bump the owner's version and drop their cached responses."""
+        with self._lock:
+            self._versions[owner_id] = self._versions.get(owner_id, 0) + 1
+            self._changed_at[owner_id] = time.monotonic()
+            self.invalidations += 1
+            for key in self._owner_keys.pop(owner_id, ()):
+                self.bytes -= len(self._entries.pop(key))
+
+    def changed_within(self, owner_id: int, seconds: float) -> bool:
+        """Whether the owner's stories changed in the last ``seconds``."""
+        changed_at = self._changed_at.get(owner_id)
+        return changed_at is not None and time.monotonic() - changed_at < seconds
+
+    def clear(self) -> None:
+        """Drop every entry and make every version read so far stale."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._owner_keys.clear()
+            self.bytes = 0
+
+    def _evict(self, key: CacheKey) -> None:
+        self.bytes -= len(self._entries.pop(key))
+        owner_keys = self._owner_keys.get(key[0])
+        if owner_keys is not None:
+            owner_keys.discard(key)
+            if not owner_keys:
+                del self._owner_keys[key[0]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.STORY_LIST_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "owners": len(self._owner_keys),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+story_list_cache = ResponseCache(max_bytes=settings.STORY_LIST_CACHE_MAX_BYTES)
@@ -20,22 +20,63 @@ class Settings(BaseSettings):
     # Debug mode
     DEBUG: bool = Field(False, description="Enable debug mode")
     
+    # Logging: records go through a queue to a background thread that writes them
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # "text", or "json" for one JSON object per line
+    LOG_SAMPLING: Dict[str, float] = {}  # Logger name -> share of its records below WARNING that are kept
+    LOG_RATE_LIMITS: Dict[str, float] = {}  # Logger name -> records below WARNING kept per second
+    
+    # Tracing: spans of requests, SQL statements and Ollama calls (see app.core.tracing)
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = Field(0.01, ge=0, le=1)  # Share of new traces recorded; a traceparent header decides for its request
+    TRACING_EXPORTER: str = "memory"  # "memory" keeps recent spans for GET /admin/traces, "file" appends OTLP JSON to TRACING_FILE
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_MEMORY_SPANS: int = 10000  # Spans kept by the in-memory collector of each worker
+    
     # Security
     SECRET_KEY: str = Field(..., min_length=32, max_length=255, description="Secret key for JWT token generation")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     
+    # Token revocation
+    REVOCATION_REFRESH_SECONDS: float = 2.0  # How often workers pick up revocations from the database
+    REVOCATION_REBUILD_SECONDS: float = 3600.0  # How often expired revocations are dropped
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    
     # Server
     SERVER_NAME: str = "storycraft-api"
     SERVER_HOST: str = "http://localhost:8000"
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = ["http://localhost:3000"]
+    SERVER_BIND: str = "0.0.0.0:8000"  # Address the production server (app.server) listens on
+    WEB_CONCURRENCY: Optional[int] = None  # Worker processes, defaults to one per CPU
+    WORKER_MAX_REQUESTS: int = 10000  # Recycle a worker after this many requests to bound memory growth
+    WORKER_MAX_REQUESTS_JITTER: int = 1000
+    WORKER_GRACEFUL_TIMEOUT: int = 420  # Longer than an Ollama analysis call may take
+    WORKER_TIMEOUT: int = 60
+    WORKER_KEEPALIVE: int = 5
+    
+    # Database: SQLALCHEMY_DATABASE_URI, else PostgreSQL from POSTGRES_*, else SQLite at SQLITE_PATH
+    POSTGRES_SERVER: Optional[str] = Field(None, description="Database server hostname or IP")
+    POSTGRES_USER: Optional[str] = Field(None, description="Database username")
+    POSTGRES_PASSWORD: Optional[str] = Field(None, description="Database password")
+    POSTGRES_DB: Optional[str] = Field(None, description="Database name")
+    SQLITE_PATH: str = "db/storycraft.db"
+    SQLALCHEMY_DATABASE_URI: Optional[str] = None
+    # Read replicas for read-only routes as a JSON list; empty sends every query to the primary
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # Reads stay on the primary this long after a user writes
+    
+    # SQLite mode: one writer connection per process plus a pool of readers, in WAL mode
+    SQLITE_READ_POOL_SIZE: int = Field(4, ge=1)  # Reader connections kept open, more are opened when busy
+    SQLITE_BUSY_TIMEOUT_SECONDS: float = 5.0  # How long a writer waits for another process's write lock
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # Page cache per connection
     
-    # Database
-    POSTGRES_SERVER: str = Field(..., description="Database server hostname or IP")
-    POSTGRES_USER: str = Field(..., description="Database username")
-    POSTGRES_PASSWORD: str = Field(..., description="Database password")
-    POSTGRES_DB: str = Field(..., description="Database name")
-    SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # Story partitioning (PostgreSQL): hash partitions of stories by owner, 0 keeps a single table.
+    # Applied by the migrations; run repartition_stories.py after changing it.
+    STORIES_PARTITIONS: int = Field(0, ge=0)
+    STORIES_REPARTITION_BATCH_SIZE: int = 10000  # Story ids copied per transaction
     
     # Email
     SMTP_TLS: bool = True
@@ -50,6 +91,71 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER_EMAIL: EmailStr = Field(..., description="Email of the first superuser")
     FIRST_SUPERUSER_PASSWORD: str = Field(..., min_length=8, description="Password for the first superuser")
     
+    # Bulk user provisioning (provision_users.py): processes hashing passwords, unset uses every CPU
+    PROVISION_HASH_WORKERS: Optional[int] = Field(None, ge=1)
+    
+    # Account deletion: accounts with more stories are purged after the response by default
+    USER_PURGE_BACKGROUND_STORIES: int = Field(1000, ge=0)
+    
+    # Near-duplicate detection (MinHash/LSH)
+    DEDUP_NUM_PERM: int = 128  # Signature width, must be divisible by DEDUP_BANDS
+    DEDUP_BANDS: int = 32
+    DEDUP_SHINGLE_SIZE: int = 5  # Words per shingle
+    DEDUP_THRESHOLD: float = 0.8  # Minimum estimated Jaccard similarity
+    DEDUP_PATCH_MIN_CHANGE: float = 0.05  # Share of the text a content patch must change to re-sign the story
+    DEDUP_PATCH_RESIGN_EVERY: int = Field(20, ge=1, description="Revisions after which a patched story is re-signed anyway")
+    DEDUP_REUSE_ANALYSIS: bool = False  # Reuse analysis from a near-duplicate story
+    
+    # Story revision history
+    STORY_REVISION_SNAPSHOT_INTERVAL: int = Field(20, ge=1, description="Store a full snapshot every N revisions")
+    
+    # Story body compression (requires the zstandard package)
+    STORY_COMPRESSION_ENABLED: bool = False
+    STORY_COMPRESSION_THRESHOLD: int = 8192  # Bytes of UTF-8 before a body is compressed
+    STORY_COMPRESSION_LEVEL: int = 3
+    
+    # Story list response cache (per worker)
+    STORY_LIST_CACHE_ENABLED: bool = True
+    STORY_LIST_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    
+    # Story batch fetch (GET /stories/batch)
+    STORY_BATCH_MAX_IDS: int = Field(100, ge=1)  # Most ids accepted in one request
+    
+    # Cross-worker cache invalidation (PostgreSQL LISTEN/NOTIFY)
+    INVALIDATION_CHANNEL: str = "storycraft_invalidation"
+    INVALIDATION_COALESCE_SECONDS: float = 0.05  # Window over which a burst of notifications is merged
+    
+    # WebSocket event push
+    WS_QUEUE_SIZE: int = Field(100, ge=1, description="Events buffered per connection before it must resync")
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0  # Disconnect clients that stop reading
+    WS_MAX_CONNECTIONS_PER_USER: int = 20
+    WS_TOKEN_CHECK_SECONDS: float = 2.0  # How often open connections re-check their token for revocation
+    
+    # Analysis admission control
+    RATE_LIMIT_BACKEND: str = Field("memory", pattern="^(memory|postgres)$", description="Where rate limit buckets are kept")
+    RATE_LIMIT_PRUNE_SECONDS: float = 300.0  # How often a worker deletes idle buckets from rate_limit_buckets
+    ANALYZE_RATE_LIMIT_PER_HOUR: int = Field(20, ge=1, description="Analyses a user may start per hour")
+    ANALYZE_RATE_LIMIT_BURST: int = Field(5, ge=1, description="Analyses a user may start back to back")
+    ANALYZE_MAX_CONCURRENCY: int = Field(2, ge=1, description="Concurrent model calls per worker")
+    ANALYZE_MAX_QUEUE_WAIT_SECONDS: float = 600.0  # Shed requests expected to wait longer
+    ANALYZE_EXPECTED_DURATION_SECONDS: float = 60.0  # Initial duration estimate before measurements
+    ANALYZE_SCHEDULER_QUANTUM_TOKENS: int = Field(2000, ge=1, description="Prompt tokens a user may use per scheduling turn")
+    ANALYZE_BATCH_EVERY: int = Field(4, ge=1, description="Interactive calls between batch calls while both wait")
+    
+    # Ollama model residency
+    OLLAMA_MODEL: str = "qwen3:1.7b"
+    OLLAMA_WARM_MODELS: List[str] = []  # Models preloaded at startup and kept warm, defaults to OLLAMA_MODEL
+    OLLAMA_WARM_ON_STARTUP: bool = True
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps a model loaded after a request ("-1" for ever)
+    OLLAMA_KEEPER_INTERVAL_SECONDS: float = 600.0  # Residency refresh during business hours, below OLLAMA_KEEP_ALIVE
+    OLLAMA_KEEPER_TIMEZONE: str = "UTC"
+    OLLAMA_KEEPER_START_HOUR: int = Field(8, ge=0, le=23)
+    OLLAMA_KEEPER_END_HOUR: int = Field(19, ge=1, le=24)
+    OLLAMA_KEEPER_WEEKDAYS: List[int] = [0, 1, 2, 3, 4]  # Monday is 0
+    
+    # Analysis metrics
+    ANALYSIS_COLD_LOAD_MS: float = 1000.0  # Model load time from which a run counts as a cold load
+    
     # API Documentation
     OPENAPI_URL: Optional[str] = "/openapi.json"
     
@@ -71,14 +177,23 @@ class Settings(BaseSettings):
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
         if isinstance(v, str):
             return v
+        if not values.get("POSTGRES_SERVER"):
+            return f"sqlite:///{values.get('SQLITE_PATH')}"
         
-        return PostgresDsn.build(
+        return str(PostgresDsn.build(
             scheme="postgresql",
             username=values.get("POSTGRES_USER"),
             password=values.get("POSTGRES_PASSWORD"),
             host=values.get("POSTGRES_SERVER"),
-            path=f"/{values.get('POSTGRES_DB') or ''}",
-        )
+            path=f"{values.get('POSTGRES_DB') or ''}",
+        ))
+    
+    @validator("DEDUP_BANDS")
+    def check_dedup_bands(cls, v: int, values: Dict[str, Any]) -> int:
+        num_perm = values.get("DEDUP_NUM_PERM")
+        if v < 1 or (num_perm is not None and num_perm % v):
+            raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) must be divisible by DEDUP_BANDS ({v})")
+        return v
     
     @validator("EMAILS_FROM_NAME")
     def get_project_name(cls, v: Optional[str], values: Dict[str, Any]) -> str:
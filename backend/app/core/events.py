@@ -0,0 +1,123 @@
+"""Push story events to connected WebSocket clients.
+
+Writers call :func:`publish_on_commit` in their transaction. The event rides
+the cache invalidation bus, so it reaches the user's connections in every
+worker once the transaction commits, and is dropped if it rolls back.
+
+Each connection has a small bounded queue drained by its own sender task. A
+client that falls behind loses its queued events and gets a single
+``resync`` event instead, telling it to refetch; one that stops reading
+altogether is disconnected once a send has been blocked for
+``WS_SEND_TIMEOUT_SECONDS``. Idle connections cost a queue and three
+suspended tasks: the sender, the receiver and the endpoint's token watcher.
+"""
+import asyncio
+import json
+import threading
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .invalidation import invalidate_on_commit, register_handler, register_resync
+
+_RESYNC = json.dumps({"type": "resync"})
+
+
+class Connection:
+    """One client socket and its outgoing queue."""
+
+    def __init__(self, websocket: WebSocket, user_id: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind for individual events to be useful
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_RESYNC)
+
+    async def send_forever(self) -> None:
+        while True:
+            message = await self.queue.get()
+            await asyncio.wait_for(self.websocket.send_text(message), settings.WS_SEND_TIMEOUT_SECONDS)
+
+
+class EventHub:
+    """Connections of this worker, grouped by user."""
+
+    def __init__(self):
+        self._connections: Dict[int, Set[Connection]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def connection_count(self, user_id: Optional[int] = None) -> int:
+        if user_id is not None:
+            return len(self._connections.get(user_id, ()))
+        return sum(len(connections) for connections in self._connections.values())
+
+    def add(self, connection: Connection) -> None:
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._connections.setdefault(connection.user_id, set()).add(connection)
+
+    def remove(self, connection: Connection) -> None:
+        with self._lock:
+            connections = self._connections.get(connection.user_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self._connections[connection.user_id]
+
+    def publish(self, user_id: int, event: dict) -> None:
+        """Queue an event for the user's connections in this worker; callable from any thread."""
+        if user_id not in self._connections or self._loop is None:
+            return
+        message = json.dumps(event)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._fan_out(user_id, message)
+        else:
+            self._loop.call_soon_threadsafe(self._fan_out, user_id, message)
+
+    def _fan_out(self, user_id: int, message: str) -> None:
+        for connection in list(self._connections.get(user_id, ())):
+            connection.offer(message)
+
+    def resync_all(self) -> None:
+        """Tell every client to refetch, after events may have been missed."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._resync_all)
+
+    def _resync_all(self) -> None:
+        for connections in list(self._connections.values()):
+            for connection in list(connections):
+                connection.offer(_RESYNC)
+
+
+event_hub = EventHub()
+
+
+def publish_on_commit(db: Session, user_id: int, event_type: str, story_id: int) -> None:
+    """Push ``event_type`` for a story to the user's clients once ``db`` commits."""
+    invalidate_on_commit(db, "story_event", f"{user_id}:{event_type}:{story_id}")
+
+
+def _deliver(key: str) -> None:
+    user_id, event_type, story_id = key.split(":", 2)
+    event_hub.publish(int(user_id), {"type": event_type, "story_id": int(story_id)})
+
+
+register_handler("story_event", _deliver)
+register_resync(event_hub.resync_all)
@@ -0,0 +1,194 @@
+"""Cross-worker cache invalidation over PostgreSQL LISTEN/NOTIFY.
+
+Writers call :func:`invalidate_on_commit` inside their transaction. The keys
+are collected on the session; just before commit they are sent with
+``pg_notify``, which PostgreSQL delivers only if and when the transaction
+commits, and just after commit the local caches are invalidated directly.
+
+Each worker runs :func:`listen_for_invalidations` in the background. It
+gathers notifications for a short window so a burst of writes costs one
+pass over the caches, skips its own messages and, after (re)connecting,
+clears every cache, since notifications sent while it was not listening
+are lost.
+
+On databases other than PostgreSQL only the local caches are invalidated.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import defaultdict
+from typing import Callable, Dict, List, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, engine
+from .cache import story_list_cache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes
+_MAX_PAYLOAD = 7500
+
+_handlers: Dict[str, Callable[[str], None]] = {}
+_resync_handlers: List[Callable[[], None]] = []
+
+
+def register_handler(kind: str, handler: Callable[[str], None]) -> None:
+    """Handle invalidations of ``kind``; the handler receives the key as a string."""
+    _handlers[kind] = handler
+
+
+def register_resync(handler: Callable[[], None]) -> None:
+    """Run ``handler`` when invalidations may have been missed."""
+    _resync_handlers.append(handler)
+
+
+def invalidate_on_commit(db: Session, kind: str, key) -> None:
+    """Invalidate ``kind``/``key`` in every worker once ``db`` commits."""
+    db.info.setdefault("invalidations", defaultdict(set))[kind].add(str(key))
+
+
+def _worker_id() -> str:
+    # Computed per call: workers forked from a preloaded master share module state
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _payloads(pending: Dict[str, Set[str]]) -> List[str]:
+    """Pack pending keys into as few NOTIFY payloads as fit."""
+    payloads, batch, size = [], defaultdict(list), 0
+    for kind, keys in pending.items():
+        for key in keys:
+            if batch and size + len(key) + 4 > _MAX_PAYLOAD:
+                payloads.append(json.dumps({"worker": _worker_id(), "keys": batch}))
+                batch, size = defaultdict(list), 0
+            batch[kind].append(key)
+            size += len(key) + 4
+    if batch:
+        payloads.append(json.dumps({"worker": _worker_id(), "keys": batch}))
+    return payloads
+
+
+def _apply(pending: Dict[str, Set[str]]) -> None:
+    for kind, keys in pending.items():
+        handler = _handlers.get(kind)
+        if handler is None:
+            continue
+        for key in keys:
+            handler(key)
+
+
+def _resync() -> None:
+    for handler in _resync_handlers:
+        handler()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _notify_before_commit(session: Session) -> None:
+    pending = session.info.get("invalidations")
+    if not pending or session.get_bind().dialect.name != "postgresql":
+        return
+    for payload in _payloads(pending):
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": settings.INVALIDATION_CHANNEL, "payload": payload},
+        )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    pending = session.info.pop("invalidations", None)
+    if pending:
+        _apply(pending)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop("invalidations", None)
+
+
+def _connect():
+    """Open a dedicated autocommit connection listening on the channel."""
+    import psycopg2
+
+    url = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    # Keepalives make a silently dropped connection fail within about a minute
+    conn = psycopg2.connect(url, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f'LISTEN "{settings.INVALIDATION_CHANNEL}"')
+    return conn
+
+
+async def _consume(conn) -> None:
+    """Apply notifications until the connection fails."""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    failure: List[BaseException] = []
+
+    def on_readable() -> None:
+        try:
+            conn.poll()
+        except Exception as e:
+            failure.append(e)
+        ready.set()
+
+    loop.add_reader(conn.fileno(), on_readable)
+    try:
+        while True:
+            await ready.wait()
+            # Let the rest of a burst arrive, then apply it in one pass
+            await asyncio.sleep(settings.INVALIDATION_COALESCE_SECONDS)
+            ready.clear()
+            on_readable()
+            if failure:
+                raise failure[0]
+            pending: Dict[str, Set[str]] = defaultdict(set)
+            me = _worker_id()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    message = json.loads(notify.payload)
+                except ValueError:
+                    logger.warning(f"Ignoring malformed invalidation: {notify.payload[:100]}")
+                    continue
+                if message.get("worker") == me:
+                    continue
+                for kind, keys in message.get("keys", {}).items():
+                    pending[kind].update(keys)
+            if pending:
+                _apply(pending)
+    finally:
+        loop.remove_reader(conn.fileno())
+
+
+async def listen_for_invalidations() -> None:
+    """Keep a LISTEN connection open and apply other workers' invalidations."""
+    if engine.dialect.name != "postgresql":
+        return
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = await run_in_threadpool(_connect)
+            # Anything sent while we were not listening is lost
+            _resync()
+            backoff = 1.0
+            await _consume(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Invalidation listener failed, reconnecting in {backoff:.0f}s: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
+
+
+register_handler("story_list", lambda key: story_list_cache.invalidate(int(key)))
+register_resync(story_list_cache.clear)
@@ -0,0 +1,217 @@
+"""Logging set up off the request path.
+
+Handlers that write to a stream or file block the calling thread, which for
+``async`` endpoints is the event loop. ``configure_logging`` therefore gives
+the root logger a single ``QueueHandler``; a ``QueueListener`` thread
+formats the records and writes them out, as text or as one JSON object per
+line (``LOG_FORMAT``).
+
+Loggers that libraries give handlers of their own (uvicorn's, and
+gunicorn's, which the uvicorn worker copies to uvicorn's) get the same
+queue handler in place of theirs. SQL statements are logged, in DEBUG,
+through the ``sqlalchemy.engine`` logger rather than the engines' ``echo``
+handler.
+
+Records below WARNING can be thinned out per logger before they are queued:
+``LOG_SAMPLING`` keeps a random share of them and ``LOG_RATE_LIMITS`` caps
+them at a number per second. A rule applies to the named logger and its
+children, the most specific name winning. Warnings and errors always pass.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Dict, Optional, Tuple
+
+from .config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Loggers that libraries set up with handlers of their own, which would write
+# on the calling thread
+LIBRARY_LOGGERS = (
+    "uvicorn",
+    "uvicorn.error",
+    "uvicorn.access",
+    "gunicorn.error",
+    "gunicorn.access",
+    "sqlalchemy.engine",
+    "sqlalchemy.engine.Engine",
+)
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the ``extra`` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of, and rate limit, the records below WARNING of chosen loggers."""
+
+    def __init__(self, sampling: Dict[str, float], rate_limits: Dict[str, float]):
+        super().__init__()
+        self.sampling = sampling
+        self.rate_limits = rate_limits
+        self.dropped = 0
+        self._rules: Dict[str, Tuple[Optional[float], Optional[str]]] = {}
+        # Token buckets per rate limited logger name: (tokens, last refill)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _rule(self, name: str) -> Tuple[Optional[float], Optional[str]]:
+        """The share kept and the rate limited logger name that apply to ``name``."""
+        rule = self._rules.get(name)
+        if rule is None:
+            sampled = _most_specific(self.sampling, name)
+            rule = (self.sampling[sampled] if sampled is not None else None, _most_specific(self.rate_limits, name))
+            self._rules[name] = rule
+        return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        share, limited = self._rule(record.name)
+        if share is not None and random.random() >= share:
+            self.dropped += 1
+            return False
+        if limited is not None and not self._take(limited):
+            self.dropped += 1
+            return False
+        return True
+
+    def _take(self, name: str) -> bool:
+        rate = self.rate_limits[name]
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(name, (max(rate, 1.0), now))
+            tokens = min(max(rate, 1.0), tokens + (now - last) * rate)
+            allowed = tokens >= 1.0
+            self._buckets[name] = (tokens - 1.0 if allowed else tokens, now)
+        return allowed
+
+
+def _applies(prefix: str, name: str) -> bool:
+    return prefix in ("", "root") or name == prefix or name.startswith(prefix + ".")
+
+
+def _most_specific(rules: Dict[str, float], name: str) -> Optional[str]:
+    matches = [prefix for prefix in rules if _applies(prefix, name)]
+    return max(matches, key=len) if matches else None
+
+
+class _RecordQueueHandler(QueueHandler):
+    """Queues records with their message merged, but leaves the formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may be mutable or hold resources, so the message is merged now
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_handler: Optional[_RecordQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    stream: Optional[IO[str]] = None,
+) -> None:
+    """Send the root logger's records through a queue to a background writer.
+
+    Replaces the root logger's handlers, so it can be called again to
+    reconfigure. Defaults come from the settings, and output goes to stdout.
+    """
+    global _handler, _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if (log_format or settings.LOG_FORMAT) == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _handler = _RecordQueueHandler(queue.SimpleQueue())
+    if settings.LOG_SAMPLING or settings.LOG_RATE_LIMITS:
+        _handler.addFilter(SamplingFilter(settings.LOG_SAMPLING, settings.LOG_RATE_LIMITS))
+    _listener = QueueListener(_handler.queue, output)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+    route_library_loggers()
+    if settings.DEBUG:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+    _listener.start()
+
+
+def route_library_loggers() -> None:
+    """Replace the handlers of :data:`LIBRARY_LOGGERS` with the queue handler.
+
+    Loggers without handlers are left alone, whether they propagate or were
+    silenced. Call again after a library (re)installs its handlers.
+    """
+    for name in LIBRARY_LOGGERS:
+        logger = logging.getLogger(name)
+        if logger.handlers:
+            # Assigned, not changed in place: the list may be shared with another logger
+            logger.handlers = [_handler]
+            logger.propagate = False
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork() -> None:
+    # The writer thread does not survive fork (e.g. gunicorn workers forked
+    # from the preloaded app); give the child a fresh queue and listener
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_handler.queue, *_listener.handlers)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
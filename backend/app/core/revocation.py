@@ -0,0 +1,150 @@
+"""In-process mirror of the revoked token list.
+
+Revoked ``jti`` values are persisted in the ``revoked_tokens`` table. Each
+worker keeps them in a Bloom filter backed by an exact set, so checking a
+token on the request path never touches the database: almost every token
+is rejected by the filter in a few hash probes, and the rare filter hit is
+confirmed against the set. A background task polls the table for
+revocations made by other workers.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: two 64-bit halves of one digest generate all probes
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Revoked token ids, checked without a database round trip."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        # The filter and the exact set, swapped together so readers never see a mix
+        self._state = (BloomFilter(capacity, error_rate), set())
+        self.last_revoked_at: Optional[datetime] = None
+
+    def _build(self, jtis: set, capacity: int):
+        bloom = BloomFilter(capacity, self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        return bloom, jtis
+
+    def add(self, jti: str) -> None:
+        with self._lock:
+            bloom, exact = self._state
+            if jti in exact:
+                return
+            if len(exact) + 1 > bloom.capacity:
+                # Grow so the false positive rate stays as configured
+                self._state = self._build(exact | {jti}, bloom.capacity * 2)
+                return
+            # Set first: a reader that sees the filter bit must find the entry
+            exact.add(jti)
+            bloom.add(jti)
+
+    def replace(self, jtis: Iterable[str]) -> None:
+        """Swap in a freshly loaded list, e.g. after expired entries were dropped."""
+        jtis = set(jtis)
+        state = self._build(jtis, max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)))
+        with self._lock:
+            self._state = state
+
+    def is_revoked(self, jti: str) -> bool:
+        bloom, exact = self._state
+        return jti in bloom and jti in exact
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+
+revocation_list = RevocationList(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+)
+
+
+def load_revocations() -> None:
+    """Reload the full list of unexpired revocations from the database."""
+    from ..crud import token as crud_token
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        crud_token.purge_expired_revocations(db)
+        rows = crud_token.get_revocations(db)
+    finally:
+        db.close()
+    revocation_list.replace(jti for jti, _ in rows)
+    revocation_list.last_revoked_at = max((revoked_at for _, revoked_at in rows), default=None)
+    logger.info(f"Loaded {len(revocation_list)} revoked tokens")
+
+
+def sync_revocations() -> int:
+    """Add revocations recorded since the last sync, by any worker."""
+    from ..crud import token as crud_token
+    from ..database import SessionLocal
+
+    # Overlap the window so revocations committed out of timestamp order are not missed
+    since = revocation_list.last_revoked_at
+    if since is not None:
+        since -= timedelta(seconds=30)
+    db = SessionLocal()
+    try:
+        rows = crud_token.get_revocations(db, since=since)
+    finally:
+        db.close()
+    for jti, revoked_at in rows:
+        revocation_list.add(jti)
+        if revocation_list.last_revoked_at is None or revoked_at > revocation_list.last_revoked_at:
+            revocation_list.last_revoked_at = revoked_at
+    return len(rows)
+
+
+async def refresh_revocations_forever() -> None:
+    """Poll for new revocations, and periodically rebuild without expired ones."""
+    interval = settings.REVOCATION_REFRESH_SECONDS
+    rebuild_every = max(1, int(settings.REVOCATION_REBUILD_SECONDS / interval))
+    ticks = 0
+    while True:
+        await asyncio.sleep(interval)
+        ticks += 1
+        try:
+            if ticks % rebuild_every == 0:
+                await run_in_threadpool(load_revocations)
+            else:
+                await run_in_threadpool(sync_revocations)
+        except Exception as e:
+            logger.error(f"Failed to refresh revoked tokens: {e}")
@@ -1,7 +1,8 @@
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Generator, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -9,8 +10,10 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..crud import user as crud_user
-from ..database import get_db
+from ..database import WRITE_MARKER_COOKIE, WRITE_MARKER_HEADER, get_db, read_db
+from . import tracing
 from .config import settings
+from .revocation import revocation_list
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -48,13 +51,36 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
-    to_encode = {"exp": expire, "sub": str(subject)}
+    # jti identifies this token so it can be revoked individually
+    to_encode = {
+        "exp": expire,
+        "iat": datetime.utcnow(),
+        "sub": str(subject),
+        "jti": uuid.uuid4().hex,
+    }
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
     )
     return encoded_jwt
 
+def get_user_from_token(db: Session, token: str) -> Optional[models.User]:
+    """Resolve a JWT access token to its user, or None if it is not valid."""
+    try:
+        with tracing.start_span("jwt decode"):
+            payload = decode_access_token(token)
+    except JWTError:
+        return None
+    email: Optional[str] = payload.get("sub")
+    if email is None:
+        return None
+    # Checked in memory; tokens issued before jti existed cannot be revoked
+    jti = payload.get("jti")
+    if jti is not None and revocation_list.is_revoked(jti):
+        return None
+    return crud_user.get_user_by_email(db, email=email)
+
 async def get_current_user(
+    request: Request,
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> models.User:
@@ -77,22 +103,35 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenPayload(sub=email)
-    except JWTError:
-        raise credentials_exception
-        
-    user = crud_user.get_user_by_email(db, email=token_data.sub)
+    user = get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
+    # Lets the write tracking middleware attribute this request to the user
+    request.state.user_id = user.id
     return user
 
+def get_read_db(
+    request: Request,
+    current_user: models.User = Depends(get_current_user),
+) -> Generator[Session, None, None]:
+    """
+    Get a database session for read-only routes.
+    
+    Reads go to a replica when configured, except shortly after the user
+    wrote (as shown by the write marker the client sends back), so they
+    always see their own changes.
+    """
+    marker = request.headers.get(WRITE_MARKER_HEADER) or request.cookies.get(WRITE_MARKER_COOKIE)
+    yield from read_db(current_user.id, marker)
+
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT access token.
+
+    Raises:
+        JWTError: If the token is invalid or expired
+    """
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
 async def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
@@ -0,0 +1,378 @@
+"""Request tracing: spans for HTTP requests, SQL statements and model calls.
+
+A trace starts at an incoming request (:class:`TracingMiddleware`), or at
+a model call made outside any request, and is kept or dropped as a whole
+when it starts: new traces are sampled at ``TRACING_SAMPLE_RATE``, and a
+request carrying a W3C ``traceparent`` header follows the caller's choice.
+Unsampled traces cost a context variable lookup per span.
+
+The current span lives in a context variable, so work done in the thread
+pool, in asyncio tasks and in FastAPI background tasks started during a
+request belongs to the request's trace. SQL statements become spans
+through SQLAlchemy cursor events, but only inside a sampled trace, so the
+periodic database polling of background loops never starts traces.
+
+Finished spans go, in OTLP/JSON form, either to an in-process collector
+keeping the most recent ones (served at ``GET /admin/traces``) or to a file
+of ``ExportTraceServiceRequest`` objects, one per line, written by a
+background thread.
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+_MAX_STATEMENT_LENGTH = 2000
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: Union[BaseException, str]) -> None:
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    """An OTLP/JSON ``ExportTraceServiceRequest`` holding the spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.PROJECT_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+class MemoryCollector:
+    """Keeps the most recently finished spans of this process."""
+
+    def __init__(self, max_spans: int):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None, limit: Optional[int] = None) -> List[Span]:
+        """Finished spans, oldest first, of one trace or of the latest ``limit`` traces."""
+        spans = list(self._spans)
+        if trace_id is not None:
+            return [span for span in spans if span.trace_id == trace_id]
+        if limit is not None:
+            latest = list(dict.fromkeys(span.trace_id for span in reversed(spans)))[:limit]
+            spans = [span for span in spans if span.trace_id in set(latest)]
+        return spans
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans to a file, in batches written by a background thread."""
+
+    def __init__(self, path: str, interval: float = 1.0, max_batch: int = 512):
+        self.path = path
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: Deque[Span] = deque()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # The parent writes out its own spans; the child has no writer thread yet
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        self._pending.append(span)
+        if self._pid != os.getpid():
+            # First span, or first in a forked worker, where the thread is gone
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                batch.append(self._pending.popleft())
+            with self._lock, open(self.path, "a") as f:
+                f.write(json.dumps(otlp_request(batch)) + "\n")
+
+
+exporter: Optional[Union[MemoryCollector, FileExporter]] = None
+
+# The span work is attributed to, NOT_SAMPLED inside a dropped trace
+NOT_SAMPLED = object()
+_current: ContextVar[Any] = ContextVar("trace_span", default=None)
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def current_span() -> Optional[Span]:
+    """The span of the sampled trace being worked on, if any."""
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """The trace id, parent span id and sampled flag of a W3C ``traceparent`` header."""
+    match = _TRACEPARENT_RE.match(header.strip().lower()) if header else None
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def _new_span(
+    name: str,
+    kind: int,
+    attributes: Optional[Dict[str, Any]],
+    traceparent: Optional[str] = None,
+) -> Any:
+    """A span under the current one, a new root if there is none, or NOT_SAMPLED."""
+    parent = _current.get()
+    if parent is NOT_SAMPLED or exporter is None:
+        return NOT_SAMPLED
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+        return Span(name, trace_id, parent_id, kind, attributes) if sampled else NOT_SAMPLED
+    if random.random() >= settings.TRACING_SAMPLE_RATE:
+        return NOT_SAMPLED
+    return Span(name, f"{random.getrandbits(128):032x}", None, kind, attributes)
+
+
+@contextmanager
+def start_span(
+    name: str,
+    kind: int = KIND_INTERNAL,
+    attributes: Optional[Dict[str, Any]] = None,
+    traceparent: Optional[str] = None,
+) -> Iterator[Optional[Span]]:
+    """Run the block as a span, yielding it, or None when the trace is not sampled.
+
+    Exceptions leaving the block mark the span as failed.
+    """
+    span = _new_span(name, kind, attributes, traceparent)
+    token = _current.set(span)
+    try:
+        yield span if span is not NOT_SAMPLED else None
+    except BaseException as e:
+        if span is not NOT_SAMPLED:
+            span.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        if span is not NOT_SAMPLED:
+            span.end()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorate a function, sync or async, to run as a span."""
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add a ``traceparent`` header for the current span, if its trace is sampled."""
+    headers = dict(headers or {})
+    span = current_span()
+    if span is not None:
+        headers["traceparent"] = span.traceparent
+    return headers
+
+
+class TracingMiddleware:
+    """ASGI middleware running every HTTP request as a server span."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        attributes = {"http.request.method": scope["method"], "url.path": scope["path"]}
+        with start_span(scope["method"], KIND_SERVER, attributes, traceparent) as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    span.set_attribute("http.response.status_code", status)
+                    if status >= 500:
+                        span.record_error(f"HTTP {status}")
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    span.name = f"{scope['method']} {route.path}"
+                    span.set_attribute("http.route", route.path)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    parent = _current.get()
+    if not isinstance(parent, Span) or context is None:
+        return
+    context._trace_span = Span(
+        statement.split(None, 1)[0].upper() if statement else "SQL",
+        parent.trace_id,
+        parent.span_id,
+        KIND_CLIENT,
+        {"db.system": conn.dialect.name, "db.statement": statement[:_MAX_STATEMENT_LENGTH]},
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        context._trace_span = None
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rows_affected", cursor.rowcount)
+        span.end()
+
+
+def _handle_error(exception_context) -> None:
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        exception_context.execution_context._trace_span = None
+        span.record_error(exception_context.original_exception)
+        span.end()
+
+
+def configure_tracing() -> None:
+    """Set up the exporter and the SQL statement spans from the settings."""
+    global exporter
+    if not settings.TRACING_ENABLED or exporter is not None:
+        return
+    if settings.TRACING_EXPORTER == "file":
+        exporter = FileExporter(settings.TRACING_FILE)
+        atexit.register(exporter.flush)
+    else:
+        exporter = MemoryCollector(settings.TRACING_MEMORY_SPANS)
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
@@ -1,5 +1,12 @@
-from .user import get_user, get_user_by_email, get_users, create_user, update_user
-from .story import create_story, get_stories, get_story, update_story, delete_story, update_story_analysis
+from .user import get_user, get_user_by_email, get_users, create_user, update_user, delete_user, purge_user_stories, count_user_stories, bulk_create_users
+from .story import (
+    create_story, get_stories, get_story, get_stories_by_ids, update_story, delete_story, update_story_analysis,
+    patch_story_content, find_near_duplicates, get_duplicate_clusters, backfill_minhash,
+)
+from .revision import record_revision, get_revisions, reconstruct_revision
+from .stats import get_user_stats, rebuild_user_stats, rebuild_all_stats
+from .token import revoke_token, get_revocations, purge_expired_revocations
+from .analysis import record_analysis_run, get_analysis_metrics
 
 # Re-export all CRUD operations for backward compatibility
 __all__ = [
@@ -9,12 +16,40 @@ __all__ = [
     'get_users',
     'create_user',
     'update_user',
+    'delete_user',
+    'purge_user_stories',
+    'count_user_stories',
+    'bulk_create_users',
     
     # Story operations
     'create_story',
     'get_stories',
     'get_story',
+    'get_stories_by_ids',
     'update_story',
     'delete_story',
     'update_story_analysis',
+    'patch_story_content',
+    'find_near_duplicates',
+    'get_duplicate_clusters',
+    'backfill_minhash',
+    
+    # Revision operations
+    'record_revision',
+    'get_revisions',
+    'reconstruct_revision',
+    
+    # Statistics operations
+    'get_user_stats',
+    'rebuild_user_stats',
+    'rebuild_all_stats',
+    
+    # Token operations
+    'revoke_token',
+    'get_revocations',
+    'purge_expired_revocations',
+    
+    # Analysis run operations
+    'record_analysis_run',
+    'get_analysis_metrics',
 ]
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import case, func
+from typing import Dict, List, Optional
+
+from .. import models
+from ..core.config import settings
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+METRICS = (
+    "queue_ms",
+    "wall_ms",
+    "load_duration_ms",
+    "prompt_eval_count",
+    "eval_count",
+    "tokens_per_second",
+)
+
+def record_analysis_run(
+    db: Session,
+    metrics: dict,
+    story_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> models.AnalysisRun:
+    """Store the figures of one analysis call, as returned by ``ai.run_analysis``."""
+    columns = models.AnalysisRun.__table__.columns.keys()
+    db_run = models.AnalysisRun(
+        story_id=story_id,
+        user_id=user_id,
+        **{key: value for key, value in metrics.items() if key in columns}
+    )
+    db.add(db_run)
+    db.commit()
+    return db_run
+
+def get_analysis_metrics(
+    db: Session,
+    since: datetime,
+    model: Optional[str] = None
+) -> List[dict]:
+    """Summarise analysis runs since a point in time, per model.
+
+    Percentiles are computed by PostgreSQL (``percentile_cont``) where
+    available and with the same interpolation in Python otherwise.
+    """
+    filters = [models.AnalysisRun.created_at >= since]
+    if model is not None:
+        filters.append(models.AnalysisRun.model == model)
+    if db.get_bind().dialect.name == "postgresql":
+        return _metrics_in_database(db, filters)
+    return _metrics_in_python(db, filters)
+
+def _metrics_in_database(db: Session, filters: list) -> List[dict]:
+    run = models.AnalysisRun
+    columns = [
+        run.model,
+        func.count(),
+        func.count(case((run.success.is_(False), 1))),
+        func.count(case((run.load_duration_ms >= settings.ANALYSIS_COLD_LOAD_MS, 1))),
+    ]
+    for metric in METRICS:
+        column = getattr(run, metric)
+        columns.extend(func.percentile_cont(q).within_group(column) for q in PERCENTILES.values())
+        columns.append(func.max(column))
+
+    results = []
+    for row in db.query(*columns).filter(*filters).group_by(run.model).order_by(run.model):
+        model, runs, failures, cold_loads = row[:4]
+        values = iter(row[4:])
+        summary = {"model": model, "runs": runs, "failures": failures, "cold_loads": cold_loads}
+        for metric in METRICS:
+            summary[metric] = {name: next(values) for name in (*PERCENTILES, "max")}
+        results.append(summary)
+    return results
+
+def _metrics_in_python(db: Session, filters: list) -> List[dict]:
+    run = models.AnalysisRun
+    rows = db.query(
+        run.model, run.success, *(getattr(run, metric) for metric in METRICS)
+    ).filter(*filters)
+
+    grouped: Dict[str, dict] = defaultdict(lambda: {
+        "runs": 0, "failures": 0, "cold_loads": 0, "values": {metric: [] for metric in METRICS}
+    })
+    for model, success, *values in rows:
+        group = grouped[model]
+        group["runs"] += 1
+        group["failures"] += 0 if success else 1
+        for metric, value in zip(METRICS, values):
+            if value is not None:
+                group["values"][metric].append(value)
+                if metric == "load_duration_ms" and value >= settings.ANALYSIS_COLD_LOAD_MS:
+                    group["cold_loads"] += 1
+
+    results = []
+    for model in sorted(grouped):
+        group = grouped[model]
+        summary = {"model": model, "runs": group["runs"], "failures": group["failures"], "cold_loads": group["cold_loads"]}
+        for metric, values in group["values"].items():
+            values.sort()
+            summary[metric] = {name: _percentile(values, q) for name, q in PERCENTILES.items()}
+            summary[metric]["max"] = values[-1] if values else None
+        results.append(summary)
+    return results
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear interpolation between closest ranks, as ``percentile_cont`` does."""
+    if not values:
+        return None
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Optional
+
+from .. import models, revisions
+from ..core.config import settings
+
+def record_revision(
+    db: Session,
+    db_story: models.Story,
+    previous_content: Optional[str] = None,
+    delta: Optional[revisions.Delta] = None
+) -> models.StoryRevision:
+    """Store the story's current content as revision ``db_story.revision``.
+
+    The revision is added to the session but not committed, so it lands in
+    the same transaction as the story write. A full snapshot is stored on
+    the configured interval, otherwise a delta against ``previous_content``.
+    A ``delta`` that is already known, such as the edits of a content
+    patch, is stored as-is instead of being recomputed.
+    """
+    version = db_story.revision
+    if previous_content is None or revisions.is_snapshot_version(
+        version, settings.STORY_REVISION_SNAPSHOT_INTERVAL
+    ):
+        is_snapshot, data = True, db_story.content
+    else:
+        if delta is None:
+            delta = revisions.compute_delta(previous_content, db_story.content)
+        is_snapshot, data = False, revisions.encode_delta(delta)
+
+    db_revision = models.StoryRevision(
+        story_id=db_story.id,
+        owner_id=db_story.owner_id,
+        version=version,
+        is_snapshot=is_snapshot,
+        data=data
+    )
+    db.add(db_revision)
+    return db_revision
+
+def get_revisions(
+    db: Session,
+    story_id: int,
+    skip: int = 0,
+    limit: int = 100
+) -> List[dict]:
+    """List a story's revisions, newest first, without loading their data."""
+    rows = db.query(
+        models.StoryRevision.version,
+        models.StoryRevision.is_snapshot,
+        func.length(models.StoryRevision.data).label("size"),
+        models.StoryRevision.created_at
+    ).filter(
+        models.StoryRevision.story_id == story_id
+    ).order_by(
+        models.StoryRevision.version.desc()
+    ).offset(skip).limit(limit).all()
+    return [row._asdict() for row in rows]
+
+def reconstruct_revision(
+    db: Session,
+    db_story: models.Story,
+    version: int
+) -> Optional[dict]:
+    """Rebuild the content of a past version of a story.
+
+    Loads the nearest snapshot at or before ``version`` and replays the
+    deltas after it, so the cost is bounded by the snapshot interval.
+
+    Returns:
+        The version, its full content and creation time, or None if the
+        version does not exist
+    """
+    if version < 1 or version > db_story.revision:
+        return None
+
+    base_version = revisions.snapshot_version_for(version, settings.STORY_REVISION_SNAPSHOT_INTERVAL)
+    chain = db.query(models.StoryRevision).filter(
+        models.StoryRevision.story_id == db_story.id,
+        models.StoryRevision.version >= base_version,
+        models.StoryRevision.version <= version
+    ).order_by(models.StoryRevision.version).all()
+
+    # Fall back to the latest snapshot if the interval changed since writing
+    if not chain or not chain[0].is_snapshot:
+        snapshot = db.query(models.StoryRevision).filter(
+            models.StoryRevision.story_id == db_story.id,
+            models.StoryRevision.version <= version,
+            models.StoryRevision.is_snapshot.is_(True)
+        ).order_by(models.StoryRevision.version.desc()).first()
+        if snapshot is None:
+            return None
+        chain = db.query(models.StoryRevision).filter(
+            models.StoryRevision.story_id == db_story.id,
+            models.StoryRevision.version >= snapshot.version,
+            models.StoryRevision.version <= version
+        ).order_by(models.StoryRevision.version).all()
+
+    if chain[-1].version != version:
+        return None
+
+    content = chain[0].data
+    for db_revision in chain[1:]:
+        if db_revision.is_snapshot:
+            content = db_revision.data
+        else:
+            content = revisions.apply_delta(content, revisions.decode_delta(db_revision.data))
+
+    return {
+        "version": version,
+        "content": content,
+        "created_at": chain[-1].created_at,
+    }
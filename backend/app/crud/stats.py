@@ -0,0 +1,172 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+from .. import models
+
+def story_facts(db_story: models.Story) -> dict:
+    """Extract the parts of a story that feed the user's statistics."""
+    created_at = db_story.created_at or datetime.utcnow()
+    return {
+        "words": len((db_story.content or "").split()),
+        "impact": db_story.emotional_impact or "medium",
+        "tags": _parse_tags(db_story.tags),
+        "month": created_at.strftime("%Y-%m"),
+    }
+
+def apply_story_delta(
+    db: Session,
+    user_id: int,
+    before: Optional[dict] = None,
+    after: Optional[dict] = None
+) -> None:
+    """Update the user's summary row for one story change.
+
+    ``before``/``after`` are :func:`story_facts` of the story before and
+    after the change (None for a create or delete respectively). Pending
+    changes are flushed first and the summary row is locked, so the update
+    lands in the caller's transaction without losing concurrent deltas.
+    A user without a summary row yet gets one rebuilt from scratch.
+    """
+    db.flush()
+    if _create_stats_row(db, user_id):
+        rebuild_user_stats(db, user_id)
+        return
+    db_stats = _lock_stats_row(db, user_id)
+
+    impacts = Counter(db_stats.impact_counts or {})
+    tags = Counter(db_stats.tag_counts or {})
+    months = Counter(db_stats.month_counts or {})
+    for facts, sign in ((before, -1), (after, 1)):
+        if facts is None:
+            continue
+        db_stats.story_count += sign
+        db_stats.total_words += sign * facts["words"]
+        impacts[facts["impact"]] += sign
+        months[facts["month"]] += sign
+        for tag in facts["tags"]:
+            tags[tag] += sign
+
+    # Reassign rather than mutate so the JSON columns are marked dirty
+    db_stats.impact_counts = _positive(impacts)
+    db_stats.tag_counts = _positive(tags)
+    db_stats.month_counts = _positive(months)
+    db_stats.updated_at = datetime.utcnow()
+
+def rebuild_user_stats(db: Session, user_id: int) -> models.UserStoryStats:
+    """Recompute a user's summary row by scanning all of their stories."""
+    _create_stats_row(db, user_id)
+    db_stats = _lock_stats_row(db, user_id)
+    for field, value in _scan_stories(db, user_id).items():
+        setattr(db_stats, field, value)
+    db_stats.updated_at = datetime.utcnow()
+    return db_stats
+
+def _scan_stories(db: Session, user_id: int) -> dict:
+    """Compute a user's summary values from all of their stories."""
+    story_count = total_words = 0
+    impacts, tags, months = Counter(), Counter(), Counter()
+    rows = db.query(
+        models.Story.content,
+        models.Story.tags,
+        models.Story.emotional_impact,
+        models.Story.created_at
+    ).filter(models.Story.owner_id == user_id).yield_per(500)
+    for content, story_tags, impact, created_at in rows:
+        story_count += 1
+        total_words += len((content or "").split())
+        impacts[impact or "medium"] += 1
+        months[created_at.strftime("%Y-%m")] += 1
+        tags.update(_parse_tags(story_tags))
+    return {
+        "story_count": story_count,
+        "total_words": total_words,
+        "impact_counts": dict(impacts),
+        "tag_counts": dict(tags),
+        "month_counts": dict(months),
+    }
+
+def _create_stats_row(db: Session, user_id: int) -> bool:
+    """Insert an empty summary row for the user unless one exists.
+
+    Inserting before locking means concurrent first writers all lock the
+    same row instead of racing to insert it.
+
+    Returns:
+        True if the row was created
+    """
+    values = {
+        "user_id": user_id,
+        "story_count": 0,
+        "total_words": 0,
+        "impact_counts": {},
+        "tag_counts": {},
+        "month_counts": {},
+        "updated_at": datetime.utcnow(),
+    }
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        result = db.execute(
+            dialect_insert(models.UserStoryStats).values(**values)
+            .on_conflict_do_nothing(index_elements=[models.UserStoryStats.user_id])
+        )
+        return result.rowcount == 1
+    try:
+        with db.begin_nested():
+            db.execute(insert(models.UserStoryStats).values(**values))
+    except IntegrityError:
+        return False
+    return True
+
+def _lock_stats_row(db: Session, user_id: int) -> models.UserStoryStats:
+    return db.query(models.UserStoryStats).filter(
+        models.UserStoryStats.user_id == user_id
+    ).with_for_update().populate_existing().one()
+
+def rebuild_all_stats(db: Session) -> int:
+    """Reconcile every user's summary row, committing per user.
+
+    Returns:
+        The number of users processed
+    """
+    user_ids = [user_id for (user_id,) in db.query(models.User.id).order_by(models.User.id)]
+    for user_id in user_ids:
+        rebuild_user_stats(db, user_id)
+        db.commit()
+    return len(user_ids)
+
+def get_user_stats(db: Session, user_id: int, top_tags: int = 10) -> dict:
+    """Read a user's writing statistics from their summary row.
+
+    Existing users got their row from the migration that added the table; a
+    user still without one has it built and committed here, once.
+    """
+    db_stats = db.get(models.UserStoryStats, user_id)
+    if db_stats is None:
+        db_stats = rebuild_user_stats(db, user_id)
+        db.commit()
+
+    tag_counts: Dict[str, int] = db_stats.tag_counts or {}
+    ranked: List[tuple] = sorted(tag_counts.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        "story_count": db_stats.story_count,
+        "total_words": db_stats.total_words,
+        "average_words": round(db_stats.total_words / db_stats.story_count, 1) if db_stats.story_count else 0.0,
+        "by_emotional_impact": db_stats.impact_counts or {},
+        "top_tags": [{"tag": tag, "count": count} for tag, count in ranked[:top_tags]],
+        "stories_per_month": dict(sorted((db_stats.month_counts or {}).items())),
+        "updated_at": db_stats.updated_at,
+    }
+
+def _parse_tags(tags: Optional[str]) -> List[str]:
+    return sorted({tag.strip().lower() for tag in (tags or "").split(",") if tag.strip()})
+
+def _positive(counter: Counter) -> Dict[str, int]:
+    return {key: value for key, value in counter.items() if value > 0}
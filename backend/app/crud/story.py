@@ -1,37 +1,108 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Optional
+from array import array
 
-from .. import models
+from sqlalchemy.orm import Session, load_only, undefer
+from sqlalchemy import false, or_, func, tuple_
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .. import dedup, fulltext, models, revisions
+from ..compression import plain_text
+from ..core.events import publish_on_commit
+from ..core.invalidation import invalidate_on_commit
+from ..core.config import settings
 from ..schemas.story import StoryCreate, StoryUpdate
+from . import revision as crud_revision
+from . import stats as crud_stats
+
+# Fields that feed the per-user statistics
+_STATS_FIELDS = {"content", "tags", "emotional_impact"}
+
+def _only(query, fields: Optional[Sequence[str]]):
+    """Load just the given columns of the stories (the primary key always comes along).
+
+    Without ``fields`` the whole story is loaded, including the deferred content.
+    """
+    if not fields:
+        return query.options(undefer(models.Story.content))
+    return query.options(load_only(*(getattr(models.Story, field) for field in fields)))
 
-def get_story(db: Session, story_id: int, user_id: int) -> Optional[models.Story]:
-    """Get a single story by ID, ensuring it belongs to the user."""
-    return db.query(models.Story).filter(
+def get_story(
+    db: Session,
+    story_id: int,
+    user_id: int,
+    for_update: bool = False,
+    fields: Optional[Sequence[str]] = None
+) -> Optional[models.Story]:
+    """Get a single story by ID, ensuring it belongs to the user.
+
+    With ``for_update`` the row is locked until the transaction ends, so
+    read-check-write sequences such as content patches cannot interleave.
+    With ``fields`` only those columns are loaded.
+    """
+    query = _only(db.query(models.Story), fields).filter(
         models.Story.id == story_id,
         models.Story.owner_id == user_id
-    ).first()
+    )
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
 
 def get_stories(
     db: Session,
     user_id: int,
     skip: int = 0,
     limit: int = 100,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None
 ) -> List[models.Story]:
-    """Get multiple stories for a specific user, with optional search."""
-    query = db.query(models.Story).filter(models.Story.owner_id == user_id)
+    """Get multiple stories for a specific user, newest first, with optional search.
 
-    if search:
+    Titles and tags are matched as substrings; the content is searched
+    through its full-text index (see ``app.fulltext``), and on SQLite the
+    title and tags too.
+    With ``fields`` only those columns are loaded.
+    """
+    query = _only(db.query(models.Story), fields).filter(models.Story.owner_id == user_id)
+
+    dialect = db.get_bind().dialect.name
+    expression = fulltext.match_expression(search) if search and dialect == "sqlite" else None
+    if expression:
+        query = query.filter(models.Story.id.in_(fulltext.matching_story_ids(expression)))
+    elif search:
+        if dialect == "postgresql":
+            words = fulltext.tsquery(search)
+            content_filter = fulltext.vector_matches(models.Story.search_vector, words) if words else false()
+        else:
+            content_filter = plain_text(models.Story.content).ilike(f"%{search}%")
         search_filter = or_(
             models.Story.title.ilike(f"%{search}%"),
-            models.Story.content.ilike(f"%{search}%"),
+            content_filter,
             models.Story.tags.ilike(f"%{search}%")
         )
         query = query.filter(search_filter)
 
+    # Matches ix_stories_owner_id_created_at, and keeps pages stable
+    query = query.order_by(models.Story.created_at.desc(), models.Story.id.desc())
     return query.offset(skip).limit(limit).all()
 
+def get_stories_by_ids(
+    db: Session,
+    story_ids: Sequence[int],
+    user_id: int,
+    fields: Optional[Sequence[str]] = None
+) -> List[models.Story]:
+    """Get the user's stories among ``story_ids`` in one query, in the order of the ids.
+
+    Ids of missing stories or of other users' stories are skipped.
+    """
+    if not story_ids:
+        return []
+    stories = _only(db.query(models.Story), fields).filter(
+        models.Story.owner_id == user_id,
+        models.Story.id.in_(story_ids)
+    ).all()
+    by_id = {story.id: story for story in stories}
+    return [by_id[story_id] for story_id in dict.fromkeys(story_ids) if story_id in by_id]
+
 def create_story(
     db: Session,
     story: StoryCreate,
@@ -46,7 +117,13 @@ def create_story(
         **story_data,
         owner_id=user_id
     )
+    _index_story_minhash(db_story)
     db.add(db_story)
+    db.flush()
+    crud_revision.record_revision(db, db_story)
+    crud_stats.apply_story_delta(db, user_id, after=crud_stats.story_facts(db_story))
+    invalidate_on_commit(db, "story_list", user_id)
+    publish_on_commit(db, user_id, "story.created", db_story.id)
     db.commit()
     db.refresh(db_story)
     return db_story
@@ -57,20 +134,77 @@ def update_story(
     story: StoryUpdate,
     user_id: int
 ) -> Optional[models.Story]:
-    """Update a story, ensuring it belongs to the user."""
-    db_story = get_story(db, story_id=story_id, user_id=user_id)
+    """Update a story, ensuring it belongs to the user.
+
+    The row is locked for the update, so concurrent updates take their
+    revision numbers one after the other.
+    """
+    # Signed before the row is locked, as it takes a while for long stories
+    signature = dedup.compute_signature(story.content or "") if "content" in story.model_fields_set else None
+    db_story = get_story(db, story_id=story_id, user_id=user_id, for_update=True)
     if db_story is None:
         return None
 
+    previous_content = db_story.content
     update_data = story.dict(exclude_unset=True)
+    facts_before = crud_stats.story_facts(db_story) if _STATS_FIELDS & update_data.keys() else None
     for field, value in update_data.items():
         setattr(db_story, field, value)
 
+    if "content" in update_data and db_story.content != previous_content:
+        _index_story_minhash(db_story, signature)
+        db_story.revision += 1
+        crud_revision.record_revision(db, db_story, previous_content)
+
     db.add(db_story)
+    if facts_before is not None:
+        crud_stats.apply_story_delta(db, user_id, before=facts_before, after=crud_stats.story_facts(db_story))
+    invalidate_on_commit(db, "story_list", user_id)
+    publish_on_commit(db, user_id, "story.updated", story_id)
     db.commit()
     db.refresh(db_story)
     return db_story
 
+def patch_story_content(
+    db: Session,
+    db_story: models.Story,
+    edits: List[Tuple[int, int, str]]
+) -> models.Story:
+    """Apply text edits to a story's current content and store a new revision.
+
+    The caller is responsible for checking that the edits were made against
+    ``db_story.revision``. Small patches, such as autosaves, keep the
+    story's MinHash signature; it is recomputed once a patch changes
+    ``DEDUP_PATCH_MIN_CHANGE`` of the text or every
+    ``DEDUP_PATCH_RESIGN_EVERY`` revisions, and on every full update.
+
+    Raises:
+        ValueError: If the edits are out of range or overlap
+    """
+    previous_content = db_story.content
+    facts_before = crud_stats.story_facts(db_story)
+    db_story.content = revisions.apply_delta(previous_content, edits)
+    if db_story.content != previous_content:
+        db_story.revision += 1
+        changed = sum(max(end - start, len(text)) for start, end, text in edits)
+        if (
+            db_story.minhash is None
+            or changed >= settings.DEDUP_PATCH_MIN_CHANGE * len(previous_content or "")
+            or db_story.revision % settings.DEDUP_PATCH_RESIGN_EVERY == 0
+        ):
+            _index_story_minhash(db_story)
+        crud_revision.record_revision(db, db_story, previous_content, delta=edits)
+        db.add(db_story)
+        crud_stats.apply_story_delta(
+            db, db_story.owner_id, before=facts_before, after=crud_stats.story_facts(db_story)
+        )
+
+    # No refresh: the caller only needs the new revision, not the content
+    invalidate_on_commit(db, "story_list", db_story.owner_id)
+    publish_on_commit(db, db_story.owner_id, "story.updated", db_story.id)
+    db.commit()
+    return db_story
+
 def update_story_analysis(
     db: Session,
     story_id: int,
@@ -84,6 +218,8 @@ def update_story_analysis(
 
     db_story.analysis = analysis
     db.add(db_story)
+    invalidate_on_commit(db, "story_list", user_id)
+    publish_on_commit(db, user_id, "story.analyzed", story_id)
     db.commit()
     db.refresh(db_story)
     return db_story
@@ -94,6 +230,165 @@ def delete_story(db: Session, story_id: int, user_id: int) -> bool:
     if db_story is None:
         return False
 
+    facts_before = crud_stats.story_facts(db_story)
     db.delete(db_story)
+    crud_stats.apply_story_delta(db, user_id, before=facts_before)
+    invalidate_on_commit(db, "story_list", user_id)
+    publish_on_commit(db, user_id, "story.deleted", story_id)
     db.commit()
     return True
+
+def _index_story_minhash(db_story: models.Story, signature: Optional[array] = None) -> None:
+    """Store the story's MinHash signature, computed unless given, and refresh its LSH buckets.
+
+    Existing bucket rows are updated in place so the primary key
+    ``(story_id, band)`` never has to be deleted and re-inserted in one flush.
+    """
+    if signature is None:
+        signature = dedup.compute_signature(db_story.content or "")
+    db_story.minhash = dedup.pack_signature(signature)
+    existing = {row.band: row for row in db_story.lsh_buckets}
+    for band, bucket in dedup.band_buckets(signature):
+        row = existing.get(band)
+        if row is None:
+            db_story.lsh_buckets.append(models.StoryLSHBucket(
+                band=band,
+                bucket=bucket,
+                owner_id=db_story.owner_id
+            ))
+        else:
+            row.bucket = bucket
+
+def backfill_minhash(db: Session, user_id: Optional[int] = None, batch_size: int = 500) -> int:
+    """Index the stories created before signatures were stored, committing per batch.
+
+    Run by ``backfill_minhash.py``; stories without a signature are left out
+    of duplicate reports until then.
+
+    Returns:
+        The number of stories indexed
+    """
+    indexed = 0
+    while True:
+        query = db.query(models.Story).options(undefer(models.Story.content)).filter(
+            models.Story.minhash.is_(None)
+        )
+        if user_id is not None:
+            query = query.filter(models.Story.owner_id == user_id)
+        missing = query.order_by(models.Story.id).limit(batch_size).all()
+        if not missing:
+            return indexed
+        for db_story in missing:
+            _index_story_minhash(db_story)
+        db.commit()
+        indexed += len(missing)
+
+def find_near_duplicates(
+    db: Session,
+    db_story: models.Story,
+    user_id: int,
+    threshold: Optional[float] = None
+) -> List[Tuple[int, float]]:
+    """Find the ids of the user's stories that are near-duplicates of ``db_story``.
+
+    Candidates come from the LSH bucket index; only they are compared
+    signature by signature, loading just their ids and signatures. A story
+    without a stored signature gets one computed, but not saved. Results are
+    ordered by descending similarity.
+    """
+    threshold = settings.DEDUP_THRESHOLD if threshold is None else threshold
+    if db_story.minhash is None:
+        signature = dedup.compute_signature(db_story.content or "")
+        keys = dedup.band_buckets(signature)
+    else:
+        signature = dedup.unpack_signature(db_story.minhash)
+        keys = [(row.band, row.bucket) for row in db_story.lsh_buckets]
+
+    candidate_ids = db.query(models.StoryLSHBucket.story_id).filter(
+        models.StoryLSHBucket.owner_id == user_id,
+        models.StoryLSHBucket.story_id != db_story.id,
+        tuple_(models.StoryLSHBucket.band, models.StoryLSHBucket.bucket).in_(keys)
+    ).distinct()
+
+    matches = []
+    candidates = db.query(models.Story.id, models.Story.minhash).filter(
+        models.Story.owner_id == user_id,
+        models.Story.id.in_(candidate_ids.scalar_subquery())
+    )
+    for candidate_id, minhash in candidates:
+        similarity = dedup.estimate_similarity(signature, dedup.unpack_signature(minhash))
+        if similarity >= threshold:
+            matches.append((candidate_id, similarity))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches
+
+def get_duplicate_clusters(
+    db: Session,
+    user_id: int,
+    threshold: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Group the user's stories into clusters of near-duplicates.
+
+    Only stories sharing an LSH bucket are compared, and only their
+    signatures and titles are loaded, never the story bodies. Nothing is
+    written: stories without a signature are skipped (see
+    :func:`backfill_minhash`).
+    """
+    threshold = settings.DEDUP_THRESHOLD if threshold is None else threshold
+
+    shared = db.query(
+        models.StoryLSHBucket.band,
+        models.StoryLSHBucket.bucket
+    ).filter(
+        models.StoryLSHBucket.owner_id == user_id
+    ).group_by(
+        models.StoryLSHBucket.band,
+        models.StoryLSHBucket.bucket
+    ).having(func.count() > 1).subquery()
+
+    rows = db.query(
+        models.StoryLSHBucket.band,
+        models.StoryLSHBucket.bucket,
+        models.StoryLSHBucket.story_id
+    ).join(
+        shared,
+        (models.StoryLSHBucket.band == shared.c.band)
+        & (models.StoryLSHBucket.bucket == shared.c.bucket)
+    ).filter(models.StoryLSHBucket.owner_id == user_id).all()
+
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for band, bucket, story_id in rows:
+        buckets.setdefault((band, bucket), []).append(story_id)
+    pairs = set()
+    for members in buckets.values():
+        members.sort()
+        for i, left in enumerate(members):
+            for right in members[i + 1:]:
+                pairs.add((left, right))
+    if not pairs:
+        return []
+
+    candidate_ids = {story_id for pair in pairs for story_id in pair}
+    details = {
+        story_id: (title, dedup.unpack_signature(minhash))
+        for story_id, title, minhash in db.query(
+            models.Story.id, models.Story.title, models.Story.minhash
+        ).filter(models.Story.owner_id == user_id, models.Story.id.in_(candidate_ids))
+    }
+
+    similarities = {}
+    for left, right in pairs:
+        similarity = dedup.estimate_similarity(details[left][1], details[right][1])
+        if similarity >= threshold:
+            similarities[(left, right)] = similarity
+
+    clusters = []
+    for members in dedup.cluster_pairs(similarities):
+        member_set = set(members)
+        edges = [value for (left, right), value in similarities.items() if left in member_set and right in member_set]
+        clusters.append({
+            "story_ids": members,
+            "titles": [details[story_id][0] for story_id in members],
+            "similarity": round(min(edges), 4),
+        })
+    return clusters
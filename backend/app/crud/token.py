@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy.orm import Session
+from sqlalchemy import delete
+from typing import List, Optional, Tuple
+
+from .. import models
+
+def revoke_token(
+    db: Session,
+    jti: str,
+    expires_at: datetime,
+    user_id: Optional[int] = None
+) -> models.RevokedToken:
+    """Record a token id as revoked until the token would have expired."""
+    db_token = db.get(models.RevokedToken, jti)
+    if db_token is None:
+        db_token = models.RevokedToken(
+            jti=jti,
+            user_id=user_id,
+            expires_at=expires_at,
+            revoked_at=datetime.utcnow()
+        )
+        db.add(db_token)
+        db.commit()
+    return db_token
+
+def get_revocations(
+    db: Session,
+    since: Optional[datetime] = None
+) -> List[Tuple[str, datetime]]:
+    """List unexpired revocations as (jti, revoked_at), optionally only recent ones."""
+    query = db.query(models.RevokedToken.jti, models.RevokedToken.revoked_at).filter(
+        models.RevokedToken.expires_at > datetime.utcnow()
+    )
+    if since is not None:
+        query = query.filter(models.RevokedToken.revoked_at >= since)
+    return [tuple(row) for row in query.all()]
+
+def purge_expired_revocations(db: Session) -> int:
+    """Delete revocations of tokens that have expired anyway."""
+    result = db.execute(
+        delete(models.RevokedToken).where(models.RevokedToken.expires_at <= datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount
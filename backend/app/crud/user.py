@@ -1,10 +1,13 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import delete, func, insert, select
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 from .. import models, schemas
 from ..core import security
+from ..core.invalidation import invalidate_on_commit
 
 # Password hashing
 pwd_context = security.pwd_context
@@ -22,7 +25,7 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> list[models.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+    return db.query(models.User).order_by(models.User.id).offset(skip).limit(limit).all()
 
 def create_user(db: Session, user: schemas.UserCreate) -> Optional[models.User]:
     hashed_password = get_password_hash(user.password)
@@ -84,6 +87,153 @@ def update_user(
     db.refresh(db_user)
     return db_user
 
+def purge_user_stories(db: Session, user_id: int, batch_size: int = 5000) -> int:
+    """Delete all of a user's stories in fixed-size batches.
+
+    Each batch is its own short transaction, and rows that depend on a story
+    go with it through their ON DELETE CASCADE foreign keys, so neither
+    memory use nor lock duration grows with the number of stories.
+
+    Returns:
+        The number of stories deleted
+    """
+    deleted = 0
+    while True:
+        story_ids = db.scalars(
+            select(models.Story.id)
+            .where(models.Story.owner_id == user_id)
+            .limit(batch_size)
+        ).all()
+        if not story_ids:
+            return deleted
+        db.execute(
+            delete(models.Story).where(
+                models.Story.owner_id == user_id,
+                models.Story.id.in_(story_ids)
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        invalidate_on_commit(db, "story_list", user_id)
+        db.commit()
+        deleted += len(story_ids)
+
+def count_user_stories(db: Session, user_id: int, limit: Optional[int] = None) -> int:
+    """Count a user's stories, stopping at ``limit`` when given."""
+    story_ids = select(models.Story.id).where(models.Story.owner_id == user_id)
+    if limit is not None:
+        story_ids = story_ids.limit(limit)
+    return db.scalar(select(func.count()).select_from(story_ids.subquery()))
+
+def delete_user(db: Session, user_id: int, batch_size: int = 5000) -> Optional[models.User]:
+    """Delete a user and everything they own.
+
+    Returns:
+        The deleted user, or None if the user was not found
+    """
+    db_user = get_user(db, user_id)
+    if not db_user:
+        return None
+
+    purge_user_stories(db, user_id, batch_size=batch_size)
+    db.execute(
+        delete(models.User).where(models.User.id == user_id),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    db.expunge(db_user)
+    return db_user
+
+def _insert_ignoring_duplicates(db: Session, rows: List[dict]) -> Set[str]:
+    """Insert user rows, skipping those whose email is taken.
+
+    PostgreSQL and SQLite insert the batch with one statement; other
+    databases insert row by row, each in a savepoint.
+
+    Returns:
+        The emails of the inserted rows
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(models.User).on_conflict_do_nothing(index_elements=[models.User.email])
+        return set(db.scalars(statement.returning(models.User.email), rows))
+
+    inserted = set()
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.User), row)
+        except IntegrityError:
+            continue
+        inserted.add(row["email"])
+    return inserted
+
+def bulk_create_users(
+    db: Session,
+    users: Sequence[schemas.UserCreate],
+    executor: Optional[Executor] = None,
+    batch_size: int = 500,
+    workers: int = 1
+) -> Tuple[int, Dict[str, str]]:
+    """Create many users with batched inserts.
+
+    Emails that already exist are filtered out before any password is
+    hashed, the remaining hashes are computed on ``executor`` (e.g. a
+    process pool of ``workers`` processes) when given, and each batch is
+    inserted with a single statement that skips emails taken concurrently.
+
+    Returns:
+        The number of users created and a mapping of email to error for
+        every user that was not created
+    """
+    created = 0
+    errors: Dict[str, str] = {}
+    for offset in range(0, len(users), batch_size):
+        batch = users[offset:offset + batch_size]
+        existing = set(db.scalars(
+            select(models.User.email).where(models.User.email.in_([user.email for user in batch]))
+        ))
+        pending = []
+        for user in batch:
+            if user.email in existing:
+                errors[user.email] = "A user with this email already exists"
+            else:
+                pending.append(user)
+        if not pending:
+            continue
+
+        passwords = [user.password for user in pending]
+        if executor is not None:
+            chunksize = max(1, len(passwords) // (4 * max(1, workers)))
+            hashes = list(executor.map(security.get_password_hash, passwords, chunksize=chunksize))
+        else:
+            hashes = [get_password_hash(password) for password in passwords]
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "email": user.email,
+                "hashed_password": hashed_password,
+                "full_name": user.full_name,
+                "is_active": True,
+                "is_superuser": False,
+                "theme": "light",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for user, hashed_password in zip(pending, hashes)
+        ]
+        inserted = _insert_ignoring_duplicates(db, rows)
+        db.commit()
+        created += len(inserted)
+        for user in pending:
+            if user.email not in inserted:
+                errors[user.email] = "A user with this email already exists"
+    return created, errors
+
 def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
     user = get_user_by_email(db, email=email)
     if not user:
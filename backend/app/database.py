@@ -1,33 +1,209 @@
+import hashlib
+import hmac
 import logging
-from typing import Generator, Optional
+import random
+import time
+from typing import Generator, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import TextClause, create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.sql.dml import UpdateBase
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _configure_sqlite(engine: Engine, read_only: bool = False) -> None:
+    """Apply the SQLite pragmas to every new connection of ``engine``.
+
+    The driver's own transaction handling is turned off so that writers can
+    start with ``BEGIN IMMEDIATE``, taking the write lock before reading
+    anything they are about to change.
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, which is enough in WAL mode
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_SECONDS * 1000)}")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+def create_engines(url: str) -> Tuple[Engine, Optional[Engine]]:
+    """Create the primary engine and, for a SQLite file, the engine of its reader pool.
+
+    SQLite allows one writer at a time, so the primary engine holds a
+    single connection; WAL mode lets the readers run alongside it.
+    """
+    if not _is_sqlite(url):
+        return create_engine(
+            url,
+            pool_pre_ping=True,  # Enable connection health checks
+            pool_size=5,  # Maximum number of connections to keep open
+            max_overflow=10,  # Maximum number of connections to create beyond pool_size
+            pool_timeout=30,  # Seconds to wait before giving up on getting a connection
+            pool_recycle=3600,  # Recycle connections after 1 hour
+        ), None
+    
+    connect_args = {"check_same_thread": False}
+    if make_url(url).database in (None, "", ":memory:"):
+        # Every connection would get its own empty in-memory database
+        writer = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        _configure_sqlite(writer)
+        return writer, None
+    
+    writer = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+    reader = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        # A request can hold several sessions (authentication's and the
+        # endpoint's), so a hard cap could leave every request waiting on another
+        max_overflow=-1,
+        pool_timeout=30,
+    )
+    _configure_sqlite(writer)
+    _configure_sqlite(reader, read_only=True)
+    return writer, reader
+
+def _writes(clause) -> bool:
+    return isinstance(clause, (UpdateBase, TextClause)) or getattr(clause, "_for_update_arg", None) is not None
+
+class SQLiteSession(Session):
+    """Session sending reads to the SQLite reader pool until its transaction writes.
+
+    From the first flush, DML statement or ``SELECT ... FOR UPDATE`` on,
+    the rest of the transaction runs on the single writer connection, so
+    it sees its own changes and holds the write lock until it ends.
+    """
+    
+    def __init__(self, *args, read_bind: Optional[Engine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_bind = read_bind
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.read_bind is None or self.info.get("writing") or self._flushing or _writes(clause):
+            self.info["writing"] = True
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return self.read_bind
+
+@event.listens_for(SQLiteSession, "after_transaction_end")
+def _stop_writing(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
 # Create the SQLAlchemy engine with connection pooling
-engine = create_engine(
-    str(settings.SQLALCHEMY_DATABASE_URI),
-    pool_pre_ping=True,  # Enable connection health checks
-    pool_size=5,  # Maximum number of connections to keep open
-    max_overflow=10,  # Maximum number of connections to create beyond pool_size
-    pool_timeout=30,  # Seconds to wait before giving up on getting a connection
-    pool_recycle=3600,  # Recycle connections after 1 hour
-    echo=settings.DEBUG,  # Enable SQL query logging in debug mode
-)
+SQLALCHEMY_DATABASE_URI = str(settings.SQLALCHEMY_DATABASE_URI)
+engine, sqlite_read_engine = create_engines(SQLALCHEMY_DATABASE_URI)
 
 # Create session factory
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-    expire_on_commit=False,  # Prevent attribute access after commit
-)
+if _is_sqlite(SQLALCHEMY_DATABASE_URI):
+    SessionLocal = sessionmaker(
+        class_=SQLiteSession,
+        read_bind=sqlite_read_engine,
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        expire_on_commit=False,
+    )
+else:
+    SessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        expire_on_commit=False,  # Prevent attribute access after commit
+    )
+
+# Optional read replicas, each with its own pool
+replica_engines = [
+    create_engine(
+        uri,
+        pool_pre_ping=True,
+        pool_size=5,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=3600,
+    )
+    for uri in settings.SQLALCHEMY_REPLICA_URIS
+]
+ReplicaSessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica, expire_on_commit=False)
+    for replica in replica_engines
+]
+
+def dispose_engines(close: bool = True) -> None:
+    """Dispose of the connection pools of every engine: primary, SQLite reader and replicas.
+
+    A process forked from one that used the engines passes ``close=False``,
+    so the parent's connections are dropped without being closed under it.
+    """
+    for each in (engine, sqlite_read_engine, *replica_engines):
+        if each is not None:
+            each.dispose(close=close)
+
+# Read-your-writes: after a write the client gets a signed marker of its time
+# (cookie and header), so whichever worker serves its next reads sees it
+WRITE_MARKER_COOKIE = "last_write"
+WRITE_MARKER_HEADER = "X-Last-Write"
+
+def _marker_signature(user_id: int, at: str) -> str:
+    message = f"{user_id}:{at}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+def write_marker(user_id: int) -> str:
+    """A signed record that the user wrote just now, to send back to the client."""
+    at = f"{time.time():.3f}"
+    return f"{at}.{_marker_signature(user_id, at)}"
+
+def wrote_recently(user_id: Optional[int], marker: Optional[str]) -> bool:
+    """Whether ``marker`` shows the user wrote within the read-your-writes window."""
+    if user_id is None or not marker:
+        return False
+    at, _, signature = marker.rpartition(".")
+    if not hmac.compare_digest(signature, _marker_signature(user_id, at)):
+        return False
+    try:
+        age = time.time() - float(at)
+    except ValueError:
+        return False
+    # A little slack for clock differences between hosts
+    return -1.0 < age < settings.READ_YOUR_WRITES_SECONDS
+
+def get_read_session(user_id: Optional[int] = None, marker: Optional[str] = None) -> Session:
+    """Open a session for read-only work.
+
+    Uses a random replica when any are configured, unless the user's write
+    ``marker`` is recent, in which case the primary is used so they see
+    their own changes despite replication lag.
+    """
+    if ReplicaSessions and not wrote_recently(user_id, marker):
+        return random.choice(ReplicaSessions)()
+    return SessionLocal()
 
 # Base class for all models
 Base = declarative_base()
@@ -54,6 +230,18 @@ def get_db() -> Generator[Session, None, None]:
         if db:
             db.close()
 
+def read_db(user_id: Optional[int] = None, marker: Optional[str] = None) -> Generator[Session, None, None]:
+    """Yield a read-only session routed by :func:`get_read_session`."""
+    db = get_read_session(user_id, marker)
+    try:
+        yield db
+    except SQLAlchemyError as e:
+        logger.error(f"Database error: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
 # Create database tables
 def init_db() -> None:
     """Initialize the database by creating all tables."""
@@ -61,4 +249,9 @@ def init_db() -> None:
     logger.info("Database tables created")
 
 # Export the database URL for Alembic
-__all__ = ["SQLALCHEMY_DATABASE_URI", "SessionLocal", "Base", "engine", "get_db", "init_db"]
+__all__ = [
+    "SQLALCHEMY_DATABASE_URI", "SessionLocal", "Base", "engine", "get_db", "init_db",
+    "replica_engines", "dispose_engines", "get_read_session", "read_db", "write_marker", "wrote_recently",
+    "WRITE_MARKER_COOKIE", "WRITE_MARKER_HEADER",
+    "create_engines", "sqlite_read_engine", "SQLiteSession",
+]
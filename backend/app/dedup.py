@@ -0,0 +1,150 @@
+"""Near-duplicate detection for stories using MinHash and LSH banding.
+
+A story is reduced to a set of word shingles, and the set is summarised by a
+fixed-width MinHash signature (one unsigned 32-bit value per permutation).
+The signature is split into bands; stories that share at least one band
+bucket are candidate duplicates, and their similarity is estimated from the
+fraction of matching signature slots.
+"""
+import hashlib
+import random
+import re
+import struct
+from array import array
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from .core.config import settings
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Permutation coefficients are derived from a fixed seed so that signatures
+# stay comparable across processes and restarts.
+_rng = random.Random(1)
+_PERMUTATIONS: List[Tuple[int, int]] = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(settings.DEDUP_NUM_PERM)
+]
+_A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)
+_B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)
+_PRIME = np.uint64(_MERSENNE_PRIME)
+# Shingles hashed at once; bounds the (shingles x permutations) work arrays
+_CHUNK = 1024
+
+
+def shingles(text: str, size: int = None) -> Set[int]:
+    """Return the hashed word shingles of a text.
+
+    Texts shorter than one shingle collapse into a single shingle so that
+    very short stories still get a usable signature.
+    """
+    size = size or settings.DEDUP_SHINGLE_SIZE
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        words = [" ".join(words)]
+        size = 1
+    result = set()
+    for i in range(len(words) - size + 1):
+        shingle = " ".join(words[i:i + size]).encode("utf-8")
+        result.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "little"))
+    return result
+
+
+def _mod_prime(x: np.ndarray) -> np.ndarray:
+    """``x % _MERSENNE_PRIME`` for any uint64 ``x``, using ``2**61 = 1 (mod p)``."""
+    x = (x & _PRIME) + (x >> np.uint64(61))
+    return np.where(x >= _PRIME, x - _PRIME, x)
+
+
+def _mul_mod_prime(a: np.ndarray, h: np.ndarray) -> np.ndarray:
+    """``a * h % _MERSENNE_PRIME`` for ``a, h < _MERSENNE_PRIME`` without overflowing uint64.
+
+    Both factors are split into 31-bit halves; the partial products are
+    folded back below 2**64 using ``2**61 = 1 (mod p)``.
+    """
+    low31, low30 = np.uint64((1 << 31) - 1), np.uint64((1 << 30) - 1)
+    a_high, a_low = a >> np.uint64(31), a & low31
+    h_high, h_low = h >> np.uint64(31), h & low31
+    middle = a_high * h_low + a_low * h_high
+    total = (
+        ((a_high * h_high) << np.uint64(1))
+        + (middle >> np.uint64(30))
+        + ((middle & low30) << np.uint64(31))
+        + a_low * h_low
+    )
+    return _mod_prime(total)
+
+
+def compute_signature(text: str) -> array:
+    """Compute the MinHash signature of a text as an unsigned 32-bit array.
+
+    Every permutation is applied to a chunk of shingles at once with NumPy;
+    the values are the same as ``min(((a * h + b) % p) & 0xffffffff)``
+    computed one shingle at a time.
+    """
+    hashed = np.fromiter(shingles(text), dtype=np.uint64)
+    signature = np.full(len(_PERMUTATIONS), _MAX_HASH, dtype=np.uint64)
+    for start in range(0, hashed.size, _CHUNK):
+        chunk = _mod_prime(hashed[start:start + _CHUNK])[:, None]
+        values = _mod_prime(_mul_mod_prime(_A, chunk) + _B) & np.uint64(_MAX_HASH)
+        np.minimum(signature, values.min(axis=0), out=signature)
+    return array("I", signature.astype(np.uint32).tobytes())
+
+
+def pack_signature(signature: array) -> bytes:
+    """Serialise a signature to its fixed-width little-endian form."""
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+
+def unpack_signature(data: bytes) -> array:
+    """Inverse of :func:`pack_signature`."""
+    return array("I", struct.unpack(f"<{len(data) // 4}I", data))
+
+
+def band_buckets(signature: array, bands: int = None) -> List[Tuple[int, int]]:
+    """Split a signature into LSH bands and hash each band to a bucket.
+
+    Returns ``(band, bucket)`` pairs. Buckets are signed 64-bit integers so
+    they fit a ``BIGINT`` column.
+    """
+    bands = bands or settings.DEDUP_BANDS
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "little", signed=True)))
+    return buckets
+
+
+def estimate_similarity(left: array, right: array) -> float:
+    """Estimate the Jaccard similarity of two signatures."""
+    if not left or len(left) != len(right):
+        return 0.0
+    matches = sum(1 for a, b in zip(left, right) if a == b)
+    return matches / len(left)
+
+
+def cluster_pairs(pairs: Iterable[Tuple[int, int]]) -> List[List[int]]:
+    """Group linked ids into clusters with a union-find."""
+    parent: Dict[int, int] = {}
+
+    def find(item: int) -> int:
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for left, right in pairs:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    clusters: Dict[int, List[int]] = {}
+    for item in parent:
+        clusters.setdefault(find(item), []).append(item)
+    return sorted((sorted(members) for members in clusters.values()), key=lambda c: c[0])
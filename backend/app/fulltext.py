@@ -0,0 +1,139 @@
+"""Full-text story search that reads compressed story bodies.
+
+Neither database can decompress a body itself, and keeping a plain copy of
+each body next to it would undo the compression, so every story body is
+indexed as it is written instead:
+
+* On PostgreSQL, ``stories.search_vector`` holds the stripped ``tsvector``
+  of the body (its distinct words, without positions), set from the text
+  on every write (see :func:`search_vector`) and GIN indexed.
+* On SQLite, ``stories_fts`` is an FTS5 table over the title, text and tags
+  of every story under the story's id, kept current by triggers on
+  ``stories``. It stores only the index, without word positions: it is an
+  external content table over the ``stories_search`` view, which
+  decompresses the bodies through the ``story_text`` function registered
+  on every SQLite connection.
+
+A search matches stories containing every word of the query, each word
+also matching as a prefix, instead of ``ILIKE`` substring matching, which
+has to read every story of the user.
+"""
+import re
+import sqlite3
+from typing import List, Optional
+
+from sqlalchemy import DDL, Table, event, func, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Text
+
+from .compression import decompress_bytes
+
+FTS_TABLE = "stories_fts"
+FTS_VIEW = "stories_search"
+# Lowercases words without stemming, like the unicode61 tokenizer of the FTS5 index
+TS_CONFIG = "simple"
+
+
+def _story_text(content) -> Optional[str]:
+    if content is None or isinstance(content, str):
+        return content
+    return decompress_bytes(content)
+
+
+@event.listens_for(Engine, "connect")
+def _register_story_text(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("story_text", 1, _story_text, deterministic=True)
+
+
+_INDEX_NEW = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) "
+    f"VALUES (new.id, new.title, story_text(new.content), new.tags);"
+)
+# An external content index is told which values to remove
+_UNINDEX_OLD = (
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, content, tags) "
+    f"VALUES ('delete', old.id, old.title, story_text(old.content), old.tags);"
+)
+
+CREATE_STATEMENTS: List[str] = [
+    f"CREATE VIEW IF NOT EXISTS {FTS_VIEW} AS "
+    f"SELECT id, title, story_text(content) AS content, tags FROM stories",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, content, tags, content = '{FTS_VIEW}', content_rowid = 'id', detail = 'none', "
+    f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_insert AFTER INSERT ON stories BEGIN {_INDEX_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_update AFTER UPDATE OF title, content, tags ON stories BEGIN "
+    f"{_UNINDEX_OLD} {_INDEX_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_delete AFTER DELETE ON stories BEGIN {_UNINDEX_OLD} END",
+]
+
+DROP_STATEMENTS: List[str] = [
+    "DROP TRIGGER IF EXISTS stories_fts_insert",
+    "DROP TRIGGER IF EXISTS stories_fts_update",
+    "DROP TRIGGER IF EXISTS stories_fts_delete",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"DROP VIEW IF EXISTS {FTS_VIEW}",
+]
+
+# Index the stories already present, e.g. when adding search to an existing database
+REBUILD_STATEMENT = f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+
+
+class search_vector(FunctionElement):
+    """The value of ``stories.search_vector`` for a story body: NULL except on PostgreSQL."""
+    type = Text()
+    inherit_cache = True
+
+
+@compiles(search_vector)
+def _compile_search_vector(element, compiler, **kw):
+    return "NULL"
+
+
+@compiles(search_vector, "postgresql")
+def _compile_search_vector_postgresql(element, compiler, **kw):
+    return f"strip(to_tsvector('{TS_CONFIG}', %s))" % compiler.process(element.clauses, **kw)
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(search: str) -> Optional[str]:
+    """FTS5 query matching every word of ``search`` as a prefix, or None if it has no words."""
+    words = _WORD_RE.findall(search)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def matching_story_ids(expression: str) -> Select:
+    """Ids of the stories matching an expression from :func:`match_expression`."""
+    return select(literal_column("rowid")).select_from(table(FTS_TABLE)).where(
+        text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=expression)
+    )
+
+
+def tsquery(search: str) -> Optional[str]:
+    """``to_tsquery`` input matching every word of ``search`` as a prefix, or None if it has no words."""
+    words = _WORD_RE.findall(search)
+    if not words:
+        return None
+    return " & ".join(f"'{word}':*" for word in words)
+
+
+def vector_matches(column, query: str) -> ColumnElement:
+    """Whether a ``search_vector`` column matches a query from :func:`tsquery`."""
+    return column.op("@@")(func.to_tsquery(TS_CONFIG, query))
+
+
+def register(stories: Table) -> None:
+    """Create and drop the index along with the stories table on SQLite."""
+    for statement in CREATE_STATEMENTS:
+        event.listen(stories, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for statement in DROP_STATEMENTS:
+        event.listen(stories, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
@@ -1,26 +1,30 @@
+import asyncio
 import logging
-import sys
+import math
 from contextlib import asynccontextmanager
 from typing import Any, Dict
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from sqlalchemy.orm import Session
 
 from app import __version__
+from app.ai import keep_models_warm
 from app.api.v1.api import api_router
 from app.core.config import settings
-from app.database import SessionLocal, engine, init_db
+from app.core.invalidation import listen_for_invalidations
+from app.core.logs import configure_logging
+from app.core.tracing import TracingMiddleware, configure_tracing
+from app.core.revocation import load_revocations, refresh_revocations_forever
+from app.database import (
+    WRITE_MARKER_COOKIE, WRITE_MARKER_HEADER, ReplicaSessions, SessionLocal, engine, init_db, write_marker,
+)
 from app.models import Base
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# Configure logging, written out by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -58,10 +62,23 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
     
+    # Mirror revoked tokens in memory and keep them in sync
+    load_revocations()
+    revocation_refresher = asyncio.create_task(refresh_revocations_forever())
+    
+    # Evict cache entries invalidated by other workers
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    
+    # Preload the analysis models in the background so startup is not held up
+    model_keeper = asyncio.create_task(keep_models_warm())
+    
     yield  # The application runs here
     
     # Shutdown: Clean up resources
     logger.info("Shutting down...")
+    revocation_refresher.cancel()
+    model_keeper.cancel()
+    invalidation_listener.cancel()
     engine.dispose()
 
 # Create FastAPI app with lifespan events
@@ -113,6 +130,30 @@ app.add_middleware(
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
+@app.middleware("http")
+async def track_user_writes(request: Request, call_next):
+    """Mark successful writes so the user's next reads avoid lagging replicas.
+
+    The marker goes back to the client as a cookie and a header, so it
+    reaches whichever worker serves the next request.
+    """
+    response = await call_next(request)
+    if ReplicaSessions and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        user_id = getattr(request.state, "user_id", None)
+        if user_id is not None:
+            marker = write_marker(user_id)
+            response.headers[WRITE_MARKER_HEADER] = marker
+            response.set_cookie(
+                WRITE_MARKER_COOKIE, marker, max_age=math.ceil(settings.READ_YOUR_WRITES_SECONDS),
+                httponly=True, samesite="lax",
+            )
+    return response
+
+# Trace requests and everything they run; outermost, so the span covers the other middleware
+if settings.TRACING_ENABLED:
+    configure_tracing()
+    app.add_middleware(TracingMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
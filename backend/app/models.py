@@ -1,7 +1,11 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, ForeignKey, DateTime, Boolean, LargeBinary, Index, UniqueConstraint, JSON
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from .database import Base
+from .compression import CompressedText
+from . import fulltext
 
 class User(Base):
     __tablename__ = "users"
@@ -17,7 +21,8 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    stories = relationship("Story", back_populates="owner", cascade="all, delete-orphan")
+    # Stories are removed by the stories.owner_id ON DELETE CASCADE, not loaded and deleted one by one
+    stories = relationship("Story", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True)
 
 class Story(Base):
     __tablename__ = "stories"
@@ -25,12 +30,128 @@ class Story(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     date = Column(String, nullable=False)
-    content = Column(Text, nullable=False)
+    # Loaded only when asked for, so story lists that do not return it skip reading and decompressing it
+    content = deferred(Column(CompressedText, nullable=False))
+    # Words of the content for search on PostgreSQL, set by _index_for_search; unused elsewhere
+    search_vector = deferred(Column(Text().with_variant(TSVECTOR(), "postgresql"), nullable=True))
     tags = Column(String, default="")
     emotional_impact = Column(String, default="medium")
-    analysis = Column(Text, nullable=True)
+    analysis = Column(CompressedText, nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    minhash = Column(LargeBinary, nullable=True)  # Packed uint32 MinHash signature
+    revision = Column(Integer, default=1, server_default="1", nullable=False)
     
     owner = relationship("User", back_populates="stories")
+    lsh_buckets = relationship("StoryLSHBucket", cascade="all, delete-orphan", passive_deletes=True)
+    revisions = relationship(
+        "StoryRevision",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="dynamic",
+        order_by="StoryRevision.version",
+    )
+    
+    __table_args__ = (
+        # Owner-scoped lookups, and story lists in newest-first order
+        Index("ix_stories_owner_id_created_at", "owner_id", "created_at", "id"),
+        Index("ix_stories_search_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+    # Updates and deletes also filter on the owner, so they touch a single
+    # partition when stories is hash partitioned (see app.partitioning)
+    __mapper_args__ = {"primary_key": [id, owner_id]}
+
+fulltext.register(Story.__table__)
+
+@event.listens_for(Story.content, "set")
+def _index_for_search(story, value, oldvalue, initiator):
+    story.search_vector = None if value is None else fulltext.search_vector(value)
+
+class StoryLSHBucket(Base):
+    """One LSH band bucket of a story's MinHash signature."""
+    __tablename__ = "story_lsh_buckets"
+    
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_story_lsh_buckets_owner_band_bucket", "owner_id", "band", "bucket"),
+    )
+
+class StoryRevision(Base):
+    """A stored version of a story's content.
+
+    Snapshots hold the full text; the versions in between hold a JSON delta
+    against the previous version (see ``app.revisions``).
+    """
+    __tablename__ = "story_revisions"
+    
+    id = Column(Integer, primary_key=True)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False)
+    owner_id = Column(Integer, nullable=False)  # Copy of the story's owner, part of the foreign key when partitioned
+    version = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, nullable=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("story_id", "version", name="uq_story_revisions_story_version"),
+    )
+
+class RateLimitBucket(Base):
+    """Token bucket state shared between workers (``RATE_LIMIT_BACKEND=postgres``)."""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix timestamp of the last refill
+
+class UserStoryStats(Base):
+    """Per-user writing statistics, maintained incrementally by ``crud.story``."""
+    __tablename__ = "user_story_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    story_count = Column(Integer, default=0, nullable=False)
+    total_words = Column(BigInteger, default=0, nullable=False)
+    impact_counts = Column(JSON, default=dict, nullable=False)  # emotional_impact -> stories
+    tag_counts = Column(JSON, default=dict, nullable=False)  # tag -> stories
+    month_counts = Column(JSON, default=dict, nullable=False)  # "YYYY-MM" of created_at -> stories
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class RevokedToken(Base):
+    """An access token revoked before its expiry, identified by its ``jti`` claim."""
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class AnalysisRun(Base):
+    """Performance figures of one model call made to analyze a story."""
+    __tablename__ = "analysis_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="SET NULL"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    model = Column(String, nullable=False)
+    options = Column(JSON, nullable=True)
+    success = Column(Boolean, nullable=False, default=True)
+    # Milliseconds; queue_ms is time spent waiting for admission in the API
+    queue_ms = Column(Float, nullable=True)
+    wall_ms = Column(Float, nullable=True)
+    total_duration_ms = Column(Float, nullable=True)
+    load_duration_ms = Column(Float, nullable=True)
+    prompt_eval_count = Column(Integer, nullable=True)
+    prompt_eval_duration_ms = Column(Float, nullable=True)
+    eval_count = Column(Integer, nullable=True)
+    eval_duration_ms = Column(Float, nullable=True)
+    tokens_per_second = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_analysis_runs_created_at_model", "created_at", "model"),
+    )
@@ -0,0 +1,200 @@
+"""Hash partitioning of the stories table by owner (PostgreSQL).
+
+:func:`rebuild_stories` converts ``stories`` between a single table and
+``PARTITION BY HASH (owner_id)`` with a given number of partitions, or
+changes the number of partitions, while the application keeps running:
+
+1. An empty ``stories_rebuild`` table is created in the target layout, with
+   the indexes of the model, and a trigger mirrors every write made to
+   ``stories`` into it.
+2. Existing rows are copied in short transactions of ``batch_size`` ids.
+   Source rows are read ``FOR SHARE``, so a row cannot be updated or
+   deleted between being read and being copied.
+3. One transaction briefly locks ``stories``, drops it and renames the copy
+   into its place. Foreign keys referencing stories are re-added
+   ``NOT VALID`` and validated afterwards without blocking writes.
+
+A partitioned table can only have unique constraints that include the
+partition key, so its primary key is ``(id, owner_id)`` and the tables
+referencing stories do so through ``(story_id, owner_id)``. ``analysis_runs``
+keeps its ``story_id`` without a foreign key while partitioned, since it has
+no owner column to build one from.
+
+Every story query filters on ``owner_id``, which lets PostgreSQL prune it
+to a single partition.
+"""
+import logging
+from typing import Callable, List, Optional
+
+from sqlalchemy import Index, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Tables referencing stories.id, with their ON DELETE action
+_REFERENCING = [
+    ("story_lsh_buckets", "CASCADE"),
+    ("story_revisions", "CASCADE"),
+    ("analysis_runs", "SET NULL"),
+]
+
+_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION stories_rebuild_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM stories_rebuild WHERE id = OLD.id AND owner_id = OLD.owner_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO stories_rebuild SELECT (NEW).*;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('stories'))"
+    )).scalar())
+
+
+def partition_count(conn: Connection) -> int:
+    """Number of partitions of ``stories``, 0 for a single table."""
+    return conn.execute(text(
+        "SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass('stories')"
+    )).scalar()
+
+
+def _indexes(conn: Connection) -> List[Index]:
+    """The model's indexes on stories, less those on columns a migration has yet to add."""
+    columns = set(conn.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = 'stories'::regclass AND attnum > 0 AND NOT attisdropped"
+    )).scalars())
+    return [
+        index for index in models.Story.__table__.indexes
+        if all(column.name in columns for column in index.columns)
+    ]
+
+
+def _create_rebuild_table(conn: Connection, partitions: int) -> None:
+    # Leftovers of an interrupted rebuild
+    conn.execute(text("DROP TRIGGER IF EXISTS stories_rebuild_sync ON stories"))
+    conn.execute(text("DROP TABLE IF EXISTS stories_rebuild"))
+    key = "(id, owner_id)" if partitions else "(id)"
+    layout = " PARTITION BY HASH (owner_id)" if partitions else ""
+    conn.execute(text(
+        f"CREATE TABLE stories_rebuild (LIKE stories INCLUDING DEFAULTS, "
+        f"CONSTRAINT stories_rebuild_pkey PRIMARY KEY {key}, "
+        f"CONSTRAINT stories_rebuild_owner_id_fkey FOREIGN KEY (owner_id) "
+        f"REFERENCES users (id) ON DELETE CASCADE){layout}"
+    ))
+    for remainder in range(partitions):
+        conn.execute(text(
+            f"CREATE TABLE stories_rebuild_p{remainder} PARTITION OF stories_rebuild "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        ))
+    # Built before the copy: building them afterwards would block the mirrored writes
+    for index in _indexes(conn):
+        columns = ", ".join(column.name for column in index.columns)
+        method = index.dialect_options["postgresql"]["using"] or "btree"
+        conn.execute(text(f"CREATE INDEX {index.name}_rebuild ON stories_rebuild USING {method} ({columns})"))
+
+
+def _swap(conn: Connection, partitions: int) -> None:
+    conn.execute(text("LOCK TABLE stories IN ACCESS EXCLUSIVE MODE"))
+    indexes = _indexes(conn)
+    conn.execute(text("DROP TRIGGER stories_rebuild_sync ON stories"))
+    for table, _ in _REFERENCING:
+        names = conn.execute(text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE contype = 'f' AND conrelid = to_regclass(:table) AND confrelid = to_regclass('stories')"
+        ), {"table": table}).scalars().all()
+        for name in names:
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+    # The id sequence would otherwise be dropped along with the old table
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence('stories', 'id')")).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY stories_rebuild.id"))
+    conn.execute(text("DROP TABLE stories"))
+    conn.execute(text("ALTER TABLE stories_rebuild RENAME TO stories"))
+    conn.execute(text("ALTER TABLE stories RENAME CONSTRAINT stories_rebuild_pkey TO stories_pkey"))
+    conn.execute(text("ALTER TABLE stories RENAME CONSTRAINT stories_rebuild_owner_id_fkey TO stories_owner_id_fkey"))
+    for remainder in range(partitions):
+        conn.execute(text(f"ALTER TABLE stories_rebuild_p{remainder} RENAME TO stories_p{remainder}"))
+    for index in indexes:
+        conn.execute(text(f"ALTER INDEX {index.name}_rebuild RENAME TO {index.name}"))
+
+    for table, action in _REFERENCING:
+        if not partitions:
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_story_id_fkey FOREIGN KEY (story_id) "
+                f"REFERENCES stories (id) ON DELETE {action} NOT VALID"
+            ))
+        elif action == "CASCADE":
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_story_id_fkey FOREIGN KEY (story_id, owner_id) "
+                f"REFERENCES stories (id, owner_id) ON DELETE CASCADE NOT VALID"
+            ))
+
+
+def rebuild_stories(
+    engine: Engine,
+    partitions: int,
+    batch_size: int = 10000,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> None:
+    """Rebuild ``stories`` with ``partitions`` hash partitions (0 for a single table).
+
+    Each step runs in its own transaction on a new connection from
+    ``engine``; ``progress`` is called with (copied up to id, last id) after
+    each batch.
+    """
+    if engine.dialect.name != "postgresql":
+        raise ValueError("Story partitioning requires PostgreSQL")
+    if partitions < 0:
+        raise ValueError("partitions must be 0 or more")
+
+    with engine.begin() as conn:
+        _create_rebuild_table(conn, partitions)
+        conn.execute(text(_SYNC_FUNCTION))
+        conn.execute(text(
+            "CREATE TRIGGER stories_rebuild_sync AFTER INSERT OR UPDATE OR DELETE ON stories "
+            "FOR EACH ROW EXECUTE FUNCTION stories_rebuild_sync()"
+        ))
+    # Rows above this id are inserted after the trigger exists and are mirrored by it
+    with engine.begin() as conn:
+        last_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM stories")).scalar()
+
+    copied_to = 0
+    while copied_to < last_id:
+        upper = min(copied_to + batch_size, last_id)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "WITH batch AS ("
+                "    SELECT * FROM stories WHERE id > :lower AND id <= :upper FOR SHARE"
+                ") INSERT INTO stories_rebuild SELECT * FROM batch ON CONFLICT DO NOTHING"
+            ), {"lower": copied_to, "upper": upper})
+        copied_to = upper
+        if progress is not None:
+            progress(copied_to, last_id)
+
+    with engine.begin() as conn:
+        _swap(conn, partitions)
+        conn.execute(text("DROP FUNCTION stories_rebuild_sync()"))
+
+    with engine.begin() as conn:
+        if not partitions:
+            # Runs of stories deleted while partitioned still point at them
+            conn.execute(text(
+                "UPDATE analysis_runs SET story_id = NULL WHERE story_id IS NOT NULL "
+                "AND NOT EXISTS (SELECT 1 FROM stories WHERE stories.id = analysis_runs.story_id)"
+            ))
+        for table, action in _REFERENCING:
+            if not partitions or action == "CASCADE":
+                conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_story_id_fkey"))
+        conn.execute(text("ANALYZE stories"))
+    logger.info(f"Rebuilt stories with {partitions} partitions" if partitions else "Rebuilt stories as a single table")
@@ -0,0 +1,102 @@
+"""Text deltas used to store story revisions compactly.
+
+A delta is a list of ``[start, end, text]`` operations expressed in character
+offsets of the *old* text: the slice ``old[start:end]`` is replaced by
+``text``. Operations are sorted and never overlap, so applying a delta is a
+single left-to-right pass.
+"""
+import difflib
+import json
+from typing import List, Sequence, Tuple
+
+Delta = List[Tuple[int, int, str]]
+
+
+def compute_delta(old: str, new: str) -> Delta:
+    """Compute the edit operations that turn ``old`` into ``new``.
+
+    The common prefix and suffix are trimmed first, which is all that is
+    needed for the typical autosave of a single edited region. Whatever is
+    left is diffed line by line to keep the matcher cheap on long stories.
+    """
+    if old == new:
+        return []
+
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-suffix - 1] == new[-suffix - 1]:
+        suffix += 1
+
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+    old_lines = old_mid.splitlines(keepends=True)
+    new_lines = new_mid.splitlines(keepends=True)
+    if len(old_lines) <= 1 or len(new_lines) <= 1:
+        return [(prefix, prefix + len(old_mid), new_mid)]
+
+    old_offsets = _line_offsets(old_lines)
+    new_offsets = _line_offsets(new_lines)
+    delta: Delta = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        delta.append((
+            prefix + old_offsets[i1],
+            prefix + old_offsets[i2],
+            new_mid[new_offsets[j1]:new_offsets[j2]],
+        ))
+    return delta
+
+
+def apply_delta(text: str, delta: Sequence[Sequence]) -> str:
+    """Apply edit operations to ``text``.
+
+    Raises:
+        ValueError: If an operation is out of range or overlaps the previous one
+    """
+    parts = []
+    cursor = 0
+    for start, end, replacement in delta:
+        if start < cursor or end < start or end > len(text):
+            raise ValueError(f"Invalid edit operation [{start}, {end}) at position {cursor}")
+        parts.append(text[cursor:start])
+        parts.append(replacement)
+        cursor = end
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
+def encode_delta(delta: Delta) -> str:
+    """Serialise a delta to compact JSON."""
+    return json.dumps([list(op) for op in delta], ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_delta(data: str) -> Delta:
+    """Inverse of :func:`encode_delta`."""
+    return [tuple(op) for op in json.loads(data)]
+
+
+def is_snapshot_version(version: int, interval: int) -> bool:
+    """Whether ``version`` is stored as a full snapshot.
+
+    Version 1 is always a snapshot, then every ``interval``-th version after
+    it, so reconstructing any version applies at most ``interval - 1`` deltas.
+    """
+    return (version - 1) % interval == 0
+
+
+def snapshot_version_for(version: int, interval: int) -> int:
+    """Return the snapshot version that ``version`` is reconstructed from."""
+    return version - (version - 1) % interval
+
+
+def _line_offsets(lines: List[str]) -> List[int]:
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
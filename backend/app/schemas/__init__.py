@@ -18,7 +18,26 @@ from .story import (
     StoryCreate,
     StoryUpdate,
     Story,
-    StoryOut
+    StoryOut,
+    DuplicateCluster,
+    StoryRevision,
+    StoryRevisionContent,
+    TextEdit,
+    StoryContentPatch,
+    StoryContentPatchResult,
+    StoryAnalytics
+)
+
+# Statistics schemas
+from .stats import (
+    TagCount,
+    UserStats,
+    Percentiles,
+    ModelAnalysisMetrics,
+    AnalysisMetrics,
+    SchedulerClassStats,
+    SchedulerStats,
+    CacheStats
 )
 
 # Define exports
@@ -37,7 +56,23 @@ __all__ = [
     'StoryCreate',
     'StoryUpdate',
     'Story',
-    'StoryOut'
+    'StoryOut',
+    'DuplicateCluster',
+    'StoryRevision',
+    'StoryRevisionContent',
+    'TextEdit',
+    'StoryContentPatch',
+    'StoryContentPatchResult',
+    'StoryAnalytics',
+    # Statistics schemas
+    'TagCount',
+    'UserStats',
+    'Percentiles',
+    'ModelAnalysisMetrics',
+    'AnalysisMetrics',
+    'SchedulerClassStats',
+    'SchedulerStats',
+    'CacheStats'
 ]
 
 # After all schemas are defined, we can now set up the relationships
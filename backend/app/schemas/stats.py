@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+class UserStats(BaseModel):
+    """Writing statistics for the current user's dashboard."""
+    story_count: int
+    total_words: int
+    average_words: float
+    by_emotional_impact: Dict[str, int]
+    top_tags: List[TagCount]
+    stories_per_month: Dict[str, int]  # "YYYY-MM" -> stories created that month
+    updated_at: datetime
+
+class Percentiles(BaseModel):
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+
+class ModelAnalysisMetrics(BaseModel):
+    """Analysis call figures for one model over the reporting window."""
+    model: str
+    runs: int
+    failures: int
+    cold_loads: int  # Runs where Ollama spent at least the cold load threshold loading the model
+    queue_ms: Percentiles
+    wall_ms: Percentiles
+    load_duration_ms: Percentiles
+    prompt_eval_count: Percentiles
+    eval_count: Percentiles
+    tokens_per_second: Percentiles
+
+class AnalysisMetrics(BaseModel):
+    since: datetime
+    models: List[ModelAnalysisMetrics]
+
+class SchedulerClassStats(BaseModel):
+    queued: int
+    queued_users: int
+    dispatched: int  # Calls started from the queue since the worker started
+    wait_p50: Optional[float] = None  # Seconds, over recent calls
+    wait_p95: Optional[float] = None
+    wait_max: Optional[float] = None
+
+class SchedulerStats(BaseModel):
+    """Live state of this worker's model call scheduler."""
+    running: int
+    max_concurrency: int
+    avg_duration: float
+    classes: Dict[str, SchedulerClassStats]
+
+class CacheStats(BaseModel):
+    """Story list response cache figures for this worker."""
+    enabled: bool
+    entries: int
+    owners: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    invalidations: int
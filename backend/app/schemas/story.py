@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 from pydantic import BaseModel, Field, ConfigDict
 
 # No circular imports - we'll handle the relationship in the model itself
@@ -34,6 +34,7 @@ class Story(StoryBase):
     created_at: datetime
     updated_at: datetime
     owner_id: int  # Reference to owner's ID instead of User object
+    revision: int = 1
     
     model_config = ConfigDict(
         from_attributes=True,
@@ -57,3 +58,56 @@ class Story(StoryBase):
 
 class StoryOut(Story):
     pass
+
+class DuplicateCluster(BaseModel):
+    """A group of stories whose content is nearly identical."""
+    story_ids: List[int]
+    titles: List[str]
+    similarity: float  # Lowest estimated similarity between linked stories
+
+class StoryRevision(BaseModel):
+    """Metadata of a stored story revision."""
+    version: int
+    is_snapshot: bool
+    size: int  # Stored characters, full text for snapshots or the delta otherwise
+    created_at: datetime
+
+class StoryRevisionContent(BaseModel):
+    """A past version of a story's content."""
+    version: int
+    content: str
+    created_at: datetime
+
+class TextEdit(BaseModel):
+    """Replace ``content[start:end]`` of the base revision with ``text``."""
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str = ""
+
+class StoryContentPatch(BaseModel):
+    """A batch of edits against a known revision of a story's content.
+
+    Edits use offsets of the base revision and must be sorted and
+    non-overlapping.
+    """
+    base_revision: int = Field(..., ge=1)
+    edits: List[TextEdit]
+
+class StoryContentPatchResult(BaseModel):
+    """Minimal acknowledgement of a content patch, without the content."""
+    id: int
+    revision: int
+    length: int
+    updated_at: datetime
+
+class StoryAnalytics(BaseModel):
+    """Instant, locally computed metrics for a story."""
+    word_count: int
+    sentence_count: int
+    paragraph_count: int
+    avg_sentence_length: float
+    flesch_reading_ease: float
+    flesch_kincaid_grade: float
+    sentiment: float  # Overall valence in [-1, 1]
+    paragraph_sentiment: List[float]
+    emotional_arc: List[float]  # Valence over evenly sized slices of the story
@@ -0,0 +1,98 @@
+"""Production server entry point.
+
+Runs the app under gunicorn with uvicorn workers::
+
+    python -m app.server
+
+The master process imports the app once and forks workers from it, so every
+worker (including the ones replacing recycled workers) starts with warm
+imports. uvloop and httptools are used when installed. On SIGTERM workers
+stop accepting connections and are given ``WORKER_GRACEFUL_TIMEOUT`` seconds
+to finish in-flight requests, long enough for a running story analysis.
+
+For local development keep using ``uvicorn app.main:app --reload``.
+"""
+import importlib.util
+import logging
+import os
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers() -> int:
+    """One worker per CPU available to this process (respects container CPU sets).
+
+    With SQLite a single worker: writes are serialized anyway, and cache
+    invalidations only reach other workers through PostgreSQL.
+    """
+    if str(settings.SQLALCHEMY_DATABASE_URI).startswith("sqlite"):
+        return 1
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, cpus)
+
+
+def _post_fork(server, worker) -> None:
+    # The preloaded engines must not share pooled connections across processes
+    from app.database import dispose_engines
+
+    dispose_engines(close=False)
+
+
+def server_options() -> Dict[str, Any]:
+    """Gunicorn settings derived from the application settings."""
+    return {
+        "bind": settings.SERVER_BIND,
+        "workers": settings.WEB_CONCURRENCY or default_workers(),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "max_requests": settings.WORKER_MAX_REQUESTS,
+        "max_requests_jitter": settings.WORKER_MAX_REQUESTS_JITTER,
+        "graceful_timeout": settings.WORKER_GRACEFUL_TIMEOUT,
+        "timeout": settings.WORKER_TIMEOUT,
+        "keepalive": settings.WORKER_KEEPALIVE,
+        "loglevel": "debug" if settings.DEBUG else "info",
+        "accesslog": "-" if settings.DEBUG else None,
+        "post_fork": _post_fork,
+    }
+
+
+class StoryCraftServer(BaseApplication):
+    """Gunicorn application serving ``app.main:app``."""
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if value is not None and key in self.cfg.settings:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+
+        return app
+
+
+def main() -> None:
+    options = server_options()
+    logger.info(
+        "Starting %s workers on %s (uvloop: %s, httptools: %s)",
+        options["workers"],
+        options["bind"],
+        importlib.util.find_spec("uvloop") is not None,
+        importlib.util.find_spec("httptools") is not None,
+    )
+    StoryCraftServer(options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import SessionLocal
+from app.crud.story import backfill_minhash
+
+def backfill(user_id: int = None) -> None:
+    """Store MinHash signatures for the stories that lack one."""
+    db = SessionLocal()
+    try:
+        count = backfill_minhash(db, user_id=user_id)
+        scope = f"user {user_id}" if user_id is not None else "all users"
+        print(f"Indexed {count} stories for {scope}")
+    except Exception as e:
+        db.rollback()
+        print(f"Error indexing stories: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,56 @@
+"""Benchmark the local analytics engine on large stories.
+
+Usage:
+    python benchmarks/bench_analytics.py [--repeat 5]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.analytics import SENTIMENT_LEXICON, analyze_text  # noqa: E402
+
+FILLER = "the a and i we she he it was were then when into because never not kitchen door night".split()
+
+
+def make_story(size: int, rng: random.Random) -> str:
+    vocabulary = FILLER * 20 + list(SENTIMENT_LEXICON) + [f"word{chr(97 + i % 26)}{i}" for i in range(2000)]
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = [
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 25))).capitalize() + rng.choice(".!?")
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for size in (10_000, 100_000, 1_000_000):
+        text = make_story(size, rng)
+        analyze_text(text)  # Warm up
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = analyze_text(text)
+            timings.append(time.perf_counter() - start)
+        print(
+            f"size={len(text):>9,} chars  words={result['word_count']:>7,}  "
+            f"median={statistics.median(timings) * 1000:7.2f} ms  max={max(timings) * 1000:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark zstd compression of story bodies at rest.
+
+Writes the same stories into the application's schema twice, with
+compression disabled and enabled, then reports for each body size the bytes
+stored for the content column, the total size of the stories table including its
+indexes, TOAST and search index (the FTS5 tables on SQLite, the
+search_vector column and its GIN index on PostgreSQL), and the time to read
+every body back. Uses a temporary SQLite file, or the database given with
+``--database-url`` (its tables are dropped first).
+
+Usage (from the backend directory):
+    python benchmarks/bench_compression.py [--rows 200] [--database-url URL]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import bindparam, func, select, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.database import Base, create_engines  # noqa: E402
+from app.fulltext import search_vector  # noqa: E402
+
+WORDS = (
+    "the moment I realised my father had kept every letter was in the kitchen "
+    "on a rainy night when the bus never came and she laughed at the door"
+).split()
+
+
+def make_body(size: int, rng: random.Random) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def table_bytes(engine) -> int:
+    """On-disk size of stories with everything stored for it."""
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return connection.execute(text(
+                "SELECT coalesce(sum(pg_total_relation_size(relid)), pg_total_relation_size('stories')) "
+                "FROM pg_partition_tree('stories')"
+            )).scalar()
+        return connection.execute(text(
+            "SELECT sum(pgsize) FROM dbstat WHERE name IN ("
+            "  SELECT name FROM sqlite_master WHERE tbl_name = 'stories' OR name LIKE 'stories_fts%'"
+            ")"
+        )).scalar()
+
+
+def store(engine, bodies) -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    stories = models.Story.__table__.insert().values(search_vector=search_vector(bindparam("search_source")))
+    with engine.begin() as connection:
+        connection.execute(models.User.__table__.insert(), [
+            {"id": 1, "email": "writer@example.com", "hashed_password": "x", "theme": "light"}
+        ])
+        connection.execute(stories, [
+            {"title": f"Story {n}", "date": "2024-01-01", "content": body, "search_source": body, "tags": "seed", "owner_id": 1}
+            for n, body in enumerate(bodies)
+        ])
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM ANALYZE stories"))
+
+
+def measure(engine, rows: int) -> float:
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        for _ in range(3):
+            assert len(connection.execute(select(models.Story.content)).fetchall()) == rows
+    return (time.perf_counter() - start) / 3
+
+
+def run(url: str, rows: int) -> None:
+    engine, _ = create_engines(url)
+    rng = random.Random(42)
+    print(f"backend: {engine.dialect.name}  threshold={settings.STORY_COMPRESSION_THRESHOLD} "
+          f"level={settings.STORY_COMPRESSION_LEVEL}")
+    try:
+        for size in (1_000, 10_000, 100_000, 1_000_000):
+            bodies = [make_body(size, rng) for _ in range(max(1, rows * 1_000 // size))]
+            results = {}
+            for enabled in (False, True):
+                settings.STORY_COMPRESSION_ENABLED = enabled
+                store(engine, bodies)
+                # PostgreSQL may already compress a plain body itself when moving it to TOAST
+                stored = func.pg_column_size if engine.dialect.name == "postgresql" else func.length
+                with engine.connect() as connection:
+                    content = connection.execute(select(func.sum(stored(models.Story.__table__.c.content)))).scalar()
+                results[enabled] = (content, table_bytes(engine), measure(engine, len(bodies)))
+            (plain_content, plain_table, plain_read), (zstd_content, zstd_table, zstd_read) = results[False], results[True]
+            print(
+                f"body={size:>9,} B rows={len(bodies):>5}  "
+                f"content plain={plain_content / 1024:>9.1f} KiB zstd={zstd_content / 1024:>9.1f} KiB  "
+                f"table plain={plain_table / 1024:>9.1f} KiB zstd={zstd_table / 1024:>9.1f} KiB "
+                f"({zstd_table / len(bodies):>9,.0f} B/row) ratio={zstd_table / plain_table:5.3f}  "
+                f"read plain={plain_read * 1000:8.2f} ms zstd={zstd_read * 1000:8.2f} ms"
+            )
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200, help="Rows of 1 KB bodies; fewer rows of larger bodies")
+    parser.add_argument("--database-url", help="Database to write to instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        run(args.database_url, args.rows)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(f"sqlite:///{directory}/compression.db", args.rows)
+
+
+if __name__ == "__main__":
+    main()
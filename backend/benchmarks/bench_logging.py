@@ -0,0 +1,150 @@
+"""Benchmark request throughput with logging off, synchronous, and queued.
+
+Serves ``GET /users/me`` and ``GET /stories/`` in process (httpx over
+ASGI, no network) from a scratch SQLite database, with ``--concurrency``
+requests in flight, under these logging set ups:
+
+- off: only warnings are logged
+- sync: DEBUG records written by a ``StreamHandler`` on the event loop,
+  as before ``app.core.logs``
+- queue, queue-json: DEBUG records handed to the background writer of
+  ``app.core.logs.configure_logging``, as text or JSON
+- queue-limited: as queue, with the SQLAlchemy statement log rate limited
+
+When logging is on, SQLAlchemy logs every statement and its parameters,
+which stands in for the debug chatter of a busy endpoint. Log output goes
+to a file; ``--write-delay-ms`` makes every write block for that long, like
+stdout piped to a busy log collector.
+
+Usage (from the backend directory):
+    python benchmarks/bench_logging.py [--requests 2000] [--concurrency 20] [--write-delay-ms 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+DIRECTORY = tempfile.mkdtemp(prefix="bench_logging_")
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DIRECTORY}/bench.db"
+
+import httpx  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.logs import TEXT_FORMAT, configure_logging, stop_logging  # noqa: E402
+from app.main import app  # noqa: E402
+from app.crud import story as crud_story  # noqa: E402
+from app.crud import user as crud_user  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.schemas.auth import UserCreate  # noqa: E402
+from app.schemas.story import StoryCreate  # noqa: E402
+
+EMAIL = "bench@example.com"
+MODES = ["off", "sync", "queue", "queue-json", "queue-limited"]
+
+
+class SlowStream:
+    """A file whose writes block for a while, as a full pipe would."""
+
+    def __init__(self, file, delay: float):
+        self.file = file
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return self.file.write(text)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+def seed() -> str:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = crud_user.create_user(db, UserCreate(email=EMAIL, password="password123"))
+        db.commit()
+        for n in range(20):
+            crud_story.create_story(
+                db, StoryCreate(title=f"Story {n}", date="2024-01-01", content="A quiet evening by the river. " * 20),
+                user_id=user.id,
+            )
+    return create_access_token(subject=EMAIL)
+
+
+def set_up(mode: str, log_file) -> None:
+    settings.LOG_RATE_LIMITS = {"sqlalchemy.engine": 10.0} if mode == "queue-limited" else {}
+    if mode == "sync":
+        stop_logging()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(log_file)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+    else:
+        configure_logging(
+            level="WARNING" if mode == "off" else "DEBUG",
+            log_format="json" if mode == "queue-json" else "text",
+            stream=log_file,
+        )
+    # SQLAlchemy logs statements only when its own logger asks for them
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING if mode == "off" else logging.INFO)
+    # Client side request logging is not what is measured
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def load(token: str, requests: int, concurrency: int) -> list:
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = [f"{settings.API_V1_STR}/users/me", f"{settings.API_V1_STR}/stories/?limit=20"]
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def worker(index: int) -> None:
+            for n in range(index, requests, concurrency):
+                started = time.perf_counter()
+                response = await client.get(paths[n % len(paths)])
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="Time every log write blocks")
+    args = parser.parse_args()
+
+    # Measure the queries, not the response cache
+    settings.STORY_LIST_CACHE_ENABLED = False
+    token = seed()
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.write_delay_ms} ms per log write")
+    print(f"{'logging':<15}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'log lines':>11}")
+    for mode in args.modes:
+        log_path = Path(DIRECTORY) / f"{mode}.log"
+        with open(log_path, "w") as log_file:
+            set_up(mode, SlowStream(log_file, args.write_delay_ms / 1000) if args.write_delay_ms else log_file)
+            asyncio.run(load(token, args.concurrency * 5, args.concurrency))  # Warm up
+            started = time.perf_counter()
+            latencies = asyncio.run(load(token, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - started
+            stop_logging()
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        with open(log_path) as log_file:
+            lines = sum(1 for _ in log_file)
+        print(f"{mode:<15}{args.requests / elapsed:>8.0f}{cuts[49]:>9.2f}{cuts[98]:>9.2f}{lines:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark per-user story queries on a single vs a hash partitioned table.
+
+Builds the same data set in two schemas of a scratch PostgreSQL database,
+partitions one of them with the online rebuild of ``app.partitioning``, and
+reports the latency of ``crud.story.get_stories`` listing and searching one
+user's stories on each, plus the time of a whole-table VACUUM.
+
+Usage:
+    python benchmarks/bench_partitioning.py --database-url postgresql://localhost/storycraft_bench \\
+        [--users 5000] [--stories-per-user 40] [--partitions 16] [--queries 300]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import models  # noqa: E402,F401 - registers the tables
+from app.crud import story as crud_story  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.partitioning import rebuild_stories  # noqa: E402
+
+
+def schema_engine(url: str, schema: str):
+    return create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+
+
+def build(url: str, schema: str, users: int, stories_per_user: int):
+    with create_engine(url).begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = schema_engine(url, schema)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO users (email, hashed_password, theme, is_active, is_superuser, created_at, updated_at)
+            SELECT 'user' || g || '@example.com', 'x', 'light', true, false, now(), now()
+            FROM generate_series(1, :users) g
+        """), {"users": users})
+        conn.execute(text("""
+            INSERT INTO stories (title, date, content, search_vector, tags, emotional_impact, owner_id,
+                                 created_at, updated_at, revision)
+            SELECT 'Story ' || s, '2024-01-01', convert_to(body, 'UTF8'), strip(to_tsvector('simple', body)),
+                   'seed', 'medium', u.id, now() - s * interval '1 hour', now(), 1
+            FROM users u CROSS JOIN generate_series(1, :per_user) s
+            CROSS JOIN LATERAL (SELECT repeat('A quiet evening by the river. ', 60) || 'number ' || s AS body) b
+        """), {"per_user": stories_per_user})
+    return engine
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def measure(engine, users: int, queries: int, seed: int) -> dict:
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(seed)
+    owner_ids = [rng.randint(1, users) for _ in range(queries)]
+    results = {}
+    for name, search in (("list", None), ("search", "number 7")):
+        samples = []
+        db = Session()
+        try:
+            crud_story.get_stories(db, user_id=owner_ids[0], search=search)
+            for owner_id in owner_ids:
+                started = time.perf_counter()
+                crud_story.get_stories(db, user_id=owner_id, search=search)
+                samples.append((time.perf_counter() - started) * 1000)
+                db.expunge_all()
+        finally:
+            db.close()
+        results[name] = percentiles(samples)
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        started = time.perf_counter()
+        conn.execute(text("VACUUM stories"))
+        results["vacuum_s"] = time.perf_counter() - started
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="PostgreSQL database used only for the benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--stories-per-user", type=int, default=40)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.users * args.stories_per_user} stories, {args.users} users")
+    single = build(args.database_url, "bench_single", args.users, args.stories_per_user)
+    partitioned = build(args.database_url, "bench_partitioned", args.users, args.stories_per_user)
+    started = time.perf_counter()
+    rebuild_stories(partitioned, args.partitions)
+    print(f"online rebuild into {args.partitions} partitions: {time.perf_counter() - started:.1f} s")
+
+    print(f"{'layout':<16}{'query':<8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, engine in (("single table", single), (f"{args.partitions} partitions", partitioned)):
+        results = measure(engine, args.users, args.queries, args.seed)
+        for name in ("list", "search"):
+            p50, p95, p99 = results[name]
+            print(f"{label:<16}{name:<8}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}")
+        print(f"{label:<16}VACUUM stories: {results['vacuum_s']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark bulk user provisioning against one-at-a-time creation.
+
+Creates users in a scratch SQLite database, or in the database given with
+``--database-url`` (its tables are dropped first). One-at-a-time creation
+through ``crud.user.create_user`` is timed on a sample and extrapolated;
+bulk creation hashes passwords on a process pool and inserts in batches.
+
+Usage (from the backend directory):
+    python benchmarks/bench_provisioning.py [--users 10000] [--workers N] [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.crud.user import bulk_create_users, create_user  # noqa: E402
+from app.database import create_engines  # noqa: E402
+from app.models import Base  # noqa: E402
+from app.schemas.auth import UserCreate  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=50, help="Users created one at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine, _ = create_engines(args.database_url or f"sqlite:///{directory}/bench.db")
+        print(f"backend: {engine.dialect.name}")
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+        sample = [UserCreate(email=f"single{i}@example.com", password="password123") for i in range(args.sample)]
+        with Session() as db:
+            start = time.perf_counter()
+            for user in sample:
+                create_user(db, user)
+            single = (time.perf_counter() - start) / args.sample
+        print(f"one at a time: {single * 1000:.1f} ms/user, ~{single * args.users:.0f}s for {args.users} users")
+
+        users = [UserCreate(email=f"bulk{i}@example.com", password=f"password{i}") for i in range(args.users)]
+        with Session() as db, ProcessPoolExecutor(max_workers=args.workers) as executor:
+            start = time.perf_counter()
+            created, errors = bulk_create_users(db, users, executor=executor, workers=args.workers)
+            bulk = time.perf_counter() - start
+        print(
+            f"bulk ({args.workers} workers): {created} users in {bulk:.1f}s "
+            f"({created / bulk:.0f}/s, {single * args.users / bulk:.1f}x), {len(errors)} errors"
+        )
+
+        with Session() as db:
+            start = time.perf_counter()
+            created, errors = bulk_create_users(db, users[: min(1000, args.users)])
+        print(f"re-run of {len(errors)} existing users rejected in {time.perf_counter() - start:.2f}s without hashing")
+
+
+if __name__ == "__main__":
+    main()
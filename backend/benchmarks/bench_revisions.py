@@ -0,0 +1,85 @@
+"""Benchmark delta-compressed revision storage against naive full copies.
+
+Simulates a long autosave session on a multi-kilobyte story and reports the
+stored size of both schemes and the worst-case reconstruction time for a
+range of snapshot intervals.
+
+Usage:
+    python benchmarks/bench_revisions.py [--size 20000] [--saves 500]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app import revisions  # noqa: E402
+
+WORDS = "the a moment when she laughed door rain kitchen father letter bus night train".split()
+
+
+def make_story(size: int, rng: random.Random) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))) + ".\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)
+
+
+def autosave_session(story: str, saves: int, rng: random.Random):
+    """Yield successive versions, each a small edit of the previous one."""
+    yield story
+    for _ in range(saves):
+        position = rng.randrange(len(story))
+        if rng.random() < 0.7:
+            story = story[:position] + " " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) + story[position:]
+        else:
+            story = story[:position] + story[position + rng.randint(1, 40):]
+        yield story
+
+
+def run(size: int, saves: int, interval: int) -> None:
+    rng = random.Random(42)
+    versions = list(autosave_session(make_story(size, rng), saves, rng))
+
+    full_bytes = sum(len(v.encode("utf-8")) for v in versions)
+    stored = []
+    for number, content in enumerate(versions, start=1):
+        if revisions.is_snapshot_version(number, interval):
+            stored.append((True, content))
+        else:
+            delta = revisions.compute_delta(versions[number - 2], content)
+            stored.append((False, revisions.encode_delta(delta)))
+    delta_bytes = sum(len(data.encode("utf-8")) for _, data in stored)
+
+    # Worst case: the version right before the next snapshot
+    worst = min(interval, len(versions))
+    start = time.perf_counter()
+    content = stored[0][1]
+    for _, data in stored[1:worst]:
+        content = revisions.apply_delta(content, revisions.decode_delta(data))
+    elapsed = time.perf_counter() - start
+    assert content == versions[worst - 1]
+
+    print(
+        f"interval={interval:>4}  full={full_bytes / 1024:>9.1f} KiB  "
+        f"delta={delta_bytes / 1024:>8.1f} KiB  ratio={delta_bytes / full_bytes:6.3f}  "
+        f"worst reconstruct={elapsed * 1000:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000, help="Story size in characters")
+    parser.add_argument("--saves", type=int, default=500, help="Number of autosaves")
+    args = parser.parse_args()
+    for interval in (1, 5, 10, 20, 50, 100):
+        run(args.size, args.saves, interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Simulate interactive tail latency under a batch backlog.
+
+One tenant submits a backlog of analyses at once while other users send
+single interactive requests at random intervals. Model calls are simulated
+with sleeps. The same workload runs through a plain FIFO semaphore (the
+previous behaviour), through ``FairShareScheduler`` with the backlog marked
+``batch``, and through the scheduler with the backlog left ``interactive``
+(fairness from deficit round robin alone).
+
+Usage (from the backend directory):
+    python benchmarks/bench_scheduler.py [--backlog 200] [--interactive 40]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.ai import FairShareScheduler  # noqa: E402
+
+
+class FifoScheduler:
+    """First come, first served under the same concurrency cap."""
+
+    def __init__(self, max_concurrency: int):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def slot(self, user_id: int, priority: str = "interactive", cost: int = 1):
+        return self._semaphore
+
+
+async def run_workload(scheduler, args, backlog_priority: str) -> Dict[str, List[float]]:
+    rng = random.Random(args.seed)
+    latencies: Dict[str, List[float]] = {"interactive": [], "backlog": []}
+
+    async def call(user_id: int, priority: str, kind: str) -> None:
+        started = time.perf_counter()
+        async with scheduler.slot(user_id, priority, 1000):
+            await asyncio.sleep(args.service_ms / 1000 * rng.uniform(0.5, 1.5))
+        latencies[kind].append(time.perf_counter() - started)
+
+    async def interactive_users() -> None:
+        tasks = []
+        for i in range(args.interactive):
+            await asyncio.sleep(rng.expovariate(1 / (args.interval_ms / 1000)))
+            tasks.append(asyncio.create_task(call(2 + i % args.users, "interactive", "interactive")))
+        await asyncio.gather(*tasks)
+
+    backlog = [asyncio.create_task(call(1, backlog_priority, "backlog")) for _ in range(args.backlog)]
+    await asyncio.gather(interactive_users(), *backlog)
+    return latencies
+
+
+def report(name: str, latencies: Dict[str, List[float]], service_ms: float) -> None:
+    interactive = sorted(latencies["interactive"])
+    quantiles = statistics.quantiles(interactive, n=100, method="inclusive")
+    in_calls = [value * 1000 / service_ms for value in (statistics.median(interactive), quantiles[94], quantiles[98], interactive[-1])]
+    print(
+        f"{name:32} interactive p50 {in_calls[0]:6.1f}  p95 {in_calls[1]:6.1f}  p99 {in_calls[2]:6.1f}  "
+        f"max {in_calls[3]:6.1f}   backlog done after {max(latencies['backlog']) * 1000 / service_ms:6.1f}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backlog", type=int, default=200, help="Requests queued at once by one tenant")
+    parser.add_argument("--interactive", type=int, default=40, help="Single requests from other users")
+    parser.add_argument("--users", type=int, default=5, help="Interactive users")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--service-ms", type=float, default=20.0, help="Mean simulated model call time")
+    parser.add_argument("--interval-ms", type=float, default=40.0, help="Mean gap between interactive requests")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"latencies in multiples of the mean model call time ({args.service_ms:.0f} ms)")
+    def fair() -> FairShareScheduler:
+        return FairShareScheduler(args.concurrency, quantum=2000, batch_every=4, expected_duration=args.service_ms / 1000)
+
+    report("fifo", await run_workload(FifoScheduler(args.concurrency), args, "interactive"), args.service_ms)
+    report("fair share, backlog as batch", await run_workload(fair(), args, "batch"), args.service_ms)
+    report("fair share, backlog interactive", await run_workload(fair(), args, "interactive"), args.service_ms)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
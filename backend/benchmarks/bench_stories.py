@@ -0,0 +1,157 @@
+"""Benchmark the story queries of ``crud.story`` on SQLite or PostgreSQL.
+
+Seeds a scratch database with users and stories, then times reading one
+story, listing and searching a user's stories, and creating and updating
+stories, with ``--readers`` threads listing stories while the writes run.
+Uses the same engines as the application (``app.database.create_engines``),
+so on SQLite the WAL pragmas, the single writer and the reader pool, and
+FTS5 search are what gets measured.
+
+Usage (from the backend directory):
+    python benchmarks/bench_stories.py [--database-url URL] [--users 200] [--stories-per-user 50]
+
+Without ``--database-url`` a temporary SQLite file is used. The tables of
+the given database are dropped first.
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import bindparam, text  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app import models  # noqa: E402
+from app.crud import story as crud_story  # noqa: E402
+from app.database import Base, SQLiteSession, create_engines  # noqa: E402
+from app.fulltext import search_vector  # noqa: E402
+from app.schemas.story import StoryCreate, StoryUpdate  # noqa: E402
+
+WORDS = "the a moment when she laughed door rain kitchen father letter bus night train river".split()
+# Rarer words, so that searches match a realistic share of the stories
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+
+def make_content(rng: random.Random, words: int = 300) -> str:
+    return " ".join(rng.choice(WORDS) if rng.random() < 0.8 else rng.choice(VOCABULARY) for _ in range(words))
+
+
+def make_sessionmaker(url: str):
+    engine, read_engine = create_engines(url)
+    if read_engine is not None:
+        return engine, sessionmaker(class_=SQLiteSession, read_bind=read_engine, bind=engine, expire_on_commit=False)
+    return engine, sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def seed(engine, users: int, stories_per_user: int, rng: random.Random) -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    # Indexed for search as the application does it (see app.fulltext)
+    stories = models.Story.__table__.insert().values(search_vector=search_vector(bindparam("search_source")))
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i, "email": f"user{i}@example.com", "hashed_password": "x", "theme": "light"}
+            for i in range(1, users + 1)
+        ])
+        for owner_id in range(1, users + 1):
+            contents = [make_content(rng) for _ in range(stories_per_user)]
+            conn.execute(stories, [
+                {
+                    "title": f"Story {owner_id}-{n}",
+                    "date": "2024-01-01",
+                    "content": content,
+                    "search_source": content,
+                    "tags": "seed",
+                    "owner_id": owner_id,
+                }
+                for n, content in enumerate(contents)
+            ])
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT setval('users_id_seq', :users)"), {"users": users})
+
+
+def timed(samples: dict, name: str, call) -> None:
+    started = time.perf_counter()
+    call()
+    samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+
+
+def run(Session: sessionmaker, users: int, operations: int, rng: random.Random) -> dict:
+    samples: dict = {}
+    with Session() as db:
+        story_ids = {owner_id: story_id for story_id, owner_id in db.query(models.Story.id, models.Story.owner_id)}
+    for _ in range(operations):
+        owner_id = rng.randint(1, users)
+        db: Session = Session()
+        try:
+            timed(samples, "get", lambda: crud_story.get_story(db, story_id=story_ids[owner_id], user_id=owner_id))
+            timed(samples, "list", lambda: crud_story.get_stories(db, user_id=owner_id))
+            timed(samples, "search", lambda: crud_story.get_stories(db, user_id=owner_id, search=rng.choice(VOCABULARY)))
+            timed(samples, "create", lambda: crud_story.create_story(
+                db, StoryCreate(title="New", date="2024-02-01", content="A new story about the river."), user_id=owner_id
+            ))
+            timed(samples, "update", lambda: crud_story.update_story(
+                db, story_id=story_ids[owner_id], story=StoryUpdate(title=f"Renamed {rng.random()}"), user_id=owner_id
+            ))
+        finally:
+            db.close()
+    return samples
+
+
+def read_load(Session: sessionmaker, users: int, stop: threading.Event, counts: list) -> None:
+    rng = random.Random()
+    while not stop.is_set():
+        with Session() as db:
+            crud_story.get_stories(db, user_id=rng.randint(1, users))
+        counts.append(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--stories-per-user", type=int, default=50)
+    parser.add_argument("--operations", type=int, default=200, help="Rounds of get/list/search/create/update")
+    parser.add_argument("--readers", type=int, default=2, help="Threads listing stories meanwhile")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine, Session = make_sessionmaker(args.database_url or f"sqlite:///{directory}/bench.db")
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        seed(engine, args.users, args.stories_per_user, rng)
+        print(f"backend: {engine.dialect.name}, {args.users * args.stories_per_user} stories "
+              f"seeded in {time.perf_counter() - started:.1f}s, {args.readers} background readers")
+
+        stop, counts = threading.Event(), []
+        readers = [
+            threading.Thread(target=read_load, args=(Session, args.users, stop, counts))
+            for _ in range(args.readers)
+        ]
+        for reader in readers:
+            reader.start()
+        started = time.perf_counter()
+        try:
+            samples = run(Session, args.users, args.operations, rng)
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+        elapsed = time.perf_counter() - started
+
+        print(f"{'operation':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, values in samples.items():
+            cuts = statistics.quantiles(values, n=100, method="inclusive")
+            print(f"{name:<10}{cuts[49]:>9.2f}{cuts[94]:>9.2f}{cuts[98]:>9.2f}")
+        print(f"background lists: {len(counts) / elapsed:.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Micro-benchmarks of the crud, security and schema hot paths, with regression gating.
+
+Times story listing and search (``crud.story.get_stories``), story creation,
+JWT encoding and decoding, ``ai.remove_think_tags`` on a large model output,
+the MinHash signature of a 100 KB story (``dedup.compute_signature``),
+Pydantic validation of ``schemas.Story`` and ``schemas.User``, and the cost
+of a tracing span in sampled and unsampled traces. The crud
+benchmarks run against seeded data in a temporary SQLite file, or in the
+database given with ``--database-url`` (its tables are dropped first).
+
+Each benchmark is calibrated to run for at least ``--min-round-ms`` per
+round, and the per-call time of ``--rounds`` rounds is reported. ``run``
+writes the results as JSON; ``compare`` flags benchmarks whose median got
+slower than a baseline by more than ``--threshold`` percent and exits with
+status 1 if any did.
+
+Usage (from the backend directory):
+    python benchmarks/micro.py run [--database-url URL] [--output results.json] [--filter crud]
+    python benchmarks/micro.py run --output new.json --baseline baseline.json [--threshold 10]
+    python benchmarks/micro.py compare baseline.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import bindparam, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.ai import remove_think_tags  # noqa: E402
+from app.dedup import compute_signature  # noqa: E402
+from app.crud import story as crud_story  # noqa: E402
+from app.core import tracing  # noqa: E402
+from app.core.security import create_access_token, decode_access_token  # noqa: E402
+from app.database import Base, SQLiteSession, create_engines  # noqa: E402
+from app.fulltext import search_vector  # noqa: E402
+
+WORDS = "the a moment when she laughed door rain kitchen father letter bus night train river".split()
+VOCABULARY = [f"word{i}" for i in range(2000)]
+
+# name -> factory taking the seeded fixture and returning the callable to time
+BENCHMARKS: Dict[str, Callable[[dict], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+@benchmark("crud.get_stories")
+def _get_stories(fixture: dict):
+    Session, rng, users = fixture["Session"], fixture["rng"], fixture["users"]
+
+    def call():
+        with Session() as db:
+            return crud_story.get_stories(db, user_id=rng.randint(1, users))
+    return call
+
+
+@benchmark("crud.get_stories.search")
+def _search_stories(fixture: dict):
+    Session, rng, users = fixture["Session"], fixture["rng"], fixture["users"]
+
+    def call():
+        with Session() as db:
+            return crud_story.get_stories(db, user_id=rng.randint(1, users), search=rng.choice(VOCABULARY))
+    return call
+
+
+@benchmark("crud.create_story")
+def _create_story(fixture: dict):
+    # Stories go to a user of their own, so the read benchmarks see the same data
+    Session, user_id = fixture["Session"], fixture["users"] + 1
+    story = schemas.StoryCreate(title="New", date="2024-02-01", content=make_content(fixture["rng"]))
+
+    def call():
+        with Session() as db:
+            return crud_story.create_story(db, story, user_id=user_id)
+    return call
+
+
+@benchmark("security.create_access_token")
+def _create_token(fixture: dict):
+    return lambda: create_access_token(subject="user1@example.com")
+
+
+@benchmark("security.decode_access_token")
+def _decode_token(fixture: dict):
+    token = create_access_token(subject="user1@example.com")
+    return lambda: decode_access_token(token)
+
+
+@benchmark("ai.remove_think_tags")
+def _remove_think_tags(fixture: dict):
+    rng = fixture["rng"]
+    # About 100 KB, like a reasoning model's output with several thinking blocks
+    output = "".join(
+        f"<think>{make_content(rng, 400)}</think>\n{make_content(rng, 600)}\n" for _ in range(12)
+    )
+    return lambda: remove_think_tags(output)
+
+
+@benchmark("dedup.compute_signature")
+def _compute_signature(fixture: dict):
+    # About 100 KB, a long story
+    content = make_content(fixture["rng"], 17000)
+    return lambda: compute_signature(content)
+
+
+@benchmark("schemas.Story.from_attributes")
+def _validate_story(fixture: dict):
+    story = fixture["story"]
+    return lambda: schemas.Story.model_validate(story, from_attributes=True)
+
+
+@benchmark("schemas.StoryCreate.json")
+def _validate_story_create(fixture: dict):
+    body = json.dumps({"title": "A story", "date": "2024-01-01", "content": make_content(fixture["rng"]), "tags": "x"})
+    return lambda: schemas.StoryCreate.model_validate_json(body)
+
+
+@benchmark("schemas.User.from_attributes")
+def _validate_user(fixture: dict):
+    user = fixture["user"]
+    return lambda: schemas.User.model_validate(user, from_attributes=True)
+
+
+@benchmark("tracing.span.unsampled")
+def _unsampled_span(fixture: dict):
+    def call():
+        with tracing.start_span("work"):
+            pass
+    return call
+
+
+@benchmark("tracing.span.sampled")
+def _sampled_span(fixture: dict):
+    # Registered last: from here on spans are collected in memory
+    tracing.exporter = tracing.MemoryCollector(10000)
+    traceparent = f"00-{'1' * 32}-{'2' * 16}-01"
+
+    def call():
+        with tracing.start_span("work", traceparent=traceparent):
+            pass
+    return call
+
+
+def make_content(rng: random.Random, words: int = 300) -> str:
+    return " ".join(rng.choice(WORDS) if rng.random() < 0.8 else rng.choice(VOCABULARY) for _ in range(words))
+
+
+def make_fixture(url: str, users: int, stories_per_user: int, seed: int) -> dict:
+    """Seed the database and return what the benchmarks need."""
+    engine, read_engine = create_engines(url)
+    if read_engine is not None:
+        Session = sessionmaker(class_=SQLiteSession, read_bind=read_engine, bind=engine, expire_on_commit=False)
+    else:
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    rng = random.Random(seed)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    # Indexed for search as the application does it (see app.fulltext)
+    stories = models.Story.__table__.insert().values(search_vector=search_vector(bindparam("search_source")))
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i, "email": f"user{i}@example.com", "hashed_password": "x", "theme": "light"}
+            for i in range(1, users + 2)
+        ])
+        for owner_id in range(1, users + 1):
+            contents = [make_content(rng) for _ in range(stories_per_user)]
+            conn.execute(stories, [
+                {
+                    "title": f"Story {owner_id}-{n}",
+                    "date": "2024-01-01",
+                    "content": content,
+                    "search_source": content,
+                    "tags": "seed",
+                    "owner_id": owner_id,
+                }
+                for n, content in enumerate(contents)
+            ])
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT setval('users_id_seq', :users)"), {"users": users + 1})
+            conn.execute(text("ANALYZE"))
+
+    with Session() as db:
+        story = db.query(models.Story).first()
+        user = db.query(models.User).first()
+    return {
+        "engine": engine,
+        "Session": Session,
+        "rng": rng,
+        "users": users,
+        "story": story,
+        "user": user,
+    }
+
+
+def measure(call: Callable[[], object], rounds: int, min_round_ms: float) -> dict:
+    """Per-call times in microseconds over ``rounds`` calibrated rounds."""
+    call()  # Warm up caches and lazy imports
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 >= min_round_ms or number >= 1_000_000:
+            break
+        number *= 10 if elapsed * 1000 < min_round_ms / 10 else 2
+
+    samples = [elapsed / number * 1e6]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print a comparison table and return the names of the regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':<34}{'baseline us':>13}{'current us':>13}{'change':>9}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<34}{'-':>13}{result['median_us']:>13.2f}{'new':>9}")
+            continue
+        change = (result["median_us"] / before["median_us"] - 1) * 100
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<34}{before['median_us']:>13.2f}{result['median_us']:>13.2f}{change:>+8.1f}%{flag}")
+    for name in sorted(baseline["results"].keys() - current["results"].keys()):
+        print(f"{name:<34}{'(not run)':>13}")
+    if baseline["meta"].get("backend") != current["meta"].get("backend"):
+        print(f"note: baseline ran on {baseline['meta'].get('backend')}, current on {current['meta'].get('backend')}")
+    return regressions
+
+
+def run(args: argparse.Namespace) -> int:
+    names = [name for name in BENCHMARKS if not args.filter or any(f in name for f in args.filter)]
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = make_fixture(
+            args.database_url or f"sqlite:///{directory}/bench.db", args.users, args.stories_per_user, args.seed
+        )
+        backend = fixture["engine"].dialect.name
+        print(f"backend: {backend}, {args.users * args.stories_per_user} stories")
+        results = {}
+        for name in names:
+            results[name] = measure(BENCHMARKS[name](fixture), args.rounds, args.min_round_ms)
+            r = results[name]
+            print(f"{name:<34}{r['median_us']:>12.2f} us  (min {r['min_us']:.2f}, "
+                  f"stdev {r['stdev_us']:.2f}, {r['rounds']}x{r['number']})")
+        fixture["engine"].dispose()
+
+    current = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "backend": backend,
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "users": args.users,
+            "stories_per_user": args.stories_per_user,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2) + "\n")
+        print(f"results written to {args.output}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        print()
+        return 1 if compare(baseline, current, args.threshold) else 0
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--database-url", help="Scratch database to use instead of a temporary SQLite file")
+    run_parser.add_argument("--users", type=int, default=100)
+    run_parser.add_argument("--stories-per-user", type=int, default=50)
+    run_parser.add_argument("--rounds", type=int, default=7)
+    run_parser.add_argument("--min-round-ms", type=float, default=100.0)
+    run_parser.add_argument("--filter", action="append", help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="Write the results to this JSON file")
+    run_parser.add_argument("--baseline", help="Compare against these saved results")
+    run_parser.add_argument("--threshold", type=float, default=10.0, help="Slowdown in percent counted as a regression")
+
+    compare_parser = commands.add_parser("compare", help="Compare saved results against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Slowdown in percent counted as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Add story MinHash signatures and LSH bucket index
+
+Revision ID: 3c1f7a9d2e41
+Revises: 9ea5c10252bc
+Create Date: 2026-10-19 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f7a9d2e41'
+down_revision: Union[str, None] = '9ea5c10252bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('minhash', sa.LargeBinary(), nullable=True))
+
+    op.create_table('story_lsh_buckets',
+    sa.Column('story_id', sa.Integer(), nullable=False),
+    sa.Column('band', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['story_id'], ['stories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('story_id', 'band')
+    )
+    with op.batch_alter_table('story_lsh_buckets', schema=None) as batch_op:
+        batch_op.create_index('ix_story_lsh_buckets_owner_band_bucket', ['owner_id', 'band', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('story_lsh_buckets', schema=None) as batch_op:
+        batch_op.drop_index('ix_story_lsh_buckets_owner_band_bucket')
+
+    op.drop_table('story_lsh_buckets')
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.drop_column('minhash')
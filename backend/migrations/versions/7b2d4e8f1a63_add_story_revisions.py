@@ -0,0 +1,49 @@
+"""Add story revision history
+
+Revision ID: 7b2d4e8f1a63
+Revises: 3c1f7a9d2e41
+Create Date: 2026-10-19 10:03:11.482915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d4e8f1a63'
+down_revision: Union[str, None] = '3c1f7a9d2e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('story_revisions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('story_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['story_id'], ['stories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('story_id', 'version', name='uq_story_revisions_story_version')
+    )
+
+    # Every existing story starts its history with a snapshot of its current content
+    op.execute(
+        "INSERT INTO story_revisions (story_id, version, is_snapshot, data, created_at) "
+        "SELECT id, 1, TRUE, content, updated_at FROM stories"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('story_revisions')
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.drop_column('revision')
@@ -0,0 +1,162 @@
+"""Store story content and analysis as optionally compressed bytes
+
+The values are copied into new columns in batches, each committed on its
+own, while a trigger clears the copy of any row written meanwhile. A final
+pass redoes those rows under a lock on stories, and the new columns then
+replace the old ones. On SQLite run it with the application stopped: the
+table rebuild that swaps the columns does not keep writers out from the
+final pass on.
+
+Revision ID: a4e9c2b7d815
+Revises: 7b2d4e8f1a63
+Create Date: 2026-10-19 11:26:54.903377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.compression import compress_text, decompress_bytes
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e9c2b7d815'
+down_revision: Union[str, None] = '7b2d4e8f1a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def _encode(value):
+    if value is None:
+        return None
+    if not settings.STORY_COMPRESSION_ENABLED:
+        return value.encode('utf-8')
+    return compress_text(value, settings.STORY_COMPRESSION_THRESHOLD, settings.STORY_COMPRESSION_LEVEL)
+
+
+def _decode(value):
+    return None if value is None else decompress_bytes(value)
+
+
+def _stories(source_type, target_type):
+    return sa.table(
+        'stories',
+        sa.column('id', sa.Integer()),
+        sa.column('content', source_type),
+        sa.column('analysis', source_type),
+        sa.column('content_new', target_type),
+        sa.column('analysis_new', target_type),
+    )
+
+
+def _copy_rows(connection, stories, convert, condition) -> int:
+    """Copy up to BATCH_SIZE rows matching ``condition``, returning the last id copied (0 for none).
+
+    The rows are locked until the copy commits, so a write cannot land
+    between reading a row and storing its copy and then go unnoticed.
+    """
+    rows = connection.execute(
+        sa.select(stories.c.id, stories.c.content, stories.c.analysis)
+        .where(condition)
+        .order_by(stories.c.id)
+        .limit(BATCH_SIZE)
+        .with_for_update()
+    ).fetchall()
+    if not rows:
+        return 0
+    connection.execute(
+        stories.update()
+        .where(stories.c.id == sa.bindparam('story_id'))
+        .values(content_new=sa.bindparam('content_value'), analysis_new=sa.bindparam('analysis_value')),
+        [
+            {'story_id': row.id, 'content_value': convert(row.content), 'analysis_value': convert(row.analysis)}
+            for row in rows
+        ],
+    )
+    return rows[-1].id
+
+
+def _clear_copies_on_write() -> None:
+    """Have writes to content or analysis clear the row's copy, so the final pass redoes it.
+
+    Rows inserted meanwhile start without a copy anyway. Only updates that
+    set the old columns fire it, not the copy's own updates.
+    """
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE FUNCTION stories_clear_copy() RETURNS trigger AS $$ "
+            "BEGIN NEW.content_new := NULL; NEW.analysis_new := NULL; RETURN NEW; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER stories_clear_copy BEFORE UPDATE OF content, analysis ON stories "
+            "FOR EACH ROW EXECUTE FUNCTION stories_clear_copy()"
+        )
+    else:
+        op.execute(
+            "CREATE TRIGGER stories_clear_copy AFTER UPDATE OF content, analysis ON stories BEGIN "
+            "UPDATE stories SET content_new = NULL, analysis_new = NULL WHERE id = new.id; END"
+        )
+
+
+def _copy_in_batches(source_type, target_type, convert) -> None:
+    """Copy content/analysis into the *_new columns, then redo the rows written meanwhile.
+
+    The bulk of the copy runs outside the migration's transaction, so a
+    large table is neither copied in one transaction nor locked until the
+    end. content is never NULL, so a NULL content_new marks a row to redo.
+    """
+    stories = _stories(source_type, target_type)
+    _clear_copies_on_write()
+    # Commit the added columns and the trigger first, so each batch can be its own transaction
+    with op.get_context().autocommit_block():
+        engine = op.get_bind().engine
+        last_id = 0
+        while True:
+            with engine.begin() as connection:
+                copied_to = _copy_rows(connection, stories, convert, stories.c.id > last_id)
+            if not copied_to:
+                break
+            last_id = copied_to
+
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        # Held until the columns are swapped
+        op.execute("LOCK TABLE stories IN SHARE ROW EXCLUSIVE MODE")
+    while _copy_rows(connection, stories, convert, stories.c.content_new.is_(None)):
+        pass
+    op.execute("DROP TRIGGER stories_clear_copy" + (" ON stories" if connection.dialect.name == 'postgresql' else ""))
+    if connection.dialect.name == 'postgresql':
+        op.execute("DROP FUNCTION stories_clear_copy()")
+
+
+def _swap_columns(target_type) -> None:
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.drop_column('content')
+        batch_op.drop_column('analysis')
+        batch_op.alter_column('content_new', new_column_name='content', existing_type=target_type, nullable=False)
+        batch_op.alter_column('analysis_new', new_column_name='analysis', existing_type=target_type, nullable=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_new', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('analysis_new', sa.LargeBinary(), nullable=True))
+
+    _copy_in_batches(sa.Text(), sa.LargeBinary(), _encode)
+    _swap_columns(sa.LargeBinary())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_new', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('analysis_new', sa.Text(), nullable=True))
+
+    _copy_in_batches(sa.LargeBinary(), sa.Text(), _decode)
+    _swap_columns(sa.Text())
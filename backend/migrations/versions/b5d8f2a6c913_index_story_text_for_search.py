@@ -0,0 +1,208 @@
+"""Index the text of story bodies for search, compressed ones included
+
+On PostgreSQL, adds stories.search_vector, the stripped tsvector of each
+body, and a GIN index on it. Existing bodies are decompressed and indexed in
+batches, each committed on its own, while a trigger clears the vector of
+any story whose content is written meanwhile; a final pass redoes those
+under a lock that keeps writers out. The index is then built concurrently,
+unless stories is partitioned, which CREATE INDEX CONCURRENTLY does not
+support. Stories saved by an older version of the application after the
+migration keep a stale vector until they are next saved.
+
+On SQLite, stories_fts becomes an external content table over the
+stories_search view, which decompresses the bodies through the story_text
+function (see app.fulltext), and is rebuilt from it. The triggers call
+story_text too, so from then on stories can only be written through a
+connection that registers it. stories.search_vector is added but stays
+NULL.
+
+Revision ID: b5d8f2a6c913
+Revises: d9e3b6a1f472
+Create Date: 2026-10-20 09:12:37.418026
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.compression import decompress_bytes
+from app.partitioning import is_partitioned
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d8f2a6c913'
+down_revision: Union[str, None] = 'd9e3b6a1f472'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+# The SQLite index as of this revision, kept here as app.fulltext moves on
+FTS_TABLE = 'stories_fts'
+_INDEX_NEW = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) "
+    f"VALUES (new.id, new.title, story_text(new.content), new.tags);"
+)
+_UNINDEX_OLD = (
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, content, tags) "
+    f"VALUES ('delete', old.id, old.title, story_text(old.content), old.tags);"
+)
+CREATE_STATEMENTS = [
+    "CREATE VIEW stories_search AS SELECT id, title, story_text(content) AS content, tags FROM stories",
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"title, content, tags, content = 'stories_search', content_rowid = 'id', detail = 'none', "
+    f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER stories_fts_insert AFTER INSERT ON stories BEGIN {_INDEX_NEW} END",
+    f"CREATE TRIGGER stories_fts_update AFTER UPDATE OF title, content, tags ON stories BEGIN "
+    f"{_UNINDEX_OLD} {_INDEX_NEW} END",
+    f"CREATE TRIGGER stories_fts_delete AFTER DELETE ON stories BEGIN {_UNINDEX_OLD} END",
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+# The SQLite index of d9e3b6a1f472, which does not index compressed bodies
+_TEXT_BEFORE = "CASE WHEN substr(new.content, 1, 4) = X'28b52ffd' THEN NULL ELSE CAST(new.content AS TEXT) END"
+_INDEX_NEW_BEFORE = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) VALUES (new.id, new.title, {_TEXT_BEFORE}, new.tags);"
+)
+CREATE_STATEMENTS_BEFORE = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"title, content, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER stories_fts_insert AFTER INSERT ON stories BEGIN {_INDEX_NEW_BEFORE} END",
+    f"CREATE TRIGGER stories_fts_update AFTER UPDATE OF title, content, tags ON stories BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; {_INDEX_NEW_BEFORE} END",
+    f"CREATE TRIGGER stories_fts_delete AFTER DELETE ON stories BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) "
+    f"SELECT id, title, {_TEXT_BEFORE.replace('new.', '')}, tags FROM stories",
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS stories_fts_insert",
+    "DROP TRIGGER IF EXISTS stories_fts_update",
+    "DROP TRIGGER IF EXISTS stories_fts_delete",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    "DROP VIEW IF EXISTS stories_search",
+]
+
+stories = sa.table(
+    'stories',
+    sa.column('id', sa.Integer()),
+    sa.column('owner_id', sa.Integer()),
+    sa.column('content', sa.LargeBinary()),
+    sa.column('search_vector', postgresql.TSVECTOR()),
+)
+
+
+def _story_text(content):
+    if content is None or isinstance(content, str):
+        return content
+    return decompress_bytes(content)
+
+
+def _index_rows(connection, condition) -> int:
+    """Set search_vector for up to BATCH_SIZE rows matching ``condition``, returning the last id (0 for none).
+
+    The rows are locked until the batch commits, so a write cannot land
+    between reading a body and storing its vector and then go unnoticed.
+    """
+    rows = connection.execute(
+        sa.select(stories.c.id, stories.c.owner_id, stories.c.content)
+        .where(condition)
+        .order_by(stories.c.id)
+        .limit(BATCH_SIZE)
+        .with_for_update()
+    ).fetchall()
+    if not rows:
+        return 0
+    connection.execute(
+        sa.text(
+            "UPDATE stories SET search_vector = strip(to_tsvector('simple', :text_value)) "
+            "WHERE id = :story_id AND owner_id = :owner_id"
+        ),
+        [
+            {'story_id': row.id, 'owner_id': row.owner_id, 'text_value': _story_text(row.content)}
+            for row in rows
+        ],
+    )
+    return rows[-1].id
+
+
+def _index_postgresql() -> None:
+    op.execute(
+        "CREATE FUNCTION stories_clear_search_vector() RETURNS trigger AS $$ "
+        "BEGIN NEW.search_vector := NULL; RETURN NEW; END "
+        "$$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE TRIGGER stories_clear_search_vector BEFORE UPDATE OF content ON stories "
+        "FOR EACH ROW EXECUTE FUNCTION stories_clear_search_vector()"
+    )
+    # Commit the added column and the trigger first, so each batch can be its own transaction
+    with op.get_context().autocommit_block():
+        engine = op.get_bind().engine
+        last_id = 0
+        while True:
+            with engine.begin() as connection:
+                indexed_to = _index_rows(connection, stories.c.id > last_id)
+            if not indexed_to:
+                break
+            last_id = indexed_to
+
+    # Stories written meanwhile, and inserted after their batch
+    connection = op.get_bind()
+    op.execute("LOCK TABLE stories IN SHARE MODE")
+    last_id = 0
+    while True:
+        last_id = _index_rows(connection, sa.and_(stories.c.search_vector.is_(None), stories.c.id > last_id))
+        if not last_id:
+            break
+    op.execute("DROP TRIGGER stories_clear_search_vector ON stories")
+    op.execute("DROP FUNCTION stories_clear_search_vector()")
+
+    partitioned = is_partitioned(connection)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_stories_search_vector',
+            'stories',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=not partitioned,
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.add_column('stories', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        _index_postgresql()
+        return
+
+    op.add_column('stories', sa.Column('search_vector', sa.Text(), nullable=True))
+    if connection.dialect.name == 'sqlite':
+        connection.connection.driver_connection.create_function("story_text", 1, _story_text, deterministic=True)
+        for statement in DROP_STATEMENTS + CREATE_STATEMENTS:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.drop_index('ix_stories_search_vector', table_name='stories')
+        op.drop_column('stories', 'search_vector')
+        return
+    if connection.dialect.name != 'sqlite':
+        op.drop_column('stories', 'search_vector')
+        return
+
+    # The triggers read stories, and the batch rebuild of the table drops them anyway
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
+    with op.batch_alter_table('stories', schema=None) as batch_op:
+        batch_op.drop_column('search_vector')
+    for statement in CREATE_STATEMENTS_BEFORE:
+        op.execute(statement)
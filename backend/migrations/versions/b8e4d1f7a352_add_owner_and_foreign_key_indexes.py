@@ -0,0 +1,58 @@
+"""Add owner and foreign key indexes
+
+Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL, so writes
+to the tables carry on while they build. That cannot run inside a
+transaction, hence the autocommit blocks. If a build fails it leaves an
+INVALID index behind; drop it before running the migration again.
+
+Revision ID: b8e4d1f7a352
+Revises: f3c6d9a2b518
+Create Date: 2026-10-19 19:02:37.415530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d1f7a352'
+down_revision: Union[str, None] = 'f3c6d9a2b518'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_stories_owner_id_created_at', 'stories', ['owner_id', 'created_at', 'id']),
+    # Foreign keys are checked on every delete of the referenced row
+    ('ix_analysis_runs_story_id', 'analysis_runs', ['story_id']),
+    ('ix_analysis_runs_user_id', 'analysis_runs', ['user_id']),
+    ('ix_revoked_tokens_user_id', 'revoked_tokens', ['user_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,86 @@
+"""Store story owners on revisions and optionally partition stories by owner
+
+story_revisions gains the owner of its story, which the foreign key to a
+partitioned stories table has to include. With STORIES_PARTITIONS set on
+PostgreSQL, stories is then rebuilt as PARTITION BY HASH (owner_id) while
+the application keeps running (see app.partitioning).
+
+Revision ID: c4f2a8e6d1b9
+Revises: b8e4d1f7a352
+Create Date: 2026-10-19 20:14:05.627193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.partitioning import is_partitioned, rebuild_stories
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f2a8e6d1b9'
+down_revision: Union[str, None] = 'b8e4d1f7a352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+
+def _backfill_revision_owners() -> None:
+    connection = op.get_bind()
+    last_id = connection.execute(sa.text("SELECT coalesce(max(id), 0) FROM story_revisions")).scalar()
+    for lower in range(0, last_id, BATCH_SIZE):
+        connection.execute(sa.text(
+            "UPDATE story_revisions SET owner_id = "
+            "(SELECT owner_id FROM stories WHERE stories.id = story_revisions.story_id) "
+            "WHERE id > :lower AND id <= :upper"
+        ), {"lower": lower, "upper": lower + BATCH_SIZE})
+
+
+def _log_progress(copied_to: int, last_id: int) -> None:
+    print(f"Copied stories up to id {copied_to} of {last_id}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('story_revisions', sa.Column('owner_id', sa.Integer(), nullable=True))
+    connection = op.get_bind()
+    if connection.dialect.name != 'postgresql':
+        _backfill_revision_owners()
+        with op.batch_alter_table('story_revisions', schema=None) as batch_op:
+            batch_op.alter_column('owner_id', existing_type=sa.Integer(), nullable=False)
+        return
+
+    with op.get_context().autocommit_block():
+        _backfill_revision_owners()
+        # A validated check lets SET NOT NULL skip its own full-table scan under lock
+        op.execute("ALTER TABLE story_revisions ADD CONSTRAINT story_revisions_owner_id_not_null "
+                   "CHECK (owner_id IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE story_revisions VALIDATE CONSTRAINT story_revisions_owner_id_not_null")
+        op.alter_column('story_revisions', 'owner_id', existing_type=sa.Integer(), nullable=False)
+        op.drop_constraint('story_revisions_owner_id_not_null', 'story_revisions', type_='check')
+
+        if settings.STORIES_PARTITIONS:
+            rebuild_stories(
+                connection.engine,
+                settings.STORIES_PARTITIONS,
+                batch_size=settings.STORIES_REPARTITION_BATCH_SIZE,
+                progress=_log_progress,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql' and is_partitioned(connection):
+        with op.get_context().autocommit_block():
+            rebuild_stories(
+                connection.engine,
+                0,
+                batch_size=settings.STORIES_REPARTITION_BATCH_SIZE,
+                progress=_log_progress,
+            )
+    with op.batch_alter_table('story_revisions', schema=None) as batch_op:
+        batch_op.drop_column('owner_id')
@@ -0,0 +1,120 @@
+"""Add per-user story statistics summary table
+
+Every existing user gets their row, computed from their stories in batches
+of users each committed on its own, so reading the statistics never has to
+scan the stories.
+
+Revision ID: d2a7f4c9e1b3
+Revises: c81f3e5a9b27
+Create Date: 2026-10-19 13:58:27.305146
+
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.compression import decompress_bytes
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a7f4c9e1b3'
+down_revision: Union[str, None] = 'c81f3e5a9b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def _tags(tags):
+    return sorted({tag.strip().lower() for tag in (tags or '').split(',') if tag.strip()})
+
+
+def _backfill_stats() -> None:
+    """Insert the summary row of every user without one, committing every BATCH_SIZE users."""
+    users = sa.table('users', sa.column('id', sa.Integer()))
+    stories = sa.table(
+        'stories',
+        sa.column('owner_id', sa.Integer()),
+        sa.column('content', sa.LargeBinary()),
+        sa.column('tags', sa.String()),
+        sa.column('emotional_impact', sa.String()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    stats = sa.table(
+        'user_story_stats',
+        sa.column('user_id', sa.Integer()),
+        sa.column('story_count', sa.Integer()),
+        sa.column('total_words', sa.BigInteger()),
+        sa.column('impact_counts', sa.JSON()),
+        sa.column('tag_counts', sa.JSON()),
+        sa.column('month_counts', sa.JSON()),
+        sa.column('updated_at', sa.DateTime()),
+    )
+    # Commit the new table first, so each batch can be its own transaction
+    with op.get_context().autocommit_block():
+        engine = op.get_bind().engine
+        last_id = 0
+        while True:
+            with engine.begin() as connection:
+                user_ids = connection.execute(
+                    sa.select(users.c.id).where(users.c.id > last_id).order_by(users.c.id).limit(BATCH_SIZE)
+                ).scalars().all()
+                if not user_ids:
+                    break
+                # Users whose first story change already created their row
+                done = set(connection.execute(
+                    sa.select(stats.c.user_id).where(stats.c.user_id.between(user_ids[0], user_ids[-1]))
+                ).scalars())
+                now = datetime.utcnow()
+                rows = {
+                    user_id: {
+                        'user_id': user_id, 'story_count': 0, 'total_words': 0,
+                        'impact_counts': Counter(), 'tag_counts': Counter(), 'month_counts': Counter(),
+                        'updated_at': now,
+                    }
+                    for user_id in user_ids if user_id not in done
+                }
+                results = connection.execute(
+                    sa.select(stories.c.owner_id, stories.c.content, stories.c.tags,
+                              stories.c.emotional_impact, stories.c.created_at)
+                    .where(stories.c.owner_id.between(user_ids[0], user_ids[-1]))
+                ).yield_per(BATCH_SIZE)
+                for owner_id, content, tags, impact, created_at in results:
+                    row = rows.get(owner_id)
+                    if row is None:
+                        continue
+                    row['story_count'] += 1
+                    row['total_words'] += len(decompress_bytes(content).split()) if content is not None else 0
+                    row['impact_counts'][impact or 'medium'] += 1
+                    row['month_counts'][(created_at or now).strftime('%Y-%m')] += 1
+                    row['tag_counts'].update(_tags(tags))
+                if rows:
+                    connection.execute(stats.insert(), [
+                        {**row, **{key: dict(row[key]) for key in ('impact_counts', 'tag_counts', 'month_counts')}}
+                        for row in rows.values()
+                    ])
+            last_id = user_ids[-1]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_story_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('story_count', sa.Integer(), nullable=False),
+    sa.Column('total_words', sa.BigInteger(), nullable=False),
+    sa.Column('impact_counts', sa.JSON(), nullable=False),
+    sa.Column('tag_counts', sa.JSON(), nullable=False),
+    sa.Column('month_counts', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    _backfill_stats()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_story_stats')
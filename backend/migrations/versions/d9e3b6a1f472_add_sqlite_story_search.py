@@ -0,0 +1,64 @@
+"""Add the FTS5 story search index on SQLite
+
+Creates the stories_fts table and the triggers keeping it current (see
+app.fulltext), and indexes the existing stories. Nothing changes on
+PostgreSQL.
+
+Revision ID: d9e3b6a1f472
+Revises: c4f2a8e6d1b9
+Create Date: 2026-10-19 21:03:48.190264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# The index as first added, before compressed bodies were searchable
+# (b5d8f2a6c913 changes the triggers); kept here as app.fulltext moves on
+FTS_TABLE = 'stories_fts'
+_TEXT = "CASE WHEN substr(new.content, 1, 4) = X'28b52ffd' THEN NULL ELSE CAST(new.content AS TEXT) END"
+_INDEX_NEW = f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) VALUES (new.id, new.title, {_TEXT}, new.tags);"
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, content, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_insert AFTER INSERT ON stories BEGIN {_INDEX_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_update AFTER UPDATE OF title, content, tags ON stories BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; {_INDEX_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_delete AFTER DELETE ON stories BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+]
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS stories_fts_insert",
+    "DROP TRIGGER IF EXISTS stories_fts_update",
+    "DROP TRIGGER IF EXISTS stories_fts_delete",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+REBUILD_STATEMENT = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags) "
+    f"SELECT id, title, {_TEXT.replace('new.', '')}, tags FROM stories"
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e3b6a1f472'
+down_revision: Union[str, None] = 'c4f2a8e6d1b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in CREATE_STATEMENTS:
+        op.execute(statement)
+    op.execute(f"DELETE FROM {FTS_TABLE}")
+    op.execute(REBUILD_STATEMENT)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
@@ -0,0 +1,52 @@
+"""Add analysis runs table for model call metrics
+
+Revision ID: f3c6d9a2b518
+Revises: e5b8a1c3d947
+Create Date: 2026-10-19 15:58:12.840215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6d9a2b518'
+down_revision: Union[str, None] = 'e5b8a1c3d947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('analysis_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('story_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('options', sa.JSON(), nullable=True),
+    sa.Column('success', sa.Boolean(), nullable=False),
+    sa.Column('queue_ms', sa.Float(), nullable=True),
+    sa.Column('wall_ms', sa.Float(), nullable=True),
+    sa.Column('total_duration_ms', sa.Float(), nullable=True),
+    sa.Column('load_duration_ms', sa.Float(), nullable=True),
+    sa.Column('prompt_eval_count', sa.Integer(), nullable=True),
+    sa.Column('prompt_eval_duration_ms', sa.Float(), nullable=True),
+    sa.Column('eval_count', sa.Integer(), nullable=True),
+    sa.Column('eval_duration_ms', sa.Float(), nullable=True),
+    sa.Column('tokens_per_second', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['story_id'], ['stories.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_analysis_runs_id'), 'analysis_runs', ['id'], unique=False)
+    op.create_index('ix_analysis_runs_created_at_model', 'analysis_runs', ['created_at', 'model'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analysis_runs_created_at_model', table_name='analysis_runs')
+    op.drop_index(op.f('ix_analysis_runs_id'), table_name='analysis_runs')
+    op.drop_table('analysis_runs')
@@ -0,0 +1,121 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError
+
+# Add the backend directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.crud.user import bulk_create_users
+from app.schemas.auth import UserCreate
+
+def read_rows(path: Path, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (line number, row) pairs from a CSV or NDJSON file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {key: value for key, value in row.items() if value not in (None, "")}
+        else:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, {"__error__": f"Invalid JSON: {e}"}
+
+def parse_users(path: Path, fmt: str) -> Tuple[List[UserCreate], Dict[str, int], List[dict]]:
+    """Validate every row, keeping the first occurrence of each email.
+
+    Returns:
+        The valid users, the line number of each user's email, and the
+        errors of rejected rows
+    """
+    users: List[UserCreate] = []
+    lines: Dict[str, int] = {}
+    errors: List[dict] = []
+    for number, row in read_rows(path, fmt):
+        if "__error__" in row:
+            errors.append({"line": number, "email": None, "error": row["__error__"]})
+            continue
+        try:
+            user = UserCreate(**row)
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"line": number, "email": row.get("email"), "error": message})
+            continue
+        if user.email in lines:
+            errors.append({"line": number, "email": user.email, "error": f"Duplicate of line {lines[user.email]}"})
+            continue
+        lines[user.email] = number
+        users.append(user)
+    return users, lines, errors
+
+def provision(path: Path, fmt: str, workers: int, batch_size: int, errors_path: Path = None) -> int:
+    """Create the users listed in a file and report per-row errors.
+
+    Returns:
+        The number of rows that failed
+    """
+    started = time.perf_counter()
+    users, lines, errors = parse_users(path, fmt)
+    print(f"Read {len(users) + len(errors)} rows, {len(users)} valid")
+
+    db = SessionLocal()
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                created, failed = bulk_create_users(
+                    db, users, executor=executor, batch_size=batch_size, workers=workers
+                )
+        else:
+            created, failed = bulk_create_users(db, users, batch_size=batch_size)
+    except Exception as e:
+        db.rollback()
+        print(f"Error provisioning users: {e}")
+        raise
+    finally:
+        db.close()
+
+    errors.extend({"line": lines[email], "email": email, "error": error} for email, error in failed.items())
+    errors.sort(key=lambda error: error["line"])
+    elapsed = time.perf_counter() - started
+    print(f"Created {created} users in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f}/s), {len(errors)} errors")
+
+    if errors_path:
+        with open(errors_path, "w", encoding="utf-8") as f:
+            for error in errors:
+                f.write(json.dumps(error) + "\n")
+        print(f"Wrote errors to {errors_path}")
+    else:
+        for error in errors:
+            print(f"  line {error['line']}: {error['email'] or '-'}: {error['error']}")
+    return len(errors)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create users in bulk from a CSV or NDJSON file.")
+    parser.add_argument("path", type=Path, help="File with email, password and optional full_name per row")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from file extension)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.PROVISION_HASH_WORKERS or os.cpu_count() or 1,
+        help="Processes used to hash passwords (default: PROVISION_HASH_WORKERS, or every CPU)",
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="Users inserted per statement")
+    parser.add_argument("--errors", type=Path, help="Write per-row errors to this NDJSON file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "ndjson")
+    failed = provision(args.path, fmt, args.workers, args.batch_size, args.errors)
+    sys.exit(1 if failed else 0)
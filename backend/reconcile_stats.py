@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import SessionLocal
+from app.crud.stats import rebuild_all_stats, rebuild_user_stats
+
+def reconcile(user_id: int = None) -> None:
+    """Rebuild user_story_stats from the stories table."""
+    db = SessionLocal()
+    try:
+        if user_id is not None:
+            rebuild_user_stats(db, user_id)
+            db.commit()
+            print(f"Rebuilt statistics for user {user_id}")
+        else:
+            count = rebuild_all_stats(db)
+            print(f"Rebuilt statistics for {count} users")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding statistics: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    reconcile(int(sys.argv[1]) if len(sys.argv) > 1 else None)
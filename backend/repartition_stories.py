@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.core.config import settings
+from app.database import engine
+from app.partitioning import partition_count, rebuild_stories
+
+def repartition(partitions: int = None) -> None:
+    """Rebuild the stories table with the given number of hash partitions, online."""
+    partitions = settings.STORIES_PARTITIONS if partitions is None else partitions
+    with engine.connect() as conn:
+        current = partition_count(conn)
+    if current == partitions:
+        print(f"stories already has {partitions} partitions")
+        return
+    print(f"Rebuilding stories: {current} -> {partitions} partitions")
+    rebuild_stories(
+        engine,
+        partitions,
+        batch_size=settings.STORIES_REPARTITION_BATCH_SIZE,
+        progress=lambda copied_to, last_id: print(f"Copied stories up to id {copied_to} of {last_id}"),
+    )
+    print("Done")
+
+if __name__ == "__main__":
+    repartition(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,50 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.admission import PostgresRateLimiter
+from app.models import RateLimitBucket
+
+
+@pytest.fixture
+def session_factory(postgres_url):
+    engine = create_engine(postgres_url, pool_size=10)
+    RateLimitBucket.__table__.drop(engine, checkfirst=True)
+    RateLimitBucket.__table__.create(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_concurrent_first_requests_share_one_bucket(session_factory):
+    limiter = PostgresRateLimiter(capacity=5, rate=1e-6, session_factory=session_factory)
+    workers = 10
+    barrier = threading.Barrier(workers)
+
+    def acquire(_):
+        barrier.wait()
+        return limiter.acquire("user:1")
+
+    with ThreadPoolExecutor(workers) as executor:
+        retry_afters = list(executor.map(acquire, range(workers)))
+
+    assert sum(1 for retry_after in retry_afters if retry_after == 0) == 5
+    with session_factory() as db:
+        assert db.query(RateLimitBucket).count() == 1
+
+
+def test_prune_deletes_only_refilled_buckets(session_factory):
+    limiter = PostgresRateLimiter(capacity=5, rate=1.0, session_factory=session_factory)
+    limiter.acquire("user:idle")
+    limiter.acquire("user:active")
+    with session_factory() as db:
+        idle = db.get(RateLimitBucket, "user:idle")
+        idle.updated_at -= 10
+        db.commit()
+
+    assert limiter.prune(time.time()) == 1
+    with session_factory() as db:
+        assert [bucket.key for bucket in db.query(RateLimitBucket)] == ["user:active"]
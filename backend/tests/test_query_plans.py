@@ -0,0 +1,215 @@
+"""Check that the story and user queries are served by indexes.
+
+Seeds the ``TEST_DATABASE_URL`` database with enough users and stories for
+the planner to prefer indexes, runs every function of ``app.crud.story`` and
+``app.crud.user`` while recording the SQL they send, and runs ``EXPLAIN`` on
+each statement. A check fails if a plan contains a sequential scan of a table
+with at least ``MIN_ROWS`` rows, or reads more than one partition of a
+partitioned stories table (see ``app.partitioning``). Foreign keys must also
+have an index to serve the checks made when the referenced row is deleted,
+as those scans do not show up in ``EXPLAIN``.
+"""
+from typing import Callable, Dict, List, Set, Tuple
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.core.config import settings
+from app.crud import story as crud_story
+from app.crud import user as crud_user
+from app.database import Base, create_engines
+from app.partitioning import rebuild_stories
+
+USERS = 2000
+STORIES_PER_USER = 20
+# Tables at least this large must not be scanned
+MIN_ROWS = 1000
+
+_UNINDEXED_FOREIGN_KEYS = """
+SELECT c.conrelid::regclass::text, a.attname
+FROM pg_constraint c
+JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+WHERE c.contype = 'f'
+  AND c.connamespace = 'public'::regnamespace
+  AND NOT EXISTS (
+      SELECT 1 FROM pg_index i
+      WHERE i.indrelid = c.conrelid AND i.indkey[0] = c.conkey[1]
+  )
+ORDER BY 1, 2
+"""
+
+
+def seed(engine) -> None:
+    """Fill the tables with generated rows."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO users (email, hashed_password, full_name, theme, is_active, is_superuser, created_at, updated_at)
+            SELECT 'user' || g || '@example.com', :hashed_password, 'User ' || g, 'light', true, false, now(), now()
+            FROM generate_series(1, :users) g
+        """), {"users": USERS, "hashed_password": crud_user.get_password_hash("seeded-password")})
+        conn.execute(text("""
+            INSERT INTO stories (title, date, content, search_vector, tags, emotional_impact, owner_id,
+                                 created_at, updated_at, revision)
+            SELECT 'Story ' || s, '2024-01-01', convert_to(body, 'UTF8'), strip(to_tsvector('simple', body)),
+                   'seed', 'medium', u.id,
+                   now() - s * interval '1 hour', now(), 1
+            FROM users u CROSS JOIN generate_series(1, :per_user) s
+            CROSS JOIN LATERAL (SELECT 'Seeded story number ' || s || ' of user ' || u.id AS body) b
+        """), {"per_user": STORIES_PER_USER})
+        conn.execute(text("""
+            INSERT INTO story_revisions (story_id, owner_id, version, is_snapshot, data, created_at)
+            SELECT id, owner_id, 1, true, 'Seeded story', created_at FROM stories
+        """))
+        conn.execute(text("""
+            INSERT INTO story_lsh_buckets (story_id, band, owner_id, bucket)
+            SELECT st.id, b, st.owner_id, (random() * 1000000000)::bigint
+            FROM stories st CROSS JOIN generate_series(0, :bands - 1) b
+        """), {"bands": settings.DEDUP_BANDS})
+        conn.execute(text("""
+            INSERT INTO analysis_runs (story_id, user_id, model, success, created_at)
+            SELECT id, owner_id, 'seed', true, created_at FROM stories
+        """))
+        conn.execute(text("""
+            INSERT INTO revoked_tokens (jti, user_id, expires_at, revoked_at)
+            SELECT 'seed-' || id, id, now() + interval '1 hour', now() FROM users
+        """))
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+
+
+def checks(user_id: int, story_id: int, victim_id: int) -> Dict[str, Callable]:
+    """The calls to run, by label; each receives a fresh session."""
+
+    def patch(db):
+        db_story = crud_story.get_story(db, story_id=story_id, user_id=user_id, for_update=True)
+        crud_story.patch_story_content(db, db_story=db_story, edits=[(0, 6, "Patched")])
+
+    def near_duplicates(db):
+        db_story = crud_story.get_story(db, story_id=story_id, user_id=user_id)
+        crud_story.find_near_duplicates(db, db_story, user_id=user_id)
+
+    new_story = schemas.StoryCreate(title="Plan check", date="2024-01-02", content="A story written by the plan check")
+    return {
+        "story.get_story": lambda db: crud_story.get_story(db, story_id=story_id, user_id=user_id),
+        "story.get_stories": lambda db: crud_story.get_stories(db, user_id=user_id),
+        "story.get_stories(search)": lambda db: crud_story.get_stories(db, user_id=user_id, search="number"),
+        "story.create_story": lambda db: crud_story.create_story(db, story=new_story, user_id=user_id),
+        "story.update_story": lambda db: crud_story.update_story(
+            db, story_id=story_id, story=schemas.StoryUpdate(title="Renamed", content="Seeded story, rewritten"), user_id=user_id
+        ),
+        "story.patch_story_content": patch,
+        "story.update_story_analysis": lambda db: crud_story.update_story_analysis(
+            db, story_id=story_id, analysis="Analysis", user_id=user_id
+        ),
+        "story.find_near_duplicates": near_duplicates,
+        "story.get_duplicate_clusters": lambda db: crud_story.get_duplicate_clusters(db, user_id=user_id),
+        "story.delete_story": lambda db: crud_story.delete_story(db, story_id=story_id, user_id=user_id),
+        "user.get_user": lambda db: crud_user.get_user(db, user_id),
+        "user.get_user_by_email": lambda db: crud_user.get_user_by_email(db, f"user{user_id}@example.com"),
+        "user.get_users": lambda db: crud_user.get_users(db),
+        "user.create_user": lambda db: crud_user.create_user(
+            db, schemas.UserCreate(email="plan-check@example.com", password="plan-check-password")
+        ),
+        "user.update_user": lambda db: crud_user.update_user(db, user_id, schemas.UserUpdate(full_name="Renamed")),
+        "user.authenticate_user": lambda db: crud_user.authenticate_user(db, f"user{user_id}@example.com", "wrong"),
+        "user.delete_user": lambda db: crud_user.delete_user(db, victim_id, batch_size=10),
+    }
+
+
+CHECKS = list(checks(0, 0, 0))
+
+
+def scans(plan: dict) -> List[Tuple[str, str]]:
+    """(node type, table) of every table read anywhere in ``plan``."""
+    found = []
+    if "Relation Name" in plan:
+        found.append((plan["Node Type"], plan["Relation Name"]))
+    for child in plan.get("Plans", ()):
+        found.extend(scans(child))
+    return found
+
+
+def problems_in(plan: dict, large: Dict[str, int], partitions: Set[str]) -> List[str]:
+    """Sequential scans of large tables, and reads of several story partitions."""
+    found = scans(plan)
+    problems = sorted({f"Seq Scan on {table}" for node, table in found if node == "Seq Scan" and table in large})
+    touched = {table for _, table in found if table in partitions}
+    if len(touched) > 1:
+        problems.append(f"Reads {len(touched)} partitions of stories")
+    return problems
+
+
+@pytest.fixture(scope="module", params=[0, 4], ids=["single", "partitioned"])
+def seeded(request, postgres_url):
+    """The seeded engine, for stories as one table and hash partitioned."""
+    engine, _ = create_engines(postgres_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    seed(engine)
+    if request.param:
+        rebuild_stories(engine, request.param)
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+    with engine.connect() as conn:
+        ids = conn.execute(text(
+            "SELECT owner_id, max(id) FROM stories WHERE owner_id = (SELECT min(id) FROM users) GROUP BY owner_id"
+        )).one()
+        victim_id = conn.execute(text("SELECT max(id) FROM users WHERE email LIKE 'user%'")).scalar()
+    yield engine, (*ids, victim_id)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS stories CASCADE"))
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("label", CHECKS)
+def test_queries_use_indexes(seeded, label):
+    engine, ids = seeded
+    with engine.connect() as conn:
+        large = dict(conn.execute(text(
+            "SELECT relname, reltuples::bigint FROM pg_class "
+            "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace AND reltuples >= :min_rows"
+        ), {"min_rows": MIN_ROWS}).all())
+        partitions = set(conn.execute(text(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'stories'::regclass"
+        )).scalars())
+
+    captured: List[Tuple[str, object]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    db = sessionmaker(bind=engine)()
+    try:
+        checks(*ids)[label](db)
+        db.rollback()
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", record)
+    assert captured
+
+    problems = []
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for statement, parameters in captured:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters or None)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            for problem in problems_in(plan, large, partitions):
+                problem = f"{problem}: {' '.join(statement.split())[:200]}"
+                if problem not in problems:
+                    problems.append(problem)
+        raw.rollback()
+    finally:
+        raw.close()
+    assert problems == []
+
+
+def test_foreign_keys_are_indexed(seeded):
+    engine, _ = seeded
+    with engine.connect() as conn:
+        assert conn.execute(text(_UNINDEXED_FOREIGN_KEYS)).all() == []
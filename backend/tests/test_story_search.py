@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.core.config import settings
+from app.crud import story as crud_story
+from app.crud import user as crud_user
+from app.database import Base, SQLiteSession, create_engines
+from app.schemas import StoryCreate, StoryUpdate, UserCreate
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path}/search.db"
+    else:
+        url = request.getfixturevalue("postgres_url")
+    monkeypatch.setattr(settings, "STORY_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(settings, "STORY_COMPRESSION_THRESHOLD", 64)
+
+    engine, read_engine = create_engines(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    if read_engine is not None:
+        Session = sessionmaker(class_=SQLiteSession, read_bind=read_engine, bind=engine)
+    else:
+        Session = sessionmaker(bind=engine)
+    with Session() as session:
+        yield session
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _titles(db, user_id, search):
+    return [story.title for story in crud_story.get_stories(db, user_id=user_id, search=search)]
+
+
+def test_search_finds_compressed_story(db):
+    user = crud_user.create_user(db, UserCreate(email="writer@example.com", password="password123"))
+    db.commit()
+    body = "The lighthouse keeper counted the ships every evening. " * 10
+    story = crud_story.create_story(db, StoryCreate(title="Long", date="2024-01-01", content=body), user_id=user.id)
+    crud_story.create_story(db, StoryCreate(title="Short", date="2024-01-01", content="A short note."), user_id=user.id)
+
+    stored = db.execute(text("SELECT content FROM stories WHERE id = :id"), {"id": story.id}).scalar()
+    assert bytes(stored).startswith(b"\x28\xb5\x2f\xfd")
+    assert _titles(db, user.id, "lighthouse") == ["Long"]
+
+    crud_story.update_story(db, story.id, StoryUpdate(content="The harbour pilot slept. " * 10), user.id)
+    assert _titles(db, user.id, "lighthouse") == []
+    assert _titles(db, user.id, "harbour") == ["Long"]
+    assert _titles(db, user.id, "harb pil") == ["Long"]
+
+    crud_story.delete_story(db, story.id, user.id)
+    assert _titles(db, user.id, "harbour") == []
+
+
+def test_search_index_holds_no_copy_of_the_text(db):
+    """Only the index of a body is stored besides the compressed body itself."""
+    user = crud_user.create_user(db, UserCreate(email="writer@example.com", password="password123"))
+    db.commit()
+    body = "The lighthouse keeper counted the ships every evening. " * 10
+    story = crud_story.create_story(db, StoryCreate(title="Long", date="2024-01-01", content=body), user_id=user.id)
+
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns("stories")}
+    assert "search_text" not in columns
+    if db.get_bind().dialect.name == "sqlite":
+        tables = set(db.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+        assert "stories_fts" in tables and "stories_fts_content" not in tables
+    else:
+        vector = db.execute(
+            text("SELECT search_vector::text FROM stories WHERE id = :id"), {"id": story.id}
+        ).scalar()
+        assert vector.split() == sorted(f"'{word}'" for word in set(body.lower().replace(".", "").split()))
+
+
+def test_story_lists_defer_content(db):
+    user = crud_user.create_user(db, UserCreate(email="writer@example.com", password="password123"))
+    db.commit()
+    user_id = user.id
+    crud_story.create_story(db, StoryCreate(title="One", date="2024-01-01", content="Some text."), user_id=user_id)
+    db.expunge_all()
+
+    story = db.query(models.Story).one()
+    assert "content" not in story.__dict__
+    db.expunge_all()
+    assert "content" in crud_story.get_stories(db, user_id=user_id)[0].__dict__